@@ -0,0 +1,6 @@
+import sys
+
+from src.cli import BatchRunner
+
+if __name__ == '__main__':
+    sys.exit(BatchRunner.main())
@@ -0,0 +1,184 @@
+"""
+Vectorized backtests of dates x assets signal matrices, i.e. direction labels of proc_add_direction or predictions.
+
+Signals turn into target weights by the sizing rule, and the portfolio gets rebalanced to the target weights
+at every close. With lag=1, the signal at the close of day t is traded at that close and held over day t+1,
+so a signal never sees the return it trades. Costs & slippage are charged on the absolute weight changes,
+in fractions of the traded value. All steps are array operations over all dates & assets, and over all variants
+of a parameter sweep at once.
+
+Sizing rules:
+
+* equal: the sign of the signal times 1 / number of assets, i.e. long, flat, or short with equal weights
+* signal: weights proportional to the signal, scaled to a gross exposure of 1 per date
+* weights: the signals are the weights
+
+Gross exposure gets capped at max_leverage. Assets without a price on a date are not held on that date.
+
+Usage:
+
+    prices = align({t: n.load_data(t, TimeFrame.DAILY, True) for t in tickers}, "Close")
+    signals = align(flows, "direction").reindex_like(prices)
+    bt = VectorBacktester(sizing="signal", cost=0.0005, slippage=0.0002)
+    result = bt.sweep({"flow-3": signals_3, "flow-4": signals_4}, prices)
+    print(bt.summary(result))
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.dataclasses.BacktestResult import BacktestResult
+from src.metrics.BaseMetrics import BaseMetrics
+from src.metrics.RiskMetrics import RiskMetrics
+
+
+DBG = False
+sizings = ["equal", "signal", "weights"]
+
+
+class VectorBacktester:
+
+    def __init__(self, sizing: str = "equal", cost: float = 0.0005, slippage=0.0, max_leverage: float = 1.0,
+                 lag: int = 1, initial_capital: float = 1.0, dbg: bool = False):
+        """
+        :param sizing: equal, signal, or weights. See above
+        :param cost: transaction cost per traded value, i.e. 0.0005 = 5 bps
+        :param slippage: slippage per traded value, scalar or one value per asset
+        :param max_leverage: cap of the gross exposure, sum of absolute weights, per date
+        :param lag: number of periods between the signal and the period it is held
+        :param initial_capital: start value of the equity curves
+        :param dbg: Debug / verbose console output
+        """
+        if sizing not in sizings:
+            raise ValueError("Unknown sizing " + str(sizing) + ", use one of " + ", ".join(sizings))
+        self.sizing = sizing
+        self.cost = cost
+        self.slippage = slippage
+        self.max_leverage = max_leverage
+        self.lag = lag
+        self.initial_capital = initial_capital
+        self.DBG = dbg
+
+    def run(self, signals, prices, name: str = "signals") -> BacktestResult:
+        """
+        Backtests one signal matrix, or a batch of signal matrices.
+
+        :param signals: pandas data frame (dates x assets) aligned with the prices, or a numpy array
+                        (dates x assets) or (variants x dates x assets)
+        :param prices: pandas data frame (ascending dates x assets), i.e. close prices from align
+        :param name: variant name of a single signal matrix
+        :return: BacktestResult
+        """
+        if isinstance(signals, pd.DataFrame):
+            signals = signals.reindex(index=prices.index, columns=prices.columns).to_numpy(dtype=np.float64)
+        signals = np.asarray(signals, dtype=np.float64)
+        if signals.ndim == 2:
+            variants = [name]
+            signals = signals[None]
+        else:
+            variants = ["variant-" + str(i) for i in range(len(signals))]
+        return self.__backtest(signals, prices, variants)
+
+    def sweep(self, signals: dict, prices) -> BacktestResult:
+        """
+        Backtests all signal variants in one batched evaluation.
+
+        :param signals: dictionary of variant name -> pandas data frame (dates x assets)
+        :param prices: pandas data frame (ascending dates x assets)
+        :return: BacktestResult with one variant per entry of the dictionary
+        """
+        batch = np.stack([s.reindex(index=prices.index, columns=prices.columns).to_numpy(dtype=np.float64)
+                          for s in signals.values()])
+        return self.__backtest(batch, prices, list(signals.keys()))
+
+    def weights(self, signals, tradable=None) -> np.ndarray:
+        """
+        Target weights of the given signals according to the sizing rule & leverage cap.
+
+        :param signals: numpy array (..., dates, assets). NaN means no position
+        :param tradable: boolean array (dates, assets) of assets with a price. All by default
+        :return: numpy array of the same shape
+        """
+        signals = np.nan_to_num(np.asarray(signals, dtype=np.float64), nan=0.0)
+        if tradable is not None:
+            signals = np.where(tradable, signals, 0.0)
+
+        if self.sizing == "equal":
+            weights = np.sign(signals) / signals.shape[-1]
+        elif self.sizing == "signal":
+            gross = np.abs(signals).sum(axis=-1, keepdims=True)
+            weights = np.divide(signals, gross, out=np.zeros_like(signals), where=gross > 0)
+        else:
+            weights = signals
+
+        gross = np.abs(weights).sum(axis=-1, keepdims=True)
+        scale = np.minimum(1.0, np.divide(self.max_leverage, gross, out=np.ones_like(gross), where=gross > 0))
+        return weights * scale
+
+    def summary(self, result: BacktestResult, risk_free_rate=0.0, days: int = 255) -> pd.DataFrame:
+        """
+        Key figures of all variants, computed with the vectorized metrics.
+        :return: pandas data frame with one row per variant
+        """
+        returns = result.returns_frame
+        equity = result.equity[:, -1] if result.equity.shape[1] else np.full(len(result.variants), np.nan)
+        df = pd.DataFrame({"total_return": equity / self.initial_capital - 1,
+                           "sharpe": BaseMetrics().sharpe_ratios(returns, risk_free_rate, days),
+                           "max_drawdown": RiskMetrics().max_drawdown(returns),
+                           "turnover": result.turnover.mean(axis=1),
+                           "costs": result.costs.sum(axis=1)}, index=result.variants)
+        return df
+
+    def __backtest(self, signals, prices, variants) -> BacktestResult:
+        values = np.asarray(prices, dtype=np.float64)
+        if signals.shape[1:] != values.shape:
+            raise ValueError("Signals of shape " + str(signals.shape[1:]) + " don't match prices of shape " +
+                             str(values.shape))
+
+        asset_returns = np.zeros_like(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            asset_returns[1:] = values[1:] / values[:-1] - 1
+        tradable = ~np.isnan(values)
+        asset_returns = np.nan_to_num(asset_returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+        # weights held over each period: set at the close lag periods before, flat during the first lag periods
+        targets = self.weights(signals, tradable)
+        positions = np.zeros_like(targets)
+        if self.lag < targets.shape[1]:
+            positions[:, self.lag:] = targets[:, :targets.shape[1] - self.lag]
+        # an asset that has no price at the end of a period can't be held over it
+        positions = np.where(tradable, positions, 0.0)
+
+        trades = np.abs(np.diff(positions, axis=1, prepend=0.0))
+        turnover = trades.sum(axis=-1)
+        costs = (trades * (self.cost + np.asarray(self.slippage, dtype=np.float64))).sum(axis=-1)
+        gross_returns = np.einsum("vtk,tk->vt", positions, asset_returns)
+        returns = gross_returns - costs
+        equity = self.initial_capital * np.cumprod(1.0 + returns, axis=1)
+        if self.DBG:
+            print("Backtested ", len(variants), " variants over ", values.shape[0], " dates and ",
+                  values.shape[1], " assets")
+
+        dates = prices.index if isinstance(prices, pd.DataFrame) else pd.RangeIndex(values.shape[0])
+        assets = prices.columns if isinstance(prices, pd.DataFrame) else pd.RangeIndex(values.shape[1])
+        return BacktestResult(variants=variants, dates=dates, assets=assets, returns=returns,
+                              gross_returns=gross_returns, costs=costs, turnover=turnover, equity=equity,
+                              positions=positions)
+
+
+def align(frames: dict, column: str = "Close") -> pd.DataFrame:
+    """
+    Aligns one column of the loader frames of many symbols, i.e. close prices or direction labels,
+    in one ascending dates x symbols frame. Dates missing for a symbol are NaN.
+
+    :param frames: dictionary of symbol -> pandas data frame with a Date column or a DatetimeIndex, in any order
+    :param column: column to align
+    :return: pandas data frame with a DatetimeIndex and one column per symbol
+    """
+    series = {}
+    for symbol, df in frames.items():
+        dates = df["Date"] if "Date" in df.columns else df.index
+        series[getattr(symbol, "name", symbol)] = pd.Series(df[column].to_numpy(),
+                                                             index=pd.DatetimeIndex(dates))
+    aligned = pd.concat(series, axis=1, sort=False)
+    return aligned.sort_index()
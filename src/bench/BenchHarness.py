@@ -0,0 +1,344 @@
+"""
+Benchmark regression harness.
+
+Benchmarks the loaders against a local stub client, each proc, each ProcFlow, the TechProcs feature sets,
+and BaseMetrics on synthetic data. Every run appends one line per benchmark to a local JSONL results file,
+keyed by the current git commit. A run is compared against a baseline commit, by default the most recent
+other commit in the results file. A benchmark regresses when its median time is more than the configured
+percentage slower than the baseline AND the difference exceeds the noise of both runs, measured as
+noise_k times the combined robust standard deviation (1.4826 * median absolute deviation).
+The harness exits with 1 when a hot path regresses.
+
+Usage, from the project root:
+
+    python -m src.bench.BenchHarness
+    python -m src.bench.BenchHarness --rows 100000 --threshold 10 --baseline a1b2c3d
+    python -m src.bench.BenchHarness --groups procs flows --no-store
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.bench import ProcBench as pb
+from src.bench import SyntheticData as sd
+from src.enum import TECHIND
+from src.enum import TimeFrame
+from src.metrics.BaseMetrics import BaseMetrics
+from src.metrics.RollingMetrics import RollingMetrics
+from src.procs.ProcFlow import ProcFlow
+from src.utils import ColumnarCache as cc
+from src.utils import TechInd as t
+from src.utils.CachedNetLoader import CachedNetLoader
+
+
+DBG = False
+results_file = "bench-results.jsonl"
+rows = 100_000
+repeats = 7
+warmup = 1
+# regression threshold in percent of the baseline median
+threshold = 10.0
+# number of combined robust standard deviations a difference must exceed to count as regression
+noise_k = 3.0
+groups = ["loaders", "procs", "flows", "techprocs", "metrics"]
+
+
+class _StubTimeSeries:
+    """ Local stand-in for the AlphaVantage TimeSeries client that returns synthetic raw responses """
+
+    def __init__(self, nr_rows: int):
+        # raw responses come newest first
+        df = sd.generate_ohlcv(nr_rows, ascending=False, seed=7)
+        self.data = df.set_index("Date").rename_axis("date")
+        self.data.columns = ["1. open", "2. high", "3. low", "4. close", "5. volume"]
+
+    def get_daily(self, symbol, outputsize="compact"):
+        data = self.data if outputsize == "full" else self.data.head(100)
+        return data, {"2. Symbol": symbol}
+
+    get_weekly = get_daily
+    get_monthly = get_daily
+
+
+class Benchmark:
+    __slots__ = ["group", "name", "func", "hot", "setup"]
+
+    def __init__(self, group: str, name: str, func, hot: bool = False, setup=None):
+        """
+        :param group: benchmark group, i.e. procs
+        :param name: unique benchmark name
+        :param func: function that takes the result of setup. Timed.
+        :param hot: fails the run when it regresses. False by default
+        :param setup: function that prepares the input of each run. Not timed. Optional
+        """
+        self.group = group
+        self.name = name
+        self.func = func
+        self.hot = hot
+        self.setup = setup
+
+    def run(self, nr_repeats: int = repeats, nr_warmup: int = warmup):
+        """
+        Runs the benchmark nr_warmup + nr_repeats times.
+        :return: list of wall times in seconds, without warm-up runs
+        """
+        samples = []
+        for i in range(nr_warmup + nr_repeats):
+            arg = self.setup() if self.setup is not None else None
+            start = time.perf_counter()
+            self.func(arg)
+            elapsed = time.perf_counter() - start
+            if i >= nr_warmup:
+                samples.append(elapsed)
+        return samples
+
+
+def loader_benchmarks(nr_rows: int, folder: str):
+    n = CachedNetLoader(api_key="", dbg=False)
+    n.cache_folder = folder + "/loader"
+    n.exp_file = n.cache_folder + "/expiration.p"
+    n._ts = _StubTimeSeries(nr_rows)
+    stock = pb.stock
+
+    def clear_stock_cache(_=None):
+        for suffix in ["-full.csv", "-full-meta.p"]:
+            path = n.cache_folder + "/" + stock.name + suffix
+            if os.path.exists(path):
+                os.remove(path)
+        cc.remove(n.cache_folder + "/columnar/ingest/" + stock.name + "-daily-full")
+
+    # warms the cache
+    n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=True)
+
+    return [
+        Benchmark("loaders", "load_data_cold", lambda _: n.load_data(stock, full=True), setup=clear_stock_cache),
+        Benchmark("loaders", "load_data_warm", lambda _: n.load_data(stock, full=True), hot=True),
+        Benchmark("loaders", "get_cached_tech_indicator_warm",
+                  lambda _: t.get_cached_tech_indicator(TECHIND.TECHIND.BBANDS, stock), hot=True),
+    ]
+
+
+def proc_benchmarks(df):
+    return [Benchmark("procs", name, lambda data, f=func: f(data, [], []), setup=df.copy)
+            for name, func in pb.proc_cases()]
+
+
+def flow_benchmarks(df):
+    pf = ProcFlow(DBG)
+    return [Benchmark("flows", "proc_%02d" % i,
+                      lambda data, i=i: pf.proc_switch(data=data, stock=pb.stock, y_col="Close", nr_n=5, proc_id=i),
+                      hot=True, setup=df.copy)
+            for i in pb.flow_ids]
+
+
+def techproc_benchmarks(df):
+    try:
+        from src.procs.TechProcs import TechProcs
+    except ImportError:
+        if DBG:
+            print("ta-lib not installed, skipping TechProcs benchmarks")
+        return []
+
+    return [
+        Benchmark("techprocs", "calc_all_features", lambda data: TechProcs.calc_all_features(data), hot=True,
+                  setup=df.copy),
+        Benchmark("techprocs", "calc_all_features_serial", lambda data: TechProcs.calc_all_features(data, workers=1),
+                  setup=df.copy),
+        Benchmark("techprocs", "get_chart_patterns_packed",
+                  lambda data: TechProcs.get_chart_patterns(data, packed=True), setup=df.copy),
+    ]
+
+
+def metric_benchmarks(df):
+    m = BaseMetrics()
+    rm = RollingMetrics()
+    prices = df.set_index("Date").sort_index()
+    returns = prices["Close"].pct_change().dropna()
+    benchmark = returns.sample(frac=1.0, random_state=1).reset_index(drop=True).set_axis(returns.index)
+    # universe of 500 assets with the same returns, shifted per asset
+    universe = np.add.outer(returns.to_numpy(dtype=np.float64), np.linspace(-0.001, 0.001, 500))
+
+    return [
+        Benchmark("metrics", "daily_returns", lambda data: m.daily_returns(data, log=True), setup=df.copy),
+        Benchmark("metrics", "daily_volatility", lambda data: m.daily_volatility(data), hot=True, setup=df.copy),
+        Benchmark("metrics", "monthly_return", lambda _: m.monthly_return(prices)),
+        Benchmark("metrics", "sharpe_ratio", lambda _: m.sharpe_ratio(returns), hot=True),
+        Benchmark("metrics", "information_ratio", lambda _: m.information_ratio(returns, benchmark)),
+        Benchmark("metrics", "m2_ratio", lambda _: m.m2_ratio(returns, benchmark)),
+        Benchmark("metrics", "score_universe", lambda _: m.score_universe(universe, benchmark), hot=True),
+        Benchmark("metrics", "rolling_scores", lambda _: rm.rolling_scores(universe, benchmark), hot=True),
+    ]
+
+
+def summarize(samples):
+    """
+    Returns robust statistics of the given samples
+    :return: dictionary with median, mad, min, and number of samples
+    """
+    median = statistics.median(samples)
+    mad = statistics.median(abs(s - median) for s in samples)
+    return dict(median=median, mad=mad, min=min(samples), n=len(samples))
+
+
+def current_commit():
+    """ Returns the short hash of HEAD, with a -dirty suffix for uncommitted changes, or unknown outside git """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(nr_rows: int = rows, selected_groups=None, nr_repeats: int = repeats):
+    """
+    Runs all benchmarks of the selected groups on synthetic data.
+
+    :param nr_rows: number of rows of the synthetic data
+    :param selected_groups: list of groups. All groups by default
+    :param nr_repeats: number of timed runs per benchmark
+    :return: list of result dictionaries
+    """
+    selected_groups = selected_groups or groups
+    commit = current_commit()
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    results = []
+
+    folder = t.cache_folder
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        t.cache_folder = tmp
+        try:
+            df = pb.generate_data(nr_rows, tmp)
+            builders = dict(loaders=lambda: loader_benchmarks(nr_rows, tmp),
+                            procs=lambda: proc_benchmarks(df),
+                            flows=lambda: flow_benchmarks(df),
+                            techprocs=lambda: techproc_benchmarks(df),
+                            metrics=lambda: metric_benchmarks(df))
+
+            for group in selected_groups:
+                for bench in builders[group]():
+                    stats = summarize(bench.run(nr_repeats))
+                    results.append(dict(commit=commit, timestamp=stamp, group=group, name=bench.name,
+                                        hot=bench.hot, rows=nr_rows, **stats))
+                    print("%-10s %-34s %10.3f ms  +/- %8.3f ms" % (group, bench.name, stats["median"] * 1000,
+                                                                     stats["mad"] * 1000))
+        finally:
+            t.cache_folder = folder
+
+    return results
+
+
+def store(results, path: str = results_file):
+    """ Appends the results to the JSONL results file """
+    with open(path, "a") as f:
+        for r in results:
+            f.write(json.dumps(r) + "\n")
+
+
+def load(path: str = results_file):
+    """ Returns all stored results, or an empty list if there is no results file """
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline_results(stored, commit: str = None, exclude: str = None):
+    """
+    Returns the most recent results of the given commit, or of the most recent commit other than exclude.
+    :return: dictionary of (group, name, rows) and result
+    """
+    if commit is None:
+        commits = [r["commit"] for r in stored if r["commit"] != exclude]
+        if not commits:
+            return {}
+        commit = commits[-1]
+
+    # later runs of the same commit override earlier ones
+    return {(r["group"], r["name"], r["rows"]): r for r in stored if r["commit"] == commit}
+
+
+def compare(results, baseline, max_regression: float = threshold, k: float = noise_k):
+    """
+    Compares the results against the baseline.
+
+    :param results: list of result dictionaries
+    :param baseline: dictionary of (group, name, rows) and result, see baseline_results
+    :param max_regression: threshold in percent of the baseline median
+    :param k: number of combined robust standard deviations a difference must exceed
+    :return: list of comparison dictionaries
+    """
+    out = []
+    for r in results:
+        base = baseline.get((r["group"], r["name"], r["rows"]))
+        if base is None:
+            continue
+        delta = r["median"] - base["median"]
+        change = 100.0 * delta / base["median"] if base["median"] > 0 else 0.0
+        noise = k * 1.4826 * np.hypot(r["mad"], base["mad"])
+        if change > max_regression and delta > noise:
+            status = "REGRESSION"
+        elif -change > max_regression and -delta > noise:
+            status = "improved"
+        else:
+            status = "ok"
+        out.append(dict(group=r["group"], name=r["name"], hot=r["hot"], baseline=base["median"],
+                        median=r["median"], change=change, status=status))
+    return out
+
+
+def report(comparison, baseline_commit: str = ""):
+    lines = ["Compared to baseline " + baseline_commit]
+    for c in comparison:
+        lines.append("%-10s %-34s %10.3f ms -> %10.3f ms  %+7.1f%%  %s%s"
+                     % (c["group"], c["name"], c["baseline"] * 1000, c["median"] * 1000, c["change"],
+                        c["status"], " (hot)" if c["hot"] else ""))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark regression harness")
+    parser.add_argument("--rows", type=int, default=rows, help="rows of synthetic data")
+    parser.add_argument("--repeats", type=int, default=repeats, help="timed runs per benchmark")
+    parser.add_argument("--groups", nargs="+", choices=groups, default=groups)
+    parser.add_argument("--threshold", type=float, default=threshold, help="max. regression of hot paths in %%")
+    parser.add_argument("--noise-k", type=float, default=noise_k, help="noise threshold in robust std. deviations")
+    parser.add_argument("--baseline", default=None, help="baseline commit. Most recent other commit by default")
+    parser.add_argument("--results", default=results_file, help="JSONL results file")
+    parser.add_argument("--no-store", action="store_true", help="do not append the results to the results file")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.groups, args.repeats)
+    commit = results[0]["commit"] if results else current_commit()
+
+    stored = load(args.results)
+    baseline = baseline_results(stored, args.baseline, exclude=commit)
+    if not args.no_store:
+        store(results, args.results)
+
+    if not baseline:
+        print("No baseline found in " + args.results)
+        return 0
+
+    comparison = compare(results, baseline, args.threshold, args.noise_k)
+    print(report(comparison, next(iter(baseline.values()))["commit"]))
+
+    regressed = [c for c in comparison if c["hot"] and c["status"] == "REGRESSION"]
+    if regressed:
+        print("Hot path regression: " + ", ".join(c["name"] for c in regressed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
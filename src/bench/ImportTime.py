@@ -0,0 +1,83 @@
+"""
+Import-time benchmark.
+
+Measures the time to import each module in a fresh interpreter and checks that no
+heavy dependency (web clients, plotting) gets imported as a side effect.
+
+Usage, from the project root:
+
+    python -m src.bench.ImportTime
+    python -m src.bench.ImportTime src.procs.Procs src.metrics.BaseMetrics
+"""
+
+import statistics
+import subprocess
+import sys
+
+
+DBG = False
+repeats = 5
+
+# Modules that are imported by workers and CLI invocations that only run local procs
+modules = ["src.procs.Procs",
+           "src.procs.ProcFlow",
+           "src.utils.TechInd",
+           "src.utils.CachedNetLoader",
+           "src.metrics.BaseMetrics",
+           ]
+
+# Dependencies that must only be imported on first use
+heavy_modules = ["alpha_vantage", "matplotlib", "seaborn", "IPython"]
+
+probe = """
+import sys, time
+t = time.perf_counter()
+import {module}
+t = time.perf_counter() - t
+heavy = [m for m in {heavy} if m in sys.modules]
+print(t, ",".join(heavy))
+"""
+
+
+def time_import(module: str, nr_repeats: int = repeats):
+    """
+    Imports the given module in a fresh interpreter nr_repeats times.
+
+    :param module: module name, i.e. src.procs.Procs
+    :param nr_repeats: number of fresh interpreters
+    :return: Tuple: [list of import times in seconds, list of heavy modules imported as side effect]
+    """
+    times = []
+    heavy = []
+    for _ in range(nr_repeats):
+        code = probe.format(module=module, heavy=heavy_modules)
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError("Import of " + module + " failed: " + out.stderr)
+        t, _, loaded = out.stdout.splitlines()[-1].partition(" ")
+        times.append(float(t))
+        heavy = [m for m in loaded.split(",") if m]
+    return times, heavy
+
+
+def run(module_names=None, nr_repeats: int = repeats):
+    """
+    Runs the import benchmark and prints one line per module.
+
+    :param module_names: list of module names. Runs the default modules if None.
+    :param nr_repeats: number of fresh interpreters per module
+    :return: dictionary of module name and result dictionary
+    """
+    results = {}
+    for module in module_names or modules:
+        times, heavy = time_import(module, nr_repeats)
+        results[module] = dict(min=min(times), median=statistics.median(times), heavy=heavy)
+        print("%-30s min %8.1f ms   median %8.1f ms   heavy imports: %s"
+              % (module, min(times) * 1000, statistics.median(times) * 1000, ", ".join(heavy) or "none"))
+    return results
+
+
+if __name__ == '__main__':
+    results = run(sys.argv[1:] or None)
+    # fails when any heavy dependency gets imported as side effect
+    sys.exit(1 if any(r["heavy"] for r in results.values()) else 0)
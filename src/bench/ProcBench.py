@@ -0,0 +1,190 @@
+"""
+Scale benchmark of all procs and ProcFlows on synthetic data.
+
+Runs each proc and each ProcFlow at 10k, 1M, and 100M rows of one minute bars and records
+wall time and throughput in rows and MB per second. The indicators merged by the procs are
+computed from the synthetic data and stored in a temporary TechInd cache, so no web request is sent.
+Sizes that would not fit into the available memory are skipped.
+
+Usage, from the project root:
+
+    python -m src.bench.ProcBench
+    python -m src.bench.ProcBench 10000 1000000 --out proc_bench.json
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from src.bench import SyntheticData as sd
+from src.enum import INTERVAL
+from src.enum import Ticker
+from src.procs import Procs as p
+from src.procs.ProcFlow import ProcFlow
+from src.utils import TechInd as t
+
+
+DBG = False
+sizes = [10_000, 1_000_000, 100_000_000]
+repeats = 1
+stock = Ticker.Ticker.SPX
+y_col = "Close"
+flow_ids = [1, 2, 3, 4]
+
+# Peak memory of the widest ProcFlow relative to the input frame, measured on proc_04 with 1M rows
+memory_factor = 40
+
+
+def proc_cases():
+    """
+    Returns one representative call of each proc.
+    Excluded are proc_add_datepart, which requires fast.ai, and proc_window,
+    which only returns the window of a proc and doesn't touch any data.
+    :return: list of tuples (name, function of df, cont_vars, cat_vars)
+    """
+    return [
+        ("proc_fill_nan", lambda df, cont, cat: p.proc_fill_nan(df)),
+        ("proc_min_max_normalize", lambda df, cont, cat: p.proc_min_max_normalize(df, all_col=False)),
+        ("proc_close_only", lambda df, cont, cat: p.proc_close_only(df, cont)),
+        ("proc_add_next_y", lambda df, cont, cat: p.proc_add_next_y(df, y_col, 1, cont)),
+        ("proc_add_previous_values", lambda df, cont, cat: p.proc_add_previous_values(df, y_col, 5, cont)),
+        ("proc_add_percent_change", lambda df, cont, cat: p.proc_add_percent_change(df, y_col, cont)),
+        ("proc_add_abs_percent_change", lambda df, cont, cat: p.proc_add_abs_percent_change(df, y_col, cont)),
+        ("proc_add_direction", lambda df, cont, cat: p.proc_add_direction(df, y_col, cat, cont)),
+        ("proc_add_volatility", lambda df, cont, cat: p.proc_add_volatility(df, y_col, cont)),
+        ("proc_add_ohlc_avg", lambda df, cont, cat: p.proc_add_ohlc_avg(df, cont, add_ohlc_diff=True)),
+        ("proc_add_adx", lambda df, cont, cat: p.proc_add_adx(df, cont, stock, change=True)),
+        ("proc_add_obv", lambda df, cont, cat: p.proc_add_obv(df, cont, stock, change=True)),
+        ("proc_add_mom", lambda df, cont, cat: p.proc_add_mom(df, stock, cont, change=True)),
+        ("proc_add_rsi", lambda df, cont, cat: p.proc_add_rsi(df, cont, stock, change=True)),
+        ("proc_add_bband", lambda df, cont, cat: p.proc_add_bband(df, cont, stock, add_ohlc_diff=True)),
+        ("proc_add_macd", lambda df, cont, cat: p.proc_add_macd(df, cont, stock)),
+        ("proc_add_wma5_wma_20_diff", lambda df, cont, cat: p.proc_add_wma5_wma_20_diff(df, cont, stock)),
+        ("proc_add_wma20_wma_60_diff", lambda df, cont, cat: p.proc_add_wma20_wma_60_diff(df, cont, stock)),
+        ("proc_add_ema10_ema_30_diff", lambda df, cont, cat: p.proc_add_ema10_ema_30_diff(df, cont, stock)),
+        ("proc_add_sma20_sma_200_diff", lambda df, cont, cat: p.proc_add_sma20_sma_200_diff(df, cont, stock)),
+        ("proc_add_sma20", lambda df, cont, cat: p.proc_add_sma20(df, cont, stock, add_diff=True)),
+        ("proc_add_sma200", lambda df, cont, cat: p.proc_add_sma200(df, cont, stock, add_diff=True)),
+        ("proc_add_ema10", lambda df, cont, cat: p.proc_add_ema10(df, cont, stock, add_diff=True)),
+        ("proc_add_ema30", lambda df, cont, cat: p.proc_add_ema30(df, cont, stock, add_diff=True)),
+        ("proc_add_wma5", lambda df, cont, cat: p.proc_add_wma5(df, cont, stock, add_diff=True)),
+        ("proc_add_wma20", lambda df, cont, cat: p.proc_add_wma20(df, cont, stock, add_diff=True)),
+        ("proc_add_wma60", lambda df, cont, cat: p.proc_add_wma60(df, cont, stock, add_diff=True)),
+        ("proc_add_mov_avg", lambda df, cont, cat: p.proc_add_mov_avg(df, cont, stock, "sma", 20,
+                                                                       add_ohlc_diff=True)),
+    ]
+
+
+def generate_data(nr_rows: int, cache_folder: str, seed: int = 42):
+    """
+    Generates nr_rows one minute bars and stores all indicators in the given TechInd cache folder.
+    A continuous session from 1900 keeps 100M minute bars within the datetime64 range.
+    :return: pandas data frame
+    """
+    df = sd.generate_ohlcv(nr_rows, start="1900-01-01", interval=INTERVAL.INTERVAL.ONE_MIN,
+                           session="continuous", seed=seed)
+    sd.write_tech_indicators(df, stock, cache_folder)
+    return df
+
+
+def available_memory():
+    """ Returns the available physical memory in bytes, or None if unknown """
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def time_case(func, df, nr_repeats: int = repeats):
+    """
+    Runs the given case nr_repeats times on a fresh copy of the frame, since most procs modify it in place.
+    Copying is not timed.
+    :return: fastest wall time in seconds
+    """
+    best = float("inf")
+    for _ in range(nr_repeats):
+        data = df.copy()
+        start = time.perf_counter()
+        func(data, [], [])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def record(kind: str, name: str, nr_rows: int, nr_bytes: int, seconds: float = None, status: str = "ok"):
+    return dict(kind=kind,
+                name=name,
+                rows=nr_rows,
+                seconds=seconds,
+                rows_per_sec=nr_rows / seconds if seconds else None,
+                mb_per_sec=nr_bytes / 2 ** 20 / seconds if seconds else None,
+                status=status)
+
+
+def run(row_sizes=None, flows=None, nr_repeats: int = repeats, include_procs: bool = True):
+    """
+    Runs all procs and ProcFlows for each size and prints one line per run.
+
+    :param row_sizes: list of row counts. 10k, 1M, and 100M by default
+    :param flows: list of ProcFlow ids. All flows by default
+    :param nr_repeats: number of runs per case. The fastest run counts.
+    :param include_procs: benchmarks each proc individually. True by default
+    :return: list of result dictionaries
+    """
+    results = []
+    pf = ProcFlow(DBG)
+    folder = t.cache_folder
+    with tempfile.TemporaryDirectory(prefix="proc-bench-") as tmp:
+        t.cache_folder = tmp
+        try:
+            for nr_rows in row_sizes or sizes:
+                # 6 columns of 8 bytes each
+                needed = nr_rows * 6 * 8 * memory_factor
+                free = available_memory()
+                if free is not None and needed > free:
+                    print("%-30s %12d rows   skipped, needs ~%d MB of %d MB available"
+                          % ("all", nr_rows, needed // 2 ** 20, free // 2 ** 20))
+                    results.append(record("all", "all", nr_rows, 0, status="skipped"))
+                    continue
+
+                df = generate_data(nr_rows, tmp)
+                nr_bytes = int(df.memory_usage(index=True, deep=False).sum())
+
+                cases = proc_cases() if include_procs else []
+                cases = [("proc", name, func) for name, func in cases]
+                for flow_id in flows or flow_ids:
+                    cases.append(("flow", "proc_%02d" % flow_id, lambda df, cont, cat, i=flow_id:
+                                  pf.proc_switch(data=df, stock=stock, y_col=y_col, nr_n=5, proc_id=i)))
+
+                for kind, name, func in cases:
+                    try:
+                        seconds = time_case(func, df, nr_repeats)
+                        results.append(record(kind, name, nr_rows, nr_bytes, seconds))
+                    except (MemoryError, ValueError, KeyError) as e:
+                        results.append(record(kind, name, nr_rows, nr_bytes, status="failed: " + str(e)))
+                    r = results[-1]
+                    if r["seconds"] is None:
+                        print("%-30s %12d rows   %s" % (name, nr_rows, r["status"]))
+                    else:
+                        print("%-30s %12d rows   %10.3f s   %14.0f rows/s   %10.1f MB/s"
+                              % (name, nr_rows, r["seconds"], r["rows_per_sec"], r["mb_per_sec"]))
+                del df
+        finally:
+            t.cache_folder = folder
+
+    return results
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    out = None
+    if "--out" in args:
+        i = args.index("--out")
+        out = args[i + 1]
+        del args[i:i + 2]
+
+    results = run([int(a) for a in args] or None)
+    if out is not None:
+        with open(out, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,461 @@
+"""
+Synthetic market data for scale benchmarks.
+
+Prices follow a geometric Brownian motion with optional Merton jumps. Volume is log-normal
+and rises with the absolute return of the bar. Several symbols can share a common market factor.
+All generated frames have the shape CachedNetLoader.load_data returns:
+a Date column of datetime64 followed by Open, High, Low, Close, Volume as float, oldest bar first.
+Pass ascending=False for the newest-first order of the raw AlphaVantage responses.
+
+write_tech_indicators stores the indicators the procs merge, i.e. SMA or BBANDS, in the
+TechInd cache format so that every proc and ProcFlow runs offline on synthetic data.
+
+Usage:
+
+    from src.bench import SyntheticData as sd
+    df = sd.generate_ohlcv(nr_bars=1_000_000, interval=INTERVAL.INTERVAL.ONE_MIN, session="continuous", seed=42)
+    frames = sd.generate_universe(nr_symbols=100, nr_bars=5000, correlation=0.3, seed=42)
+"""
+
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src.enum import INTERVAL
+from src.enum import TECHIND
+from src.enum import Ticker
+from src.enum import TimeFrame
+from src.utils import DTypeManager as dm
+from src.utils.DataLoaderInf import DataLoaderInf
+
+
+DBG = False
+
+trading_days = 252
+# 09:30 to 16:00
+session_open = np.timedelta64(9 * 60 + 30, "m")
+session_minutes = 390
+
+# Column names of the AlphaVantage indicator responses
+bband_columns = ["Real Lower Band", "Real Middle Band", "Real Upper Band"]
+macd_columns = ["MACD", "MACD_Hist", "MACD_Signal"]
+
+# Indicator & time period of every cached indicator the procs load
+proc_indicators = [(TECHIND.TECHIND.SMA, 20), (TECHIND.TECHIND.SMA, 200),
+                   (TECHIND.TECHIND.EMA, 10), (TECHIND.TECHIND.EMA, 30),
+                   (TECHIND.TECHIND.WMA, 5), (TECHIND.TECHIND.WMA, 20), (TECHIND.TECHIND.WMA, 60),
+                   (TECHIND.TECHIND.BBANDS, 20), (TECHIND.TECHIND.MACD, 20), (TECHIND.TECHIND.RSI, 20),
+                   (TECHIND.TECHIND.MOM, 20), (TECHIND.TECHIND.OBV, 20), (TECHIND.TECHIND.ADX, 20)]
+
+
+def bars_per_year(timeframe: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                  interval: INTERVAL.INTERVAL = None,
+                  session: str = "equity"):
+    """
+    Returns the number of bars per year, which scales drift & volatility to one bar.
+    :param timeframe: [ENUM] DAILY, WEEKLY, MONTHLY. Ignored for intraday bars
+    :param interval: [ENUM] intraday interval. None for daily, weekly, and monthly bars
+    :param session: equity, 390 minutes on business days, or continuous, 24/7 like crypto markets
+    :return: float
+    """
+    if interval is not None:
+        minutes = int(interval.value.replace("min", ""))
+        if session == "continuous":
+            return 365 * 24 * 60 / minutes
+        return trading_days * session_minutes / minutes
+
+    if timeframe is TimeFrame.TimeFrame.WEEKLY:
+        return 52
+    if timeframe is TimeFrame.TimeFrame.MONTHLY:
+        return 12
+    return trading_days
+
+
+def generate_dates(nr_bars: int,
+                   start: str = "2000-01-03",
+                   timeframe: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                   interval: INTERVAL.INTERVAL = None,
+                   session: str = "equity"):
+    """
+    Returns ascending bar timestamps.
+    Intraday timestamps mark the end of each bar, as AlphaVantage does.
+
+    Note, datetime64[ns] ends in 2262. For 100M rows, use one minute bars with continuous session from 1900.
+
+    :param nr_bars: number of bars
+    :param start: first day
+    :param timeframe: [ENUM] DAILY, WEEKLY, MONTHLY. Ignored for intraday bars
+    :param interval: [ENUM] intraday interval. None for daily, weekly, and monthly bars
+    :param session: equity or continuous
+    :return: numpy array of datetime64[ns]
+    """
+    if interval is not None:
+        step = np.timedelta64(int(interval.value.replace("min", "")), "m")
+        if session == "continuous":
+            return (np.datetime64(start, "ns") + np.arange(1, nr_bars + 1) * step).astype("datetime64[ns]")
+
+        per_day = session_minutes // int(interval.value.replace("min", ""))
+        days = pd.bdate_range(start, periods=-(-nr_bars // per_day)).values
+        offsets = session_open + np.arange(1, per_day + 1) * step
+        return (days[:, None] + offsets[None, :]).ravel()[:nr_bars].astype("datetime64[ns]")
+
+    if timeframe is TimeFrame.TimeFrame.WEEKLY:
+        offset = pd.offsets.Week(weekday=4)
+    elif timeframe is TimeFrame.TimeFrame.MONTHLY:
+        offset = pd.offsets.BMonthEnd()
+    else:
+        offset = pd.offsets.BDay()
+    return pd.date_range(start, periods=nr_bars, freq=offset).values
+
+
+def generate_log_returns(nr_bars: int,
+                         mu: float = 0.07,
+                         sigma: float = 0.2,
+                         jump_intensity: float = 0.0,
+                         jump_mean: float = -0.02,
+                         jump_std: float = 0.05,
+                         periods_per_year: float = trading_days,
+                         market=None,
+                         correlation: float = 0.0,
+                         rng=None):
+    """
+    Returns log returns of a jump-diffusion (Merton) process, or of a plain GBM if jump_intensity is zero.
+
+    :param nr_bars: number of bars
+    :param mu: annual drift
+    :param sigma: annual volatility
+    :param jump_intensity: expected number of jumps per year
+    :param jump_mean: mean of the log jump size
+    :param jump_std: standard deviation of the log jump size
+    :param periods_per_year: number of bars per year
+    :param market: standard normal shocks of a common market factor. Optional
+    :param correlation: correlation of the shocks with the market factor
+    :param rng: numpy Generator
+    :return: numpy array of float64
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    dt = 1.0 / periods_per_year
+
+    shocks = rng.standard_normal(nr_bars)
+    if market is not None and correlation > 0:
+        shocks *= np.sqrt(1.0 - correlation)
+        shocks += np.sqrt(correlation) * market
+
+    returns = shocks
+    returns *= sigma * np.sqrt(dt)
+    returns += (mu - 0.5 * sigma ** 2) * dt
+
+    if jump_intensity > 0:
+        nr_jumps = rng.poisson(jump_intensity * dt, nr_bars)
+        jumping = np.flatnonzero(nr_jumps)
+        k = nr_jumps[jumping]
+        returns[jumping] += k * jump_mean + np.sqrt(k) * jump_std * rng.standard_normal(len(jumping))
+
+    return returns
+
+
+def ohlcv_from_returns(returns, dates, s0: float = 100.0, sigma_bar: float = 0.01,
+                       volume_mean: float = 1e6, volume_std: float = 0.5, ascending: bool = True, rng=None):
+    """
+    Builds an OHLCV frame from log returns.
+    Open gaps from the previous close, High & Low extend beyond Open & Close by a half-normal range,
+    and Volume is log-normal, scaled up by the absolute return of the bar.
+
+    :param returns: numpy array of log returns
+    :param dates: numpy array of datetime64, ascending
+    :param s0: start price
+    :param sigma_bar: volatility of one bar
+    :param volume_mean: median volume
+    :param volume_std: standard deviation of the log volume
+    :param ascending: oldest bar first if True, the default, like the loader. Newest bar first otherwise,
+                      like the raw AlphaVantage data.
+    :param rng: numpy Generator
+    :return: pandas data frame
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    nr_bars = len(returns)
+    dtype = dm.float_dtype()
+
+    close = np.cumsum(returns)
+    close = np.exp(close, out=close)
+    close *= s0
+
+    open_ = np.empty(nr_bars)
+    open_[0] = s0
+    open_[1:] = close[:-1]
+    gap = rng.standard_normal(nr_bars)
+    gap *= 0.1 * sigma_bar
+    open_ *= np.exp(gap, out=gap)
+
+    spread = np.abs(rng.standard_normal(nr_bars))
+    spread *= 0.5 * sigma_bar
+    spread = np.exp(spread, out=spread)
+    high = np.maximum(open_, close)
+    high *= spread
+    spread = np.abs(rng.standard_normal(nr_bars), out=spread)
+    spread *= -0.5 * sigma_bar
+    spread = np.exp(spread, out=spread)
+    low = np.minimum(open_, close)
+    low *= spread
+    del spread
+
+    volume = rng.standard_normal(nr_bars)
+    volume *= volume_std
+    volume = np.exp(volume, out=volume)
+    volume *= volume_mean
+    volume *= 1.0 + np.abs(returns) / sigma_bar
+    volume = np.round(volume, out=volume)
+
+    order = slice(None) if ascending else slice(None, None, -1)
+    return pd.DataFrame({"Date": dates[order],
+                         "Open": open_[order].astype(dtype, copy=False),
+                         "High": high[order].astype(dtype, copy=False),
+                         "Low": low[order].astype(dtype, copy=False),
+                         "Close": close[order].astype(dtype, copy=False),
+                         "Volume": volume[order].astype(dtype, copy=False)})
+
+
+def generate_ohlcv(nr_bars: int,
+                   start: str = "2000-01-03",
+                   timeframe: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                   interval: INTERVAL.INTERVAL = None,
+                   session: str = "equity",
+                   s0: float = 100.0,
+                   mu: float = 0.07,
+                   sigma: float = 0.2,
+                   jump_intensity: float = 0.0,
+                   jump_mean: float = -0.02,
+                   jump_std: float = 0.05,
+                   volume_mean: float = 1e6,
+                   ascending: bool = True,
+                   seed: int = None):
+    """
+    Returns synthetic OHLCV data for one symbol in the shape CachedNetLoader.load_data returns.
+
+    :param nr_bars: number of bars
+    :param start: first day
+    :param timeframe: [ENUM] DAILY, WEEKLY, MONTHLY. Ignored for intraday bars
+    :param interval: [ENUM] intraday interval, i.e. 1min. None for daily, weekly, and monthly bars
+    :param session: equity, 390 minutes on business days, or continuous, 24/7
+    :param s0: start price
+    :param mu: annual drift
+    :param sigma: annual volatility
+    :param jump_intensity: expected number of jumps per year. Zero, i.e. plain GBM, by default
+    :param jump_mean: mean of the log jump size
+    :param jump_std: standard deviation of the log jump size
+    :param volume_mean: median volume
+    :param ascending: oldest bar first if True, the default. Newest bar first otherwise.
+    :param seed: random seed. Same seed, same data.
+    :return: pandas data frame
+    """
+    rng = np.random.default_rng(seed)
+    periods = bars_per_year(timeframe, interval, session)
+    dates = generate_dates(nr_bars, start, timeframe, interval, session)
+    returns = generate_log_returns(nr_bars, mu, sigma, jump_intensity, jump_mean, jump_std, periods, rng=rng)
+    if DBG:
+        print("Generated ", nr_bars, " bars from ", dates[0], " to ", dates[-1])
+    return ohlcv_from_returns(returns, dates, s0, sigma / np.sqrt(periods), volume_mean,
+                              ascending=ascending, rng=rng)
+
+
+def generate_universe(nr_symbols: int,
+                      nr_bars: int,
+                      start: str = "2000-01-03",
+                      timeframe: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                      interval: INTERVAL.INTERVAL = None,
+                      session: str = "equity",
+                      correlation: float = 0.0,
+                      jump_intensity: float = 0.0,
+                      ascending: bool = True,
+                      seed: int = None):
+    """
+    Returns synthetic OHLCV data for many symbols on the same dates.
+    Drift, volatility, start price, and volume differ by symbol,
+    and all symbols share a common market factor with the given correlation.
+
+    :param nr_symbols: number of symbols, named SYN0000, SYN0001, ...
+    :param nr_bars: number of bars per symbol
+    :param start: first day
+    :param timeframe: [ENUM] DAILY, WEEKLY, MONTHLY. Ignored for intraday bars
+    :param interval: [ENUM] intraday interval. None for daily, weekly, and monthly bars
+    :param session: equity or continuous
+    :param correlation: correlation of all symbols with the market factor. Zero by default
+    :param jump_intensity: expected number of jumps per year
+    :param ascending: oldest bar first if True, the default. Newest bar first otherwise.
+    :param seed: random seed
+    :return: dictionary of symbol name and pandas data frame
+    """
+    rng = np.random.default_rng(seed)
+    periods = bars_per_year(timeframe, interval, session)
+    dates = generate_dates(nr_bars, start, timeframe, interval, session)
+    market = rng.standard_normal(nr_bars) if correlation > 0 else None
+
+    frames = {}
+    for i in range(nr_symbols):
+        mu = rng.uniform(-0.05, 0.15)
+        sigma = rng.uniform(0.1, 0.6)
+        s0 = rng.uniform(5.0, 500.0)
+        volume_mean = 10 ** rng.uniform(4, 7)
+        returns = generate_log_returns(nr_bars, mu, sigma, jump_intensity, periods_per_year=periods,
+                                       market=market, correlation=correlation, rng=rng)
+        frames["SYN%04d" % i] = ohlcv_from_returns(returns, dates, s0, sigma / np.sqrt(periods), volume_mean,
+                                                   ascending=ascending, rng=rng)
+    return frames
+
+
+def tech_indicator(df, indicator: TECHIND.TECHIND, time_period: int = 20):
+    """
+    Computes the given indicator from the OHLCV frame in the format of the AlphaVantage response,
+    i.e. a date index and one column per value.
+    MACD, MOM, and OBV ignore the time period, like the AlphaVantage endpoints TechInd calls.
+
+    :param df: pandas data frame with Date, High, Low, Close, Volume
+    :param indicator: [ENUM] SMA, EMA, WMA, BBANDS, MACD, RSI, MOM, OBV, ADX
+    :param time_period: number of bars
+    :return: pandas data frame
+    """
+    data = df.sort_values("Date")
+    close = data["Close"].astype(np.float64).reset_index(drop=True)
+    n = time_period
+
+    if indicator is TECHIND.TECHIND.SMA:
+        values = {"SMA": close.rolling(n).mean()}
+
+    elif indicator is TECHIND.TECHIND.EMA:
+        values = {"EMA": close.ewm(span=n, adjust=False).mean()}
+
+    elif indicator is TECHIND.TECHIND.WMA:
+        weights = np.arange(1, n + 1, dtype=np.float64)
+        weights /= weights.sum()
+        wma = np.full(len(close), np.nan)
+        if len(close) >= n:
+            wma[n - 1:] = np.lib.stride_tricks.sliding_window_view(close.to_numpy(), n) @ weights
+        values = {"WMA": wma}
+
+    elif indicator is TECHIND.TECHIND.BBANDS:
+        mid = close.rolling(n).mean()
+        std = close.rolling(n).std(ddof=0)
+        values = dict(zip(bband_columns, [mid - 2 * std, mid, mid + 2 * std]))
+
+    elif indicator is TECHIND.TECHIND.MACD:
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        signal = macd.ewm(span=9, adjust=False).mean()
+        values = dict(zip(macd_columns, [macd, macd - signal, signal]))
+
+    elif indicator is TECHIND.TECHIND.RSI:
+        diff = close.diff()
+        gain = diff.clip(lower=0).ewm(alpha=1 / n, adjust=False).mean()
+        loss = (-diff.clip(upper=0)).ewm(alpha=1 / n, adjust=False).mean()
+        values = {"RSI": 100 - 100 / (1 + gain / loss)}
+
+    elif indicator is TECHIND.TECHIND.MOM:
+        # AlphaVantage default period
+        values = {"MOM": close.diff(10)}
+
+    elif indicator is TECHIND.TECHIND.OBV:
+        volume = data["Volume"].astype(np.float64).reset_index(drop=True)
+        values = {"OBV": (np.sign(close.diff().fillna(0)) * volume).cumsum()}
+
+    elif indicator is TECHIND.TECHIND.ADX:
+        high = data["High"].astype(np.float64).reset_index(drop=True)
+        low = data["Low"].astype(np.float64).reset_index(drop=True)
+        up = high.diff()
+        down = -low.diff()
+        plus_dm = up.where((up > down) & (up > 0), 0.0)
+        minus_dm = down.where((down > up) & (down > 0), 0.0)
+        prev_close = close.shift(1)
+        true_range = np.maximum(high - low, np.maximum((high - prev_close).abs(), (low - prev_close).abs()))
+        atr = true_range.ewm(alpha=1 / n, adjust=False).mean()
+        plus_di = 100 * plus_dm.ewm(alpha=1 / n, adjust=False).mean() / atr
+        minus_di = 100 * minus_dm.ewm(alpha=1 / n, adjust=False).mean() / atr
+        dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+        values = {"ADX": dx.ewm(alpha=1 / n, adjust=False).mean()}
+
+    else:
+        raise ValueError("Unsupported indicator: " + indicator.name)
+
+    out = pd.DataFrame({k: np.asarray(v) for k, v in values.items()},
+                       index=pd.DatetimeIndex(data["Date"].to_numpy(), name="date"))
+    # AlphaVantage omits the warm-up period
+    return out.dropna()
+
+
+def write_tech_indicators(df, stock: Ticker, cache_folder: str, indicators=None):
+    """
+    Writes the indicators of the given frame to the TechInd cache so that
+    get_cached_tech_indicator loads them instead of sending web requests.
+
+    Usage:
+
+        from src.utils import TechInd as t
+        t.cache_folder = "cache-synthetic"
+        sd.write_tech_indicators(df, Ticker.Ticker.SPX, t.cache_folder)
+
+    :param df: pandas data frame with Date, High, Low, Close, Volume
+    :param stock: [ENUM] stock ticker
+    :param cache_folder: TechInd cache folder
+    :param indicators: list of tuples (indicator, time period). All indicators loaded by the procs by default
+    :return: list of file paths
+    """
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder)
+
+    paths = []
+    for indicator, time_period in indicators or proc_indicators:
+        path = cache_folder + "/" + stock.name + "-" + indicator.name + "-" + str(time_period) + ".csv"
+        tech_indicator(df, indicator, time_period).to_csv(path)
+        paths.append(path)
+        if DBG:
+            print("Stored ", indicator.name, time_period, " in ", path)
+    return paths
+
+
+class SyntheticDataLoader(DataLoaderInf):
+    """
+    DataLoader that returns synthetic data instead of web data. Data for a ticker are seeded by its name,
+    so the same ticker always returns the same data.
+
+    Usage:
+
+        n = SyntheticDataLoader(nr_bars=1_000_000)
+        df_all = n.load_data(Ticker.Ticker.SPX, TimeFrame.TimeFrame.DAILY, full=True)
+    """
+
+    def __init__(self, nr_bars: int = 5000, jump_intensity: float = 0.0, dbg: bool = False):
+        """
+        :param nr_bars: number of bars of the full data set. The compact data set has the last 100 bars.
+        :param jump_intensity: expected number of jumps per year
+        :param dbg: verbose - Console printout. False by default.
+        """
+        super().__init__(api_key="", dbg=dbg)
+        self.nr_bars = nr_bars
+        self.jump_intensity = jump_intensity
+
+    def load_local_data(self, path: str, vrb: bool = False):
+        if os.path.isfile(path):
+            return pd.read_csv(path)
+        return None
+
+    def load_web_data(self, stock: Ticker.Ticker, time_frame: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                      full: bool = True, vrb: bool = False):
+        return self.load_data(stock, time_frame, full, vrb)
+
+    def load_data(self, stock: Ticker.Ticker, timeframe: TimeFrame.TimeFrame = TimeFrame.TimeFrame.DAILY,
+                  full: bool = True, vrb: bool = False):
+        if vrb or self.DBG:
+            print("Generating synthetic data for stock: " + stock.name)
+        # same time span for all time frames, i.e. nr_bars / 21 bars on the monthly time frame
+        nr_bars = max(1, int(self.nr_bars * bars_per_year(timeframe) / trading_days))
+        df = generate_ohlcv(nr_bars, timeframe=timeframe, jump_intensity=self.jump_intensity,
+                            seed=zlib.crc32((stock.name + timeframe.name).encode()))
+        return df if full else df.tail(100)
+
+    def load_intraday_data(self, stock: Ticker.Ticker, interval: INTERVAL.INTERVAL = INTERVAL.INTERVAL.FIVE_MIN,
+                           full: bool = True, vrb: bool = False):
+        if vrb or self.DBG:
+            print("Generating synthetic intraday data for stock: " + stock.name)
+        df = generate_ohlcv(self.nr_bars, interval=interval, jump_intensity=self.jump_intensity,
+                            seed=zlib.crc32((stock.name + interval.value).encode()))
+        return df if full else df.tail(100)
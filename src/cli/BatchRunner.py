@@ -0,0 +1,366 @@
+"""
+Batch command line runner.
+
+Runs loaders, ProcFlows, and experiment preparation over a ticker universe on a process pool,
+one task per ticker (and flow). Completed tasks are recorded in a JSON checkpoint, so an interrupted
+run resumes where it stopped when started again with the same command and options.
+The default checkpoint is named after the command and a hash of the options, and gets deleted
+once all tasks have completed.
+
+Usage, from the project root:
+
+    python Batch.py fetch --tickers AAPL AMZN GOOGL --full
+    python Batch.py warm-cache --ticker-file universe.txt --workers 2
+    python Batch.py build-features --tickers all --flows 1 4 --workers 4 --memory-limit 4096
+    python Batch.py prepare-experiment --tickers AAPL --flows 4 --out experiments
+    python Batch.py bench -- --rows 100000 --threshold 10
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.enum import INTERVAL
+from src.enum import TECHIND
+from src.enum import TimeFrame
+from src.utils import SymbolRegistry as sr
+from src.utils.SymbolRegistry import SymbolRegistry
+
+
+DBG = False
+checkpoint_folder = "cache/checkpoints"
+out_folder = "out"
+y_col = "Close"
+
+# Indicators & time periods loaded by the ProcFlows
+cache_indicators = [(TECHIND.TECHIND.SMA, 20), (TECHIND.TECHIND.SMA, 200),
+                    (TECHIND.TECHIND.EMA, 10), (TECHIND.TECHIND.EMA, 30),
+                    (TECHIND.TECHIND.WMA, 5), (TECHIND.TECHIND.WMA, 20), (TECHIND.TECHIND.WMA, 60),
+                    (TECHIND.TECHIND.BBANDS, 20), (TECHIND.TECHIND.MACD, 20), (TECHIND.TECHIND.RSI, 20),
+                    (TECHIND.TECHIND.MOM, 20), (TECHIND.TECHIND.OBV, 20), (TECHIND.TECHIND.ADX, 20)]
+
+
+def resolve_tickers(names=None, files=None, registry: SymbolRegistry = None, intern: bool = False):
+    """
+    Resolves ticker names and ticker files to tickers. A ticker file contains one name per line,
+    lines starting with # are ignored. The name "all" selects every symbol of the registry.
+    Names of Ticker members resolve to the Ticker member, all other names to a Symbol of the registry.
+
+    :param names: list of ticker names
+    :param files: list of ticker file paths
+    :param registry: symbol registry. Registry with all Ticker members by default
+    :param intern: registers unknown names in the registry instead of rejecting them
+    :return: list of tickers & symbols without duplicates, in the given order
+    :raises ValueError: if a name is neither a Ticker member nor registered, unless intern is set
+    """
+    registry = registry if registry is not None else SymbolRegistry()
+    all_names = list(names or [])
+    for path in files or []:
+        with open(path) as f:
+            all_names.extend(line.split("#")[0].strip() for line in f)
+
+    tickers = []
+    for name in all_names:
+        if not name:
+            continue
+        if name.lower() == "all":
+            selected = [registry.resolve(s.name) for s in registry]
+        else:
+            try:
+                selected = [registry.resolve(name.upper(), intern=intern)]
+            except KeyError:
+                raise ValueError("Unknown ticker: " + name)
+        tickers.extend(s for s in selected if s not in tickers)
+    return tickers
+
+
+def make_tasks(command: str, tickers, flows=None):
+    """
+    Returns one task per ticker, or per ticker and flow for commands that apply a ProcFlow.
+    :return: list of task ids, i.e. build-features:AAPL:4
+    """
+    if command in ("build-features", "prepare-experiment"):
+        return ["%s:%s:%d" % (command, s.name, f) for s in tickers for f in flows]
+    return ["%s:%s" % (command, s.name) for s in tickers]
+
+
+def load_checkpoint(path: str):
+    """ Returns the completed task ids of the checkpoint, or an empty dictionary if there is none """
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, done: dict):
+    """ Writes the checkpoint atomically, so that an interrupted write keeps the previous checkpoint """
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(done, f, indent=2)
+    os.replace(tmp, path)
+
+
+def checkpoint_path(command: str, options: dict):
+    """
+    Returns the default checkpoint path of the given command & options. Runs with other options,
+    i.e. another timeframe or output folder, use another checkpoint and don't skip any task.
+    """
+    key = {k: v for k, v in options.items() if k not in ("retries", "backoff")}
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:10]
+    return "%s/%s-%s.json" % (checkpoint_folder, command, digest)
+
+
+def limit_memory(limit_mb: int):
+    """
+    Limits the address space of the current process, i.e. a worker, so that a runaway task fails
+    with a MemoryError instead of swapping the machine. Not available on Windows.
+    :param limit_mb: limit in MB. No limit if None
+    """
+    if not limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:
+        print("Memory limit not supported on this platform")
+        return
+    limit = limit_mb * 2 ** 20
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_task(task: str, options: dict):
+    """
+    Runs one task in the current process. Throttled web requests are retried with a linear back-off.
+    Must be defined at module level so that it can be pickled for the process pool.
+
+    :param task: task id, see make_tasks
+    :param options: dictionary of command line options
+    :return: dictionary with task, status, seconds, and detail
+    """
+    start = time.perf_counter()
+    parts = task.split(":")
+    command, flow = parts[0], int(parts[2]) if len(parts) > 2 else None
+
+    retries = max(0, options["retries"])
+    for attempt in range(retries + 1):
+        try:
+            stock = SymbolRegistry.load(options["registry"]).resolve(parts[1])
+            detail = _run_command(command, stock, flow, options)
+            return dict(task=task, status="ok", seconds=time.perf_counter() - start, detail=detail)
+        except ValueError as e:
+            # AlphaVantage signals an exceeded call frequency with a ValueError
+            if "call frequency" in str(e) and attempt < retries:
+                time.sleep(options["backoff"] * (attempt + 1))
+                continue
+            return dict(task=task, status="failed", seconds=time.perf_counter() - start, detail=str(e))
+        except Exception as e:
+            # a failed task must not abort the batch
+            return dict(task=task, status="failed", seconds=time.perf_counter() - start,
+                        detail=type(e).__name__ + ": " + str(e))
+
+
+def _run_command(command: str, stock, flow: int, options: dict):
+    # imported here, so that workers only import what their command needs
+    from src.utils import KeyManager as k
+    from src.utils.KeyManager import KEYS
+
+    timeframe = TimeFrame.TimeFrame[options["timeframe"]]
+
+    if command == "fetch":
+        from src.utils.CachedNetLoader import CachedNetLoader
+        n = CachedNetLoader(k.set_key(KEYS.ALPHA), DBG)
+        if options["interval"]:
+            df = n.load_intraday_data(stock, INTERVAL.INTERVAL(options["interval"]), options["full"], DBG)
+        else:
+            df = n.load_data(stock, timeframe, full=options["full"])
+        return "%d rows" % len(df)
+
+    if command == "warm-cache":
+        from src.utils import TechInd as t
+        from src.utils.CachedNetLoader import CachedNetLoader
+        n = CachedNetLoader(k.set_key(KEYS.ALPHA), DBG)
+        n.warm_cache(stock)
+        for indicator, time_period in cache_indicators:
+            t.get_cached_tech_indicator(indicator, stock, timeframe, time_period)
+        return "%d indicators" % len(cache_indicators)
+
+    if command == "build-features":
+        from src.procs.ProcFlow import ProcFlow
+        from src.utils.CachedNetLoader import CachedNetLoader
+        n = CachedNetLoader(k.set_key(KEYS.ALPHA), DBG)
+        df = n.load_data(stock, timeframe, full=options["full"])
+        df = ProcFlow(DBG).proc_switch(data=df, stock=stock, y_col=y_col, nr_n=options["nr_n"], proc_id=flow)
+        if options["tech"]:
+            from src.procs.TechProcs import TechProcs
+            df = TechProcs.calc_all_features(df, workers=1)
+        path = _out_path(options["out"], stock, flow) + ".csv"
+        df.to_csv(path, index=False)
+        return "%d x %d -> %s" % (df.shape[0], df.shape[1], path)
+
+    if command == "prepare-experiment":
+        from src.preps.Preperator import Preperator
+        data = Preperator().prepare_experiment(stock=stock, all_data=options["full"], proc_flow_id=flow,
+                                               copy_free=True, timeframe=timeframe, nr_n=options["nr_n"], DBG=DBG)
+        path = _out_path(options["out"], stock, flow)
+        data.save(path)
+        return "%d rows -> %s" % (len(data.all_data), path)
+
+    raise ValueError("Unknown command: " + command)
+
+
+def _out_path(folder: str, stock, flow: int):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return "%s/%s-proc_%02d" % (folder, stock.name, flow)
+
+
+def run(command: str, tasks, options: dict, workers: int = 1, memory_limit: int = None, checkpoint: str = None):
+    """
+    Runs all tasks that are not yet completed in the checkpoint on a process pool and prints progress.
+    With workers=1, all tasks run serial in the current process.
+
+    :param command: subcommand
+    :param tasks: list of task ids
+    :param options: dictionary of command line options passed to each task
+    :param workers: number of processes
+    :param memory_limit: address space limit per process in MB. No limit by default
+    :param checkpoint: path of the checkpoint file. No checkpoint if None
+    :return: list of result dictionaries of this run
+    """
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    todo = [task for task in tasks if task not in done]
+    if len(todo) < len(tasks):
+        print("Resuming %s: %d of %d tasks already done" % (command, len(tasks) - len(todo), len(tasks)))
+
+    results = []
+    start = time.perf_counter()
+
+    def completed(result):
+        results.append(result)
+        print("[%d/%d] %-36s %-6s %8.2f s  %s" % (len(results), len(todo), result["task"], result["status"],
+                                                 result["seconds"], result["detail"]))
+        if checkpoint and result["status"] == "ok":
+            done[result["task"]] = dict(seconds=result["seconds"], detail=result["detail"])
+            save_checkpoint(checkpoint, done)
+
+    if workers == 1:
+        limit_memory(memory_limit)
+        for task in todo:
+            completed(run_task(task, options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_memory, initargs=(memory_limit,)) as pool:
+            futures = [pool.submit(run_task, task, options) for task in todo]
+            for future in as_completed(futures):
+                completed(future.result())
+
+    print(summary(results, time.perf_counter() - start))
+    if checkpoint and os.path.isfile(checkpoint) and all(task in done for task in tasks):
+        # nothing left to resume
+        os.remove(checkpoint)
+    return results
+
+
+def summary(results, wall: float):
+    """ Returns the timing summary of the given results as text """
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] != "ok"]
+    lines = ["Tasks: %d ok, %d failed   Wall time: %.2f s" % (len(ok), len(failed), wall)]
+    if ok:
+        seconds = sorted(r["seconds"] for r in ok)
+        lines.append("Task time: total %.2f s   mean %.2f s   median %.2f s   max %.2f s (%s)"
+                     % (sum(seconds), sum(seconds) / len(seconds), seconds[len(seconds) // 2], seconds[-1],
+                        max(ok, key=lambda r: r["seconds"])["task"]))
+    for r in failed:
+        lines.append("FAILED %s: %s" % (r["task"], r["detail"]))
+    return "\n".join(lines)
+
+
+def non_negative(value: str) -> int:
+    """ argparse type of counts that must not be negative """
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("must not be negative: " + value)
+    return number
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog="Batch.py", description="Batch runner over a ticker universe")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--tickers", nargs="+", default=[], help="ticker names or all")
+    common.add_argument("--ticker-file", nargs="+", default=[], help="files with one ticker per line")
+    common.add_argument("--registry", default=sr.registry_file, help="symbol registry file")
+    common.add_argument("--intern", action="store_true", help="add unknown tickers to the symbol registry")
+    common.add_argument("--timeframe", default="DAILY", choices=[tf.name for tf in TimeFrame.TimeFrame])
+    common.add_argument("--full", action="store_true", help="full data set instead of the last 100 days")
+    common.add_argument("--workers", type=int, default=1, help="number of processes, 1 runs serial")
+    common.add_argument("--memory-limit", type=int, default=None, help="address space limit per process in MB")
+    common.add_argument("--retries", type=non_negative, default=3, help="retries of throttled web requests")
+    common.add_argument("--backoff", type=float, default=15.0, help="back-off of throttled requests in seconds")
+    common.add_argument("--checkpoint", default=None, help="checkpoint file. Default: cache/checkpoints/<cmd>-<options hash>.json")
+    common.add_argument("--restart", action="store_true", help="ignore the existing checkpoint")
+
+    fetch = commands.add_parser("fetch", parents=[common], help="load OHLCV data into the cache")
+    fetch.add_argument("--interval", default=None, choices=[i.value for i in INTERVAL.INTERVAL],
+                       help="load intraday data in the given interval")
+
+    commands.add_parser("warm-cache", parents=[common], help="load OHLCV data and all indicators into the cache")
+
+    flow = argparse.ArgumentParser(add_help=False)
+    flow.add_argument("--flows", nargs="+", type=int, default=[4], choices=[1, 2, 3, 4], help="ProcFlow ids")
+    flow.add_argument("--nr-n", type=int, default=5, help="nr_n parameter of the ProcFlow")
+    flow.add_argument("--out", default=out_folder, help="output folder")
+
+    features = commands.add_parser("build-features", parents=[common, flow], help="apply ProcFlows, write CSV")
+    features.add_argument("--tech", action="store_true", help="append all TechProcs features")
+
+    commands.add_parser("prepare-experiment", parents=[common, flow],
+                        help="prepare experiments, write memory-mappable containers")
+
+    bench = commands.add_parser("bench", help="run the benchmark harness, see src.bench.BenchHarness")
+    bench.add_argument("args", nargs=argparse.REMAINDER, help="arguments passed to the benchmark harness")
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+
+    if args.command == "bench":
+        from src.bench import BenchHarness
+        return BenchHarness.main([a for a in args.args if a != "--"])
+
+    try:
+        registry = SymbolRegistry.load(args.registry)
+        tickers = resolve_tickers(args.tickers, args.ticker_file, registry, intern=args.intern)
+        if args.intern:
+            # the workers resolve the tickers from the registry file
+            registry.save(args.registry)
+    except (ValueError, OSError) as e:
+        print(e)
+        return 2
+    if not tickers:
+        print("No tickers given. Use --tickers or --ticker-file")
+        return 2
+
+    tasks = make_tasks(args.command, tickers, getattr(args, "flows", None))
+    options = dict(registry=args.registry, timeframe=args.timeframe, full=args.full, retries=args.retries, backoff=args.backoff,
+                   interval=getattr(args, "interval", None), nr_n=getattr(args, "nr_n", 5),
+                   out=getattr(args, "out", out_folder), tech=getattr(args, "tech", False))
+
+    checkpoint = args.checkpoint or checkpoint_path(args.command, options)
+    if args.restart and os.path.isfile(checkpoint):
+        os.remove(checkpoint)
+
+    results = run(args.command, tasks, options, args.workers, args.memory_limit, checkpoint)
+    return 1 if any(r["status"] != "ok" for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Marvin Hansen'
+
+
+@dataclass(frozen=True)
+class BacktestResult:
+    """ Immutable result of the VectorBacktester for one or many signal variants.
+
+    All arrays have the variants as first axis and are aligned with the dates.
+    The frame properties return dates x variants frames that go straight into the
+    vectorized metrics, i.e. BaseMetrics().score_universe(result.returns_frame, benchmark).
+
+    Usage:
+
+        result = VectorBacktester(cost=0.0005).sweep({"flow-3": signals_3, "flow-4": signals_4}, prices)
+        result.equity_frame.plot()
+        sharpe = BaseMetrics().sharpe_ratios(result.returns_frame, risk_free_rate=0.0)
+    """
+    # Slots classes take up less memory and typically lead to faster access time
+    __slots__ = ['variants', 'dates', 'assets', 'returns', 'gross_returns', 'costs', 'turnover', 'equity', 'positions']
+    #
+    variants: List[str]
+    dates: pd.DatetimeIndex
+    assets: pd.Index
+    # net returns of the portfolio per period, after costs & slippage (variants x dates)
+    returns: np.ndarray
+    gross_returns: np.ndarray
+    costs: np.ndarray
+    # sum of absolute weight changes per period (variants x dates)
+    turnover: np.ndarray
+    equity: np.ndarray
+    # weights held during each period (variants x dates x assets)
+    positions: np.ndarray
+
+    @property
+    def returns_frame(self) -> pd.DataFrame:
+        """ Returns the net returns as dates x variants frame """
+        return pd.DataFrame(self.returns.T, index=self.dates, columns=self.variants)
+
+    @property
+    def equity_frame(self) -> pd.DataFrame:
+        """ Returns the equity curves as dates x variants frame """
+        return pd.DataFrame(self.equity.T, index=self.dates, columns=self.variants)
+
+    def positions_of(self, variant) -> pd.DataFrame:
+        """ Returns the weights held by the given variant as dates x assets frame """
+        return pd.DataFrame(self.positions[self.variants.index(variant)], index=self.dates, columns=self.assets)
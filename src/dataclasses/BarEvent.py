@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+__author__ = 'Marvin Hansen'
+
+
+@dataclass(frozen=True)
+class BarEvent:
+    """ Immutable bar event of the ReplayEngine.
+
+    Field names match the columns of the loaders, so streaming procs read
+    a BarEvent the same way as a row of a loader frame, i.e. bar.Close.
+    """
+    # Slots classes take up less memory and typically lead to faster access time
+    __slots__ = ['symbol', 'Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+    # Ticker, Symbol, or name
+    symbol: object
+    Date: np.datetime64
+    #
+    Open: float
+    High: float
+    Low: float
+    Close: float
+    Volume: float
@@ -0,0 +1,184 @@
+import os
+import pickle
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Marvin Hansen'
+
+
+@dataclass(frozen=True)
+class SplitDataContainer:
+    """ Immutable, copy-free data container class.
+
+    Holds one single backing frame plus the split index. Train & test data are
+    not stored but sliced on demand as views of the backing frame, thus
+    an experiment pins just one copy of the data in memory.
+
+    Usage:
+
+        data_pack = SplitDataContainer.from_frame(df_all, split_ratio=0.80, cat_vars=cat_vars, cont_vars=cont_vars)
+        df_train = data_pack.train_data
+        df_test = data_pack.test_data
+
+        # store as memory-mappable snapshot & reload in another process
+        data_pack.save("cache/AAPL-exp-4")
+        data_pack = SplitDataContainer.load("cache/AAPL-exp-4")
+    """
+    # Slots classes take up less memory and typically lead to faster access time
+    __slots__ = ['meta_data', 'split_ratio', 'split_index', 'data', 'cat_vars', 'cont_vars']
+    #
+    meta_data: bool
+    split_ratio: float
+    split_index: int
+    #
+    data: pd.DataFrame
+    # Even though SplitDataContainer is immutable, the list holding cont. & cat. variable names is not because
+    # Python does not have an immutable list in the standard lib.
+    cat_vars: List[str]
+    cont_vars: List[str]
+
+    @property
+    def all_data(self) -> pd.DataFrame:
+        """ Returns the backing frame """
+        return self.data
+
+    @property
+    def train_data(self) -> pd.DataFrame:
+        """ Returns a view of all rows before the split index """
+        return self.data.iloc[:self.split_index]
+
+    @property
+    def test_data(self) -> pd.DataFrame:
+        """ Returns a view of all rows after the split index """
+        return self.data.iloc[self.split_index:]
+
+    @staticmethod
+    def from_frame(df, split_ratio: float = 0.80, meta_data: bool = True,
+                   cat_vars: List[str] = None, cont_vars: List[str] = None, scaler=None):
+        """
+        Creates a container from the given frame. The split index is calculated the same
+        way as in Procs.split_data so that train & test data match the copied version.
+
+        :param df: pandas data frame
+        :param split_ratio: ratio between train & test
+        :param meta_data: True if cat_vars & cont_vars are set
+        :param cat_vars: categorial meta data
+        :param cont_vars: continous meta data
+        :param scaler: [Optional] Scaler (see Scalers) that gets fitted on the train rows only,
+                       and then scales the given frame in place, which backs the container without copy.
+                       A scaler without columns scales the float columns of cont_vars without cat_vars
+        :return: SplitDataContainer
+        """
+        assert split_ratio <= 1.00
+        assert split_ratio > 0.00
+
+        split_index = int(len(df) * split_ratio)
+        if scaler is not None:
+            scaler.select(df, cont_vars, cat_vars)
+            scaler.fit(df.iloc[:split_index])
+            scaler.transform(df)
+        return SplitDataContainer(meta_data=meta_data, split_ratio=split_ratio, split_index=split_index,
+                                  data=df, cat_vars=cat_vars, cont_vars=cont_vars)
+
+    def save(self, path: str):
+        """
+        Stores the container as snapshot in the given folder.
+        All columns of the same dtype are stored together in one .npy file, similar to pandas blocks,
+        and datetime columns are stored as int64. Timezone-aware datetime columns & indices are stored in UTC
+        together with their timezone and converted back on load. Object columns, i.e. strings,
+        are pickled in their block and can't be memory mapped. Column names, index, split & meta data are pickled in a separate file.
+
+        :param path: folder of the snapshot. Will be created if it does not exists.
+        :return: void
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        df = self.data
+        blocks = []
+        # group columns by dtype
+        for dtype, columns in df.columns.to_series().groupby(df.dtypes.astype(str)):
+            columns = columns.tolist()
+            tz = getattr(df[columns[0]].dtype, "tz", None)
+            if tz is not None:
+                values = np.column_stack([df[c].dt.tz_convert(None).to_numpy() for c in columns])
+            else:
+                values = df[columns].to_numpy()
+            is_date = np.issubdtype(values.dtype, np.datetime64)
+            if is_date:
+                values = values.astype("datetime64[ns]").view(np.int64)
+            is_object = values.dtype == object
+            f_name = "block-" + str(len(blocks)) + ".npy"
+            np.save(os.path.join(path, f_name), np.ascontiguousarray(values), allow_pickle=is_object)
+            blocks.append((f_name, columns, is_date, is_object, tz))
+
+        index_tz = getattr(df.index, "tz", None)
+        if isinstance(df.index, pd.RangeIndex):
+            index = (df.index.start, df.index.stop, df.index.step)
+        else:
+            index = None
+            values = df.index.tz_convert(None) if index_tz is not None else df.index
+            np.save(os.path.join(path, "index.npy"), values.to_numpy())
+
+        meta = dict(meta_data=self.meta_data, split_ratio=self.split_ratio, split_index=self.split_index,
+                    cat_vars=self.cat_vars, cont_vars=self.cont_vars,
+                    columns=df.columns.tolist(), blocks=blocks, index=index, index_tz=index_tz)
+        pickle.dump(meta, open(os.path.join(path, "meta.p"), "wb"))
+
+    @staticmethod
+    def load(path: str, mmap: bool = True):
+        """
+        Loads a snapshot stored with save. When mmap is true, the data are memory mapped read-only
+        and thus only pages actually accessed are read from disk. Several processes loading
+        the same snapshot share these pages. Object blocks are always read into memory.
+
+        :param path: folder of the snapshot
+        :param mmap: memory-map data files. True by default
+        :return: SplitDataContainer
+        """
+        mode = "r" if mmap else None
+        meta = pickle.load(open(os.path.join(path, "meta.p"), "rb"))
+
+        if meta["index"] is None:
+            index = pd.Index(np.load(os.path.join(path, "index.npy"), allow_pickle=True))
+            if meta.get("index_tz") is not None:
+                index = index.tz_localize("UTC").tz_convert(meta["index_tz"])
+        else:
+            index = pd.RangeIndex(*meta["index"])
+
+        blocks = []
+        zones = {}
+        for f_name, columns, is_date, *rest in meta["blocks"]:
+            # snapshots of earlier versions have no object flag & timezone
+            is_object = rest[0] if rest else False
+            if len(rest) > 1 and rest[1] is not None:
+                zones.update((name, rest[1]) for name in columns)
+            values = np.load(os.path.join(path, f_name), mmap_mode=None if is_object else mode, allow_pickle=is_object)
+            if is_date:
+                values = values.view("datetime64[ns]")
+            blocks.append((values, columns))
+
+        # The largest block backs the frame without copy. Concatenating blocks would copy all of them,
+        # thus the remaining (usually small) date & label blocks are inserted column by column.
+        blocks.sort(key=lambda b: b[0].size, reverse=True)
+        if not blocks:
+            # frame without columns
+            df = pd.DataFrame(index=index)
+        else:
+            values, columns = blocks[0]
+            df = pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+        position = {name: i for i, name in enumerate(meta["columns"])}
+        rest = [(values[:, i], name) for values, columns in blocks[1:] for i, name in enumerate(columns)]
+        for values, name in sorted(rest, key=lambda c: position[c[1]]):
+            df.insert(position[name], name, values)
+        # timezone-aware columns are stored in UTC
+        for name, tz in zones.items():
+            df[name] = df[name].dt.tz_localize("UTC").dt.tz_convert(tz)
+
+        return SplitDataContainer(meta_data=meta["meta_data"], split_ratio=meta["split_ratio"],
+                                  split_index=meta["split_index"], data=df,
+                                  cat_vars=meta["cat_vars"], cont_vars=meta["cont_vars"])
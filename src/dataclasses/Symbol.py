@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.enum.ASSET_CLASS import ASSET_CLASS
+
+__author__ = 'Marvin Hansen'
+
+
+@dataclass(frozen=True)
+class Symbol:
+    """ Immutable symbol of the SymbolRegistry.
+
+    Symbols have a name and an integer value like Ticker members, thus all loaders and procs
+    that take a Ticker take a Symbol, i.e. to build cache file names from stock.name.
+    The value is the dense integer id of the symbol in the registry.
+    """
+    # Slots classes take up less memory and typically lead to faster access time
+    __slots__ = ['name', 'value', 'exchange', 'asset_class', 'listed', 'delisted']
+    #
+    name: str
+    value: int
+    #
+    exchange: str
+    asset_class: ASSET_CLASS
+    # NaT if unknown or, for delisted, if still listed
+    listed: np.datetime64
+    delisted: np.datetime64
+
+    @property
+    def id(self) -> int:
+        return self.value
+
+    def is_active(self, day) -> bool:
+        """ Returns True if the symbol is listed on the given day """
+        day = np.datetime64(day, "D")
+        listed = np.isnat(self.listed) or self.listed <= day
+        return bool(listed and (np.isnat(self.delisted) or day < self.delisted))
@@ -0,0 +1,12 @@
+from enum import Enum, unique
+
+
+@unique
+class ASSET_CLASS(Enum):
+    UNKNOWN = 0
+    EQUITY = 1
+    INDEX = 2
+    ETF = 3
+    CRYPTO = 4
+    FX = 5
+    FUTURE = 6
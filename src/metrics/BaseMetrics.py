@@ -1,8 +1,7 @@
-import matplotlib
 import numpy as np
-import seaborn as sns
-from IPython.display import set_matplotlib_formats
+import pandas as pd
 
+from src.metrics.PeriodReturns import PeriodReturns
 from src.procs.OnlineVariance import OnlineVariance
 
 
@@ -16,38 +15,23 @@ class BaseMetrics:
 
     def monthly_return(self, df, plot: bool = False):
         """
+        Monthly returns of the close prices. See PeriodReturns for other periods and many assets at once.
 
-        :param df:
-        :param plot:
-        :return:
+        :param df: pandas data frame with DatetimeIndex and a Close, resp. close, column
+        :param plot: plots the returns as bar chart if True
+        :return: pandas series indexed by year & month
         """
-        # https://mybinder.org/v2/gh/mmngreco/quantdare_posts/master?filepath=calcular_retornos/agregate_returns.ipynb
-        data = df.asfreq('B')  # add frequency needed for some pandas functionalities releated with offsets
-        data.columns = data.columns.map(lambda col: col.lower())
-        # using close prices
-        prices = data.close.copy()
-        # we convert to DataFrame to make easy store more series.
-        results_storage = prices.to_frame().copy()
-        # extract some date information
-        results_storage['year'] = prices.index.year
-        results_storage['month'] = prices.index.month
-        results_storage['day'] = prices.index.day
-        results_storage['week_day'] = prices.index.dayofweek
-        results_storage['week_day_name'] = prices.index.strftime('%A')
-
-        # with "asfreq" we decimate the prices, then group by year and month, so we
-        # have all the prices at the end of the working month available in the DataFrame.
-        # Finally we calculate the return of this new series with "pct_change".
-        monthly_return = results_storage.asfreq('BM') \
-            .set_index(['year', 'month']) \
-            .close.pct_change()
+        close = "Close" if "Close" in df.columns else "close"
+        monthly_return = PeriodReturns().period_returns(df[close], "M")
+        monthly_return.index = pd.MultiIndex.from_arrays([monthly_return.index.year, monthly_return.index.month],
+                                                         names=["year", "month"])
+        monthly_return.name = "close"
 
         if plot:
             self.plot_this(monthly_return, bar=True, title='Trailing returns: Approach 2.1',
                            ylabel='Returns (parts per unit)', txt_ymin=-0.4, bottom_adj=0.25)
         return monthly_return
 
-
     def daily_returns(self, df, column_name: str = "Close", log: bool = False):
         """
         Adds daily returns for the given column in the given data frame.
@@ -138,6 +122,79 @@ class BaseMetrics:
         m2_ratio = (sharpe_ratio * benchmark_volatility) + risk_free_rate
         return m2_ratio
 
+    def sharpe_ratios(self, returns, risk_free_rate=2.0, days=255):
+        """
+        Vectorized sharpe_ratio over a 2-D returns array (dates x assets), one ratio per asset.
+        NaN returns are skipped, i.e. for assets with a shorter history.
+
+        :param returns: 2-D numpy array or pandas data frame with one column per asset
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year
+        :return: numpy array, or pandas series indexed by the columns of a data frame. A scalar for a series
+        """
+        mean, std, _ = _moments(returns)
+        return _like(returns, (mean - risk_free_rate) / (std * np.sqrt(days)))
+
+    def information_ratios(self, returns, benchmark_returns=12.0, days=252):
+        """
+        Vectorized information_ratio over a 2-D returns array (dates x assets), one ratio per asset.
+
+        :param returns: 2-D numpy array or pandas data frame with one column per asset
+        :param benchmark_returns: scalar, 1-D array with one return per date, or 2-D array with one benchmark per asset
+        :param days: number of periods per year
+        :return: numpy array, or pandas series indexed by the columns of a data frame
+        """
+        mean, std, _ = _moments(_values(returns) - _benchmark(benchmark_returns))
+        return _like(returns, mean / (std * np.sqrt(days)))
+
+    def m2_ratios(self, returns, benchmark_returns, risk_free_rate=2.0, days=255):
+        """
+        Vectorized m2_ratio over a 2-D returns array (dates x assets), one ratio per asset.
+
+        :param returns: 2-D numpy array or pandas data frame with one column per asset
+        :param benchmark_returns: 1-D array with one return per date, or 2-D array with one benchmark per asset
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year
+        :return: numpy array, or pandas series indexed by the columns of a data frame
+        """
+        sharpe = self.sharpe_ratios(_values(returns), risk_free_rate, days)
+        _, benchmark_std, _ = _moments(_benchmark(benchmark_returns))
+        return _like(returns, sharpe * benchmark_std * np.sqrt(days) + risk_free_rate)
+
+    def score_universe(self, returns, benchmark_returns, risk_free_rate=2.0, days=255, benchmark_excess=None,
+                       information_days=252):
+        """
+        Scores all assets in one call. Sharpe and M2 ratio share the moments of the returns.
+        Each column equals the matching vectorized ratio,
+        i.e. information equals information_ratios(returns, benchmark_returns).
+
+        :param returns: 2-D numpy array or pandas data frame with one column per asset
+        :param benchmark_returns: 1-D array with one return per date, or 2-D array with one benchmark per asset.
+                                  Used for the M2 ratio & the information ratio.
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year of the Sharpe & M2 ratio
+        :param benchmark_excess: [Optional] other benchmark return of the information ratio, scalar or array.
+                                 benchmark_returns by default
+        :param information_days: number of periods per year of the information ratio, as in information_ratio
+        :return: pandas data frame with the columns sharpe, information & m2 and one row per asset
+        """
+        values = _values(returns)
+        mean, std, count = _moments(values)
+        volatility = std * np.sqrt(days)
+        sharpe = (mean - risk_free_rate) / volatility
+
+        _, benchmark_std, _ = _moments(_benchmark(benchmark_returns))
+        m2 = sharpe * benchmark_std * np.sqrt(days) + risk_free_rate
+
+        if benchmark_excess is None:
+            benchmark_excess = benchmark_returns
+        excess_mean, excess_std, _ = _moments(values - _benchmark(benchmark_excess))
+        information = excess_mean / (excess_std * np.sqrt(information_days))
+
+        index = returns.columns if isinstance(returns, pd.DataFrame) else None
+        return pd.DataFrame({"sharpe": sharpe, "information": information, "m2": m2, "observations": count},
+                            index=index)
+
     def f1_score(self, y_true: list, y_pred: list):
         """
         The F1 score can be interpreted as a weighted average of the precision and recall,
@@ -156,6 +213,9 @@ class BaseMetrics:
         2) The classifier leaves out what it should leave out
         3) Overall accuracy and reliability of the classifier increases with its F1 score
 
+        Note, this version compares the sets of the given labels, not the labels per sample.
+        For per-sample and multi-class scores, i.e. of direction labels, use ClassificationMetrics.
+
         :param y_true: Ground truth (correct) target values.
         :param y_pred: Estimated targets as returned by a classifier.
 
@@ -179,7 +239,7 @@ class BaseMetrics:
         else:
             return 0
 
-    def __total_return(prices):
+    def __total_return(self, prices):
         """Retuns the return between the first and last value of the DataFrame.
         Parameters
         ----------
@@ -191,7 +251,7 @@ class BaseMetrics:
         """
         return prices.iloc[-1] / prices.iloc[0] - 1
 
-    def __total_return_from_returns(returns):
+    def __total_return_from_returns(self, returns):
         """Retuns the return between the first and last value of the DataFrame.
         Parameters
         ----------
@@ -207,24 +267,30 @@ class BaseMetrics:
                   output_file='imgs/fig.png', bottom_adj=0.25,
                   txt_ymin=-0.4, bar=False):
 
+        # plotting libraries are imported on first use to keep the import of BaseMetrics lightweight
+        import matplotlib
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from IPython.display import set_matplotlib_formats
+
         # prettify the figures
-        self.plt.style.use(['seaborn-white', 'seaborn-paper'])
+        plt.style.use(['seaborn-white', 'seaborn-paper'])
         matplotlib.rc('font', family='Times New Roman', size=15)
         set_matplotlib_formats('png', 'png', quality=90)
-        self.plt.rcParams['savefig.dpi'] = 150
-        self.plt.rcParams['figure.autolayout'] = False
-        self.plt.rcParams['figure.figsize'] = 8, 5
-        self.plt.rcParams['axes.labelsize'] = 10
-        self.plt.rcParams['axes.titlesize'] = 15
-        self.plt.rcParams['font.size'] = 12
-        self.plt.rcParams['lines.linewidth'] = 1.0
-        self.plt.rcParams['lines.markersize'] = 8
-        self.plt.rcParams['legend.fontsize'] = 12
-        self.plt.rcParams['ytick.labelsize'] = 11
-        self.plt.rcParams['xtick.labelsize'] = 11
-        self.plt.rcParams['font.family'] = 'Times New Roman'
-        self.plt.rcParams['font.serif'] = 'cm'
-        self.plt.rcParams['axes.grid'] = True
+        plt.rcParams['savefig.dpi'] = 150
+        plt.rcParams['figure.autolayout'] = False
+        plt.rcParams['figure.figsize'] = 8, 5
+        plt.rcParams['axes.labelsize'] = 10
+        plt.rcParams['axes.titlesize'] = 15
+        plt.rcParams['font.size'] = 12
+        plt.rcParams['lines.linewidth'] = 1.0
+        plt.rcParams['lines.markersize'] = 8
+        plt.rcParams['legend.fontsize'] = 12
+        plt.rcParams['ytick.labelsize'] = 11
+        plt.rcParams['xtick.labelsize'] = 11
+        plt.rcParams['font.family'] = 'Times New Roman'
+        plt.rcParams['font.serif'] = 'cm'
+        plt.rcParams['axes.grid'] = True
 
         kw_save = dict(bbox_iches='tight', transparent=True)
 
@@ -233,8 +299,48 @@ class BaseMetrics:
         else:
             ax = df.plot(title=title, figsize=figsize)
         sns.despine()
-        self.plt.ylabel(ylabel)
-        self.plt.tight_layout()
-        self.plt.text(0, txt_ymin, transform=ax.transAxes, fontsize=9)
-        self.plt.gcf().subplots_adjust(bottom=bottom_adj)
-        self.avefig(output_file, **kw_save)
+        plt.ylabel(ylabel)
+        plt.tight_layout()
+        plt.text(0, txt_ymin, transform=ax.transAxes, fontsize=9)
+        plt.gcf().subplots_adjust(bottom=bottom_adj)
+        plt.savefig(output_file, **kw_save)
+
+
+def _values(returns):
+    """ Returns the given returns as 2-D float64 numpy array """
+    values = np.asarray(returns, dtype=np.float64)
+    return values.reshape(-1, 1) if values.ndim == 1 else values
+
+
+def _benchmark(benchmark):
+    """ Returns a scalar as is, and a 1-D benchmark as column to broadcast over all assets """
+    if np.isscalar(benchmark):
+        return benchmark
+    return _values(benchmark)
+
+
+def _like(returns, values):
+    """ Returns the values as series indexed by the columns of a data frame, and as numpy array otherwise """
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(values, index=returns.columns)
+    if isinstance(returns, pd.Series):
+        return values[0]
+    return values
+
+
+def _moments(values):
+    """
+    Mean & sample standard deviation of each column over all non-NaN values, as pandas mean() & std() do.
+    :return: tuple (mean, std, count) of numpy arrays
+    """
+    values = _values(values)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    if count.sum() == values.size:
+        # no NaN, skip the masking
+        return values.mean(axis=0), values.std(axis=0, ddof=1), count
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, values, 0.0).sum(axis=0) / count
+        deviation = np.where(valid, values - mean, 0.0)
+        std = np.sqrt((deviation * deviation).sum(axis=0) / (count - 1))
+    return mean, std, count
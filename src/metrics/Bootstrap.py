@@ -0,0 +1,217 @@
+"""
+Circular block bootstrap of metrics over a 2-D returns array (dates x assets).
+
+All resamples draw their block starts from one seeded generator upfront, so results only depend on the seed and
+all assets share the same resampled dates, which keeps their cross-correlation. Blocks wrap around the end of the
+series, and the last block of each resample gets cut to the length of the series.
+
+The built-in metrics mean, volatility, sharpe & information only need the sum and the sum of squares of each
+resample. These are the product of a (resamples x start positions) count matrix with the sums of the blocks at
+each start position, one matrix product per chunk of resamples, without materializing any resampled series.
+Any other metric is a function of an array (resamples, dates, assets) that returns an array (resamples, assets),
+and gets evaluated over chunks of gathered resamples.
+With workers > 1, the assets get split across processes. Custom metrics must be picklable then, i.e. module functions.
+
+Usage:
+
+    bs = Bootstrap(nr_resamples=10000, seed=42, workers=4)
+    ci = bs.confidence_interval(returns, metric="sharpe", confidence=0.95, risk_free_rate=0.0)
+    samples = bs.distribution(returns, metric="information", benchmark_returns=benchmark)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.metrics.BaseMetrics import _benchmark, _moments, _values
+
+
+DBG = False
+# Number of values per chunk of resamples, i.e. 2**24 float64 values take 128 MB
+chunk_elements = 2 ** 24
+metrics = ["mean", "volatility", "sharpe", "information"]
+
+
+class Bootstrap:
+
+    def __init__(self, nr_resamples: int = 10000, block_size: int = None, seed: int = 42, workers: int = 1):
+        """
+        :param nr_resamples: number of bootstrap resamples
+        :param block_size: number of consecutive dates per block. Defaults to the cube root of the number of dates
+        :param seed: seed of the block starts
+        :param workers: number of processes, 1 runs serial
+        """
+        self.nr_resamples = nr_resamples
+        self.block_size = block_size
+        self.seed = seed
+        self.workers = workers
+
+    def distribution(self, returns, metric="sharpe", risk_free_rate=2.0, days: int = 255,
+                     benchmark_returns=12.0, information_days: int = 252) -> np.ndarray:
+        """
+        Bootstrap distribution of the metric of each asset.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param metric: one of mean, volatility, sharpe, information, or a function of an array
+                       (resamples, dates, assets) that returns an array (resamples, assets)
+        :param risk_free_rate: risk free rate of the sharpe ratio, same unit as the returns
+        :param days: number of periods per year
+        :param benchmark_returns: benchmark of the information ratio. Scalar, or 1-D array with one return per date
+        :param information_days: number of periods per year of the information ratio, as in information_ratio
+        :return: numpy array (resamples, assets)
+        """
+        values = self.__prepare(returns, metric, benchmark_returns)
+        block_size = self.__block_size(len(values))
+        starts = block_starts(len(values), self.nr_resamples, block_size, self.seed)
+        params = dict(risk_free_rate=risk_free_rate, days=days, information_days=information_days)
+
+        if self.workers == 1 or values.shape[1] < 2:
+            return _distribution(values, starts, block_size, metric, params)
+
+        columns = np.array_split(np.arange(values.shape[1]), min(self.workers, values.shape[1]))
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(_distribution, values[:, c], starts, block_size, metric, params) for c in columns]
+            return np.hstack([future.result() for future in futures])
+
+    def confidence_interval(self, returns, metric="sharpe", confidence: float = 0.95, risk_free_rate=2.0,
+                            days: int = 255, benchmark_returns=12.0, information_days: int = 252) -> pd.DataFrame:
+        """
+        Percentile confidence interval of the metric of each asset.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param metric: see distribution
+        :param confidence: confidence level, i.e. 0.95
+        :return: pandas data frame with one row per asset and the columns estimate, lower, upper & std_error
+        """
+        samples = self.distribution(returns, metric, risk_free_rate, days, benchmark_returns, information_days)
+        values = self.__prepare(returns, metric, benchmark_returns)
+        estimate = _evaluate(values, metric, dict(risk_free_rate=risk_free_rate, days=days,
+                                                  information_days=information_days))
+
+        alpha = (1 - confidence) / 2
+        lower, upper = np.nanquantile(samples, [alpha, 1 - alpha], axis=0)
+        index = returns.columns if isinstance(returns, pd.DataFrame) else None
+        return pd.DataFrame({"estimate": estimate, "lower": lower, "upper": upper,
+                             "std_error": np.nanstd(samples, axis=0, ddof=1)}, index=index)
+
+    def __prepare(self, returns, metric, benchmark_returns):
+        values = _values(returns)
+        if np.isnan(values).any():
+            raise ValueError("Bootstrap requires returns without NaN, i.e. align the assets first.")
+        if metric == "information":
+            benchmark = benchmark_returns
+            if isinstance(benchmark, (pd.Series, pd.DataFrame)):
+                benchmark = benchmark.to_numpy(dtype=np.float64)
+            values = values - _benchmark(benchmark)
+        elif isinstance(metric, str) and metric not in metrics:
+            raise ValueError("Unknown metric " + metric + ", use one of " + ", ".join(metrics))
+        return values
+
+    def __block_size(self, nr_rows: int) -> int:
+        if self.block_size is not None:
+            return min(self.block_size, nr_rows)
+        return max(1, int(round(nr_rows ** (1 / 3))))
+
+
+def block_starts(nr_rows: int, nr_resamples: int, block_size: int, seed: int = 42) -> np.ndarray:
+    """
+    Random block starts of all resamples.
+    :return: numpy array (resamples, blocks) of start positions
+    """
+    nr_blocks = -(-nr_rows // block_size)
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, nr_rows, size=(nr_resamples, nr_blocks))
+
+
+def resample_indices(starts, nr_rows: int, block_size: int) -> np.ndarray:
+    """
+    Expands block starts to the row indices of each resample.
+    :return: numpy array (resamples, rows)
+    """
+    indices = starts[:, :, None] + np.arange(block_size)
+    return indices.reshape(len(starts), -1)[:, :nr_rows] % nr_rows
+
+
+def _distribution(values, starts, block_size: int, metric, params: dict) -> np.ndarray:
+    """ Metric of all resamples, in chunks of resamples """
+    nr_rows, nr_columns = values.shape
+    if isinstance(metric, str):
+        sums = _BlockSums(values, block_size)
+        chunk = max(1, chunk_elements // nr_rows)
+    else:
+        chunk = max(1, chunk_elements // (nr_rows * nr_columns))
+
+    out = np.empty((len(starts), nr_columns))
+    for start in range(0, len(starts), chunk):
+        stop = min(start + chunk, len(starts))
+        if isinstance(metric, str):
+            mean, std = sums.moments(starts[start:stop])
+            out[start:stop] = _from_moments(metric, mean, std, params)
+        else:
+            samples = values[resample_indices(starts[start:stop], nr_rows, block_size)]
+            out[start:stop] = metric(samples)
+        if DBG:
+            print("Resamples ", start, " to ", stop, " of ", len(starts))
+    return out
+
+
+def _evaluate(values, metric, params: dict) -> np.ndarray:
+    """ Metric of the original series """
+    if isinstance(metric, str):
+        mean, std, _ = _moments(values)
+        return _from_moments(metric, mean, std, params)
+    return metric(values[None])[0]
+
+
+def _from_moments(metric: str, mean, std, params: dict):
+    days = params["days"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if metric == "mean":
+            return mean
+        if metric == "volatility":
+            return std * np.sqrt(days)
+        if metric == "sharpe":
+            return (mean - params["risk_free_rate"]) / (std * np.sqrt(days))
+        # information, on the excess returns
+        return mean / (std * np.sqrt(params["information_days"]))
+
+
+class _BlockSums:
+    """ Sums & sums of squares of the centered values of the blocks at each start position, wrapping around """
+    __slots__ = ("nr_rows", "block_size", "last_size", "center", "full", "last")
+
+    def __init__(self, values, block_size: int):
+        self.nr_rows = len(values)
+        self.block_size = block_size
+        self.last_size = self.nr_rows - (-(-self.nr_rows // block_size) - 1) * block_size
+        self.center = values.mean(axis=0)
+
+        x = values - self.center
+        x = np.hstack([x, x * x])
+        x = np.vstack([x, x[:block_size]])
+        cumulative = np.zeros((len(x) + 1, x.shape[1]))
+        np.cumsum(x, axis=0, out=cumulative[1:])
+
+        positions = np.arange(self.nr_rows)
+        self.full = cumulative[positions + block_size] - cumulative[positions]
+        self.last = cumulative[positions + self.last_size] - cumulative[positions]
+
+    def moments(self, starts):
+        """
+        Mean & sample standard deviation of each resample of each column.
+        :param starts: block starts (resamples, blocks)
+        :return: tuple (mean, std) of numpy arrays (resamples, columns)
+        """
+        nr_resamples, nr_blocks = starts.shape
+        # how often each start position is used by the full blocks of each resample
+        flat = (np.arange(nr_resamples)[:, None] * self.nr_rows + starts[:, :-1]).ravel()
+        counts = np.bincount(flat, minlength=nr_resamples * self.nr_rows).reshape(nr_resamples, self.nr_rows)
+        sums = counts.astype(np.float64) @ self.full + self.last[starts[:, -1]]
+
+        nr_columns = sums.shape[1] // 2
+        total, squares = sums[:, :nr_columns], sums[:, nr_columns:]
+        mean = total / self.nr_rows
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.maximum(squares - total * mean, 0.0) / (self.nr_rows - 1))
+        return mean + self.center, std
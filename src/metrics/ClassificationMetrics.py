@@ -0,0 +1,131 @@
+"""
+Multi-class classification metrics for integer labels, i.e. the direction labels of proc_add_direction.
+
+Confusion matrices get counted with a single bincount, also for a batch of many models or folds at once,
+and all metrics derive from the confusion matrices: per-class precision, recall & F1, their macro, micro & weighted
+averages, accuracy, and the multi-class Matthews correlation coefficient.
+Samples with a NaN or unknown label in either y_true or y_pred are skipped, so NaN can pad batches of unequal length.
+Precision, recall & F1 of a class without predictions, resp. samples, are 0.
+
+Usage:
+
+    cm = ClassificationMetrics()
+    scores = cm.scores(y_true, y_pred)                            # dictionary of metrics
+    report = cm.report(y_true, y_pred)                            # per-class data frame
+    folds = cm.scores(y_true_folds, y_pred_folds)["macro_f1"]     # one value per row of 2-D input
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DBG = False
+# Labels of proc_add_direction, from SKYFALL to SKY_UP
+direction_labels = [-7, -3, -1, 0, 1, 3, 5, 7]
+
+
+class ClassificationMetrics:
+
+    def __init__(self, labels=None):
+        """
+        :param labels: class labels. Defaults to the direction labels of proc_add_direction
+        """
+        self.labels = np.sort(np.asarray(direction_labels if labels is None else labels))
+
+    def confusion_matrix(self, y_true, y_pred) -> np.ndarray:
+        """
+        Confusion matrix with the true labels as rows and the predicted labels as columns, in the order of the labels.
+
+        :param y_true: 1-D array of true labels, or 2-D array with one row per model or fold
+        :param y_pred: predicted labels, same shape as y_true
+        :return: numpy array (labels, labels), or (batch, labels, labels) for 2-D input
+        """
+        true, pred = np.asarray(y_true), np.asarray(y_pred)
+        if true.shape != pred.shape:
+            raise ValueError("y_true and y_pred must have the same shape, got " + str(true.shape) +
+                             " and " + str(pred.shape))
+        batch = np.atleast_2d(true)
+        nr_batch, nr_labels = len(batch), len(self.labels)
+
+        true_codes, true_valid = self.__encode(batch)
+        pred_codes, pred_valid = self.__encode(np.atleast_2d(pred))
+        valid = true_valid & pred_valid
+
+        rows = np.broadcast_to(np.arange(nr_batch)[:, None], batch.shape)
+        flat = (rows * nr_labels + true_codes) * nr_labels + pred_codes
+        counts = np.bincount(flat[valid], minlength=nr_batch * nr_labels * nr_labels)
+        matrix = counts.reshape(nr_batch, nr_labels, nr_labels)
+        if DBG:
+            print("Counted ", int(valid.sum()), " of ", valid.size, " samples")
+        return matrix if true.ndim > 1 else matrix[0]
+
+    def scores(self, y_true, y_pred) -> dict:
+        """
+        All metrics of the given labels, see scores_of.
+        """
+        return self.scores_of(self.confusion_matrix(y_true, y_pred))
+
+    def scores_of(self, matrix) -> dict:
+        """
+        Metrics of a confusion matrix, or of a batch of confusion matrices.
+
+        :param matrix: numpy array (labels, labels) or (batch, labels, labels)
+        :return: dictionary with the per-class arrays precision, recall, f1 & support, and the values accuracy,
+                 macro_ & weighted_ precision, recall & f1, micro_f1, and mcc. Per-class arrays have an extra
+                 leading batch axis and values become arrays for batched matrices
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        tp = np.diagonal(matrix, axis1=-2, axis2=-1)
+        support = matrix.sum(axis=-1)
+        predicted = matrix.sum(axis=-2)
+        total = support.sum(axis=-1)
+
+        precision = _divide(tp, predicted)
+        recall = _divide(tp, support)
+        f1 = _divide(2 * precision * recall, precision + recall)
+        weights = _divide(support, total[..., None])
+
+        accuracy = _divide(tp.sum(axis=-1), total)
+        return dict(precision=precision, recall=recall, f1=f1, support=support,
+                    accuracy=accuracy,
+                    macro_precision=precision.mean(axis=-1),
+                    macro_recall=recall.mean(axis=-1),
+                    macro_f1=f1.mean(axis=-1),
+                    weighted_precision=(precision * weights).sum(axis=-1),
+                    weighted_recall=(recall * weights).sum(axis=-1),
+                    weighted_f1=(f1 * weights).sum(axis=-1),
+                    # with all labels, micro precision, recall & F1 equal the accuracy
+                    micro_f1=accuracy,
+                    mcc=_mcc(tp.sum(axis=-1), total, support, predicted))
+
+    def report(self, y_true, y_pred) -> pd.DataFrame:
+        """
+        Per-class precision, recall, F1 & support of 1-D labels, followed by the macro & weighted averages.
+        :return: pandas data frame indexed by the labels
+        """
+        s = self.scores(y_true, y_pred)
+        df = pd.DataFrame({"precision": s["precision"], "recall": s["recall"], "f1": s["f1"],
+                           "support": s["support"]}, index=self.labels)
+        total = s["support"].sum()
+        df.loc["macro"] = [s["macro_precision"], s["macro_recall"], s["macro_f1"], total]
+        df.loc["weighted"] = [s["weighted_precision"], s["weighted_recall"], s["weighted_f1"], total]
+        return df
+
+    def __encode(self, labels):
+        """ Positions of the labels in self.labels, and a mask of the known labels """
+        codes = np.searchsorted(self.labels, labels)
+        codes = np.minimum(codes, len(self.labels) - 1)
+        valid = self.labels[codes] == labels
+        return codes, valid
+
+
+def _divide(numerator, denominator):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / denominator, 0.0)
+
+
+def _mcc(correct, total, support, predicted):
+    """ Multi-class Matthews correlation coefficient (Gorodkin), 0 if undefined """
+    covariance = correct * total - (support * predicted).sum(axis=-1)
+    denominator = np.sqrt((total ** 2 - (predicted ** 2).sum(axis=-1)) * (total ** 2 - (support ** 2).sum(axis=-1)))
+    return _divide(covariance, denominator)
@@ -0,0 +1,114 @@
+"""
+Calendar period returns (weekly, monthly, quarterly, yearly) of a dates x assets price matrix.
+
+The start dates of all calendar periods between the first and the last date get generated upfront, and np.searchsorted
+finds their positions in the sorted dates, so the last trading day of each period is known without grouping.
+The return of a period is the last price of the period over the last price of the previous period, as pct_change
+over period-end prices does, so the first period is NaN. Periods without trading days are left out.
+Missing prices get forward filled, so an asset without a price on the last trading day uses its last known price.
+
+Weeks start on Monday. Results are labeled with pandas periods, i.e. 2019-03 for March 2019.
+
+Usage:
+
+    pr = PeriodReturns()
+    monthly = pr.period_returns(prices, "M")    # prices: data frame with DatetimeIndex & one column per asset
+    labels, ends = pr.period_ends(prices.index, "W")
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DBG = False
+periods = ["W", "M", "Q", "Y"]
+
+
+class PeriodReturns:
+
+    def period_ends(self, dates, period: str = "M"):
+        """
+        Positions of the last date of each calendar period.
+
+        :param dates: ascending dates, i.e. a DatetimeIndex
+        :param period: W (weeks starting Monday), M, Q, or Y
+        :return: tuple (pandas PeriodIndex, numpy array of positions), one entry per period with at least one date
+        """
+        dates = pd.DatetimeIndex(dates).to_numpy(dtype="M8[ns]")
+        if len(dates) == 0:
+            return pd.PeriodIndex([], freq=_freq(period)), np.empty(0, dtype=np.int64)
+        if np.any(dates[1:] < dates[:-1]):
+            raise ValueError("Dates must be ascending.")
+
+        starts = _period_starts(dates[0], dates[-1], period)
+        positions = np.searchsorted(dates, starts, side="left")
+        ends = np.append(positions[1:], len(dates)) - 1
+        has_dates = ends >= positions
+        if DBG:
+            print("Found ", int(has_dates.sum()), " periods of ", period, " in ", len(dates), " dates")
+        labels = pd.PeriodIndex(pd.DatetimeIndex(starts[has_dates]), freq=_freq(period))
+        return labels, ends[has_dates]
+
+    def period_returns(self, prices, period: str = "M", dates=None):
+        """
+        Returns of every asset over each calendar period.
+
+        :param prices: pandas data frame or series with a DatetimeIndex, or a 2-D numpy array (dates x assets)
+        :param period: W (weeks starting Monday), M, Q, or Y
+        :param dates: dates of a numpy price matrix. Uses the index of pandas prices by default
+        :return: pandas data frame (periods x assets), resp. a series for a price series
+        """
+        if dates is None:
+            dates = prices.index
+        values = np.asarray(prices, dtype=np.float64)
+        values = values.reshape(-1, 1) if values.ndim == 1 else values
+
+        order = np.argsort(pd.DatetimeIndex(dates).to_numpy(dtype="M8[ns]"), kind="stable")
+        labels, ends = self.period_ends(pd.DatetimeIndex(dates)[order], period)
+        closes = _ffill(values[order])[ends]
+
+        returns = np.full(closes.shape, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns[1:] = closes[1:] / closes[:-1] - 1
+
+        if isinstance(prices, pd.Series):
+            return pd.Series(returns[:, 0], index=labels, name=prices.name)
+        columns = prices.columns if isinstance(prices, pd.DataFrame) else None
+        return pd.DataFrame(returns, index=labels, columns=columns)
+
+
+def _freq(period: str) -> str:
+    if period not in periods:
+        raise ValueError("Unknown period " + str(period) + ", use one of " + ", ".join(periods))
+    return "W-SUN" if period == "W" else period
+
+
+def _period_starts(first, last, period: str):
+    """ Start dates of all periods from the one of the first date to the one of the last date, as datetime64[ns] """
+    _freq(period)
+    if period == "W":
+        days = first.astype("M8[D]").astype(np.int64)
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        monday = days - (days + 3) % 7
+        starts = np.arange(monday, last.astype("M8[D]").astype(np.int64) + 1, 7).astype("M8[D]")
+    elif period == "Y":
+        starts = np.arange(first.astype("M8[Y]"), last.astype("M8[Y]") + 1)
+    else:
+        step = 3 if period == "Q" else 1
+        month = first.astype("M8[M]").astype(np.int64)
+        month -= month % step
+        starts = np.arange(month, last.astype("M8[M]").astype(np.int64) + 1, step).astype("M8[M]")
+    return starts.astype("M8[ns]")
+
+
+def _ffill(values):
+    """ Forward fills NaN along the dates of each column """
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values
+    rows = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = values[rows, np.arange(values.shape[1])]
+    # leading NaN stay NaN
+    filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+    return filled
@@ -0,0 +1,309 @@
+"""
+Drawdown & tail-risk metrics over a 2-D returns array (dates x assets), computed for all assets in one pass.
+
+Drawdowns follow the wealth compounded from the returns against its cumulative maximum, starting with a wealth of 1.
+Historical VaR & CVaR select the tail with np.partition, which finds the order statistics of all assets in linear time
+instead of sorting them. VaR matches pandas quantile, i.e. linear interpolation, and CVaR is the mean of the returns
+at or below the VaR quantile. Parametric VaR & CVaR assume normally distributed returns.
+VaR & CVaR are reported as positive losses in the unit of the returns, max drawdown as negative fraction, and
+drawdown durations in periods.
+
+Rolling VaR & CVaR evaluate windows of all assets as blocks of a strided view, sized to chunk_elements values,
+so memory stays bounded for long histories and large universes. Rolling drawdowns update the running peak of all
+windows at once per position within the window. Returns must be ascending.
+NaN returns are skipped, i.e. for assets with a shorter history, and count as a flat period in the drawdowns.
+
+Usage:
+
+    rm = RiskMetrics()
+    report = rm.risk_report(returns, level=0.95)
+    var_63 = rm.rolling_value_at_risk(returns, window=63, level=0.99)
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from src.metrics.BaseMetrics import _values
+from src.metrics.RollingMetrics import _RollingSums, _shaped_like
+
+
+DBG = False
+# Number of values per block of the rolling windows, i.e. 2**24 float64 values take 128 MB
+chunk_elements = 2 ** 24
+
+
+class RiskMetrics:
+
+    def wealth(self, returns):
+        """
+        Compounds the returns, i.e. the value of one unit invested at the start.
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :return: same type & shape as the returns
+        """
+        return _shaped_like(returns, _wealth(_values(returns)))
+
+    def drawdowns(self, returns):
+        """
+        Drawdown of the compounded wealth from its running peak at each date, 0 at a new peak.
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :return: same type & shape as the returns
+        """
+        drawdowns, _ = _drawdowns(_values(returns))
+        return _shaped_like(returns, drawdowns)
+
+    def max_drawdown(self, returns):
+        """
+        Largest drop of the compounded wealth from a previous peak.
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :return: negative fraction per asset
+        """
+        drawdowns, _ = _drawdowns(_values(returns))
+        return _per_asset(returns, drawdowns.min(axis=0))
+
+    def drawdown_duration(self, returns):
+        """
+        Longest number of periods spent below a previous peak.
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :return: number of periods per asset
+        """
+        _, durations = _drawdowns(_values(returns))
+        return _per_asset(returns, durations.max(axis=0))
+
+    def value_at_risk(self, returns, level: float = 0.95, parametric: bool = False):
+        """
+        Loss that is not exceeded with the given confidence level.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param level: confidence level, i.e. 0.95 or 0.99
+        :param parametric: assumes normally distributed returns if True, historical VaR otherwise
+        :return: positive loss per asset
+        """
+        values = _values(returns)
+        if parametric:
+            var, _ = _parametric(values, 1 - level)
+        else:
+            var, _ = _historical(values, 1 - level)
+        return _per_asset(returns, var)
+
+    def conditional_value_at_risk(self, returns, level: float = 0.95, parametric: bool = False):
+        """
+        Conditional VaR, resp. expected shortfall, i.e. the mean loss beyond the VaR.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param level: confidence level, i.e. 0.95 or 0.99
+        :param parametric: assumes normally distributed returns if True, historical CVaR otherwise
+        :return: positive loss per asset
+        """
+        values = _values(returns)
+        if parametric:
+            _, cvar = _parametric(values, 1 - level)
+        else:
+            _, cvar = _historical(values, 1 - level)
+        return _per_asset(returns, cvar)
+
+    def risk_report(self, returns, level: float = 0.95) -> pd.DataFrame:
+        """
+        All risk metrics of all assets in one call, i.e. for nightly reports.
+
+        :param returns: 2-D numpy array or pandas data frame with one column per asset
+        :param level: confidence level of VaR & CVaR
+        :return: pandas data frame with one row per asset and the columns max_drawdown, drawdown_duration,
+                 var, cvar, parametric_var & parametric_cvar
+        """
+        values = _values(returns)
+        drawdowns, durations = _drawdowns(values)
+        var, cvar = _historical(values, 1 - level)
+        parametric_var, parametric_cvar = _parametric(values, 1 - level)
+
+        index = returns.columns if isinstance(returns, pd.DataFrame) else None
+        return pd.DataFrame({"max_drawdown": drawdowns.min(axis=0), "drawdown_duration": durations.max(axis=0),
+                             "var": var, "cvar": cvar,
+                             "parametric_var": parametric_var, "parametric_cvar": parametric_cvar}, index=index)
+
+    def rolling_max_drawdown(self, returns, window: int = 252):
+        """
+        Max drawdown within the last window periods, measured from peaks inside the window.
+        :return: same type & shape as the returns, NaN for the first window-1 rows
+        """
+        drawdowns, _ = _rolling_drawdowns(_values(returns), window)
+        return _shaped_like(returns, drawdowns)
+
+    def rolling_drawdown_duration(self, returns, window: int = 252):
+        """
+        Longest drawdown within the last window periods, measured from peaks inside the window.
+        :return: same type & shape as the returns, NaN for the first window-1 rows
+        """
+        _, durations = _rolling_drawdowns(_values(returns), window)
+        return _shaped_like(returns, durations)
+
+    def rolling_value_at_risk(self, returns, window: int = 63, level: float = 0.95, parametric: bool = False):
+        """
+        VaR over the last window periods. Windows that contain NaN yield NaN.
+        :return: same type & shape as the returns, NaN for the first window-1 rows
+        """
+        values = _values(returns)
+        if parametric:
+            var, _ = _rolling_parametric(values, window, 1 - level)
+        else:
+            var = _rolling(values, window, lambda blocks: _tail(blocks, 1 - level)[0])
+        return _shaped_like(returns, var)
+
+    def rolling_conditional_value_at_risk(self, returns, window: int = 63, level: float = 0.95,
+                                          parametric: bool = False):
+        """
+        CVaR over the last window periods. Windows that contain NaN yield NaN.
+        :return: same type & shape as the returns, NaN for the first window-1 rows
+        """
+        values = _values(returns)
+        if parametric:
+            _, cvar = _rolling_parametric(values, window, 1 - level)
+        else:
+            cvar = _rolling(values, window, lambda blocks: _tail(blocks, 1 - level)[1])
+        return _shaped_like(returns, cvar)
+
+
+def _per_asset(returns, values):
+    """ Returns one value per asset as series indexed by the columns of a data frame, and as numpy array otherwise """
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(values, index=returns.columns)
+    if isinstance(returns, pd.Series) or np.ndim(returns) == 1:
+        return values[0]
+    return values
+
+
+def _wealth(values):
+    return np.cumprod(1.0 + np.nan_to_num(values, nan=0.0), axis=0)
+
+
+def _drawdowns(values):
+    """
+    Drawdowns & the number of periods since the last peak along the first axis.
+    The peak starts at a wealth of 1, so losses in the first periods count as drawdown.
+    :return: tuple (drawdowns, durations) of numpy arrays
+    """
+    wealth = _wealth(values)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=0)
+    drawdowns = wealth / peak - 1.0
+
+    periods = np.arange(1, len(values) + 1).reshape((-1,) + (1,) * (values.ndim - 1))
+    last_peak = np.maximum.accumulate(np.where(drawdowns < 0, 0, periods), axis=0)
+    return drawdowns, periods - last_peak
+
+
+def _historical(values, alpha: float):
+    """ Historical VaR & CVaR of each column over its non-NaN values """
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    var = np.full(values.shape[1], np.nan)
+    cvar = np.full(values.shape[1], np.nan)
+    # columns with the same number of values share the positions of their order statistics
+    for nr_values in np.unique(count[count > 0]):
+        columns = np.flatnonzero(count == nr_values)
+        block = values[:, columns]
+        if nr_values < len(values):
+            # NaN go last, so the order statistics of the values stay in front
+            block = np.where(valid[:, columns], block, np.inf)
+        var[columns], cvar[columns] = _tail(block.T, alpha, nr_values)
+    return var, cvar
+
+
+def _tail(blocks, alpha: float, nr_values: int = None):
+    """
+    VaR & CVaR along the last axis with linear interpolation between the order statistics.
+    NaN in the values yield NaN.
+    :param nr_values: number of leading values to use, all by default
+    :return: tuple (var, cvar) of numpy arrays
+    """
+    nr_values = blocks.shape[-1] if nr_values is None else nr_values
+    position = (nr_values - 1) * alpha
+    lower = int(np.floor(position))
+    upper = min(lower + 1, nr_values - 1)
+    part = np.partition(blocks, [lower, upper] if upper > lower else lower, axis=-1)
+
+    quantile = part[..., lower] + (position - lower) * (part[..., upper] - part[..., lower])
+    # the lower + 1 smallest values are at or below the quantile
+    cvar = part[..., :lower + 1].mean(axis=-1)
+
+    has_nan = np.isnan(blocks).any(axis=-1)
+    return np.where(has_nan, np.nan, -quantile), np.where(has_nan, np.nan, -cvar)
+
+
+def _normal_tail(mean, std, alpha: float):
+    """ VaR & CVaR of normally distributed returns """
+    normal = NormalDist()
+    z = normal.inv_cdf(alpha)
+    var = -(mean + z * std)
+    cvar = -(mean - std * normal.pdf(z) / alpha)
+    return var, cvar
+
+
+def _parametric(values, alpha: float):
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, values, 0.0).sum(axis=0) / count
+        deviation = np.where(valid, values - mean, 0.0)
+        std = np.sqrt((deviation * deviation).sum(axis=0) / (count - 1))
+    return _normal_tail(mean, std, alpha)
+
+
+def _rolling_parametric(values, window: int, alpha: float):
+    mean, std, _ = _RollingSums(values).moments(window)
+    return _normal_tail(mean, std, alpha)
+
+
+def _rolling(values, window: int, func):
+    """
+    Applies func to all windows of all columns, in blocks of rows of a strided view.
+    :param func: function of an array (rows, columns, window) that returns an array (rows, columns)
+    :return: numpy array aligned with the values, NaN for the first window-1 rows
+    """
+    nr_rows, nr_columns = values.shape
+    out = np.full(values.shape, np.nan)
+    if window > nr_rows:
+        return out
+
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    block_rows = max(1, chunk_elements // (nr_columns * window))
+    for start in range(0, len(windows), block_rows):
+        stop = min(start + block_rows, len(windows))
+        out[window - 1 + start:window - 1 + stop] = func(windows[start:stop])
+        if DBG:
+            print("Rolling windows ", start, " to ", stop, " of ", len(windows))
+    return out
+
+
+def _rolling_drawdowns(values, window: int):
+    """
+    Max drawdown & longest drawdown of all windows. Steps through the positions within the window and
+    updates the running peak of all windows of all columns at once, on the log wealth.
+    :return: tuple (max drawdowns, durations) of numpy arrays aligned with the values
+    """
+    nr_rows = len(values)
+    drawdowns = np.full(values.shape, np.nan)
+    durations = np.full(values.shape, np.nan)
+    if window > nr_rows:
+        return drawdowns, durations
+
+    # log wealth before each period, so that the wealth before the first period of each window is its first peak
+    log_wealth = np.zeros((nr_rows + 1, values.shape[1]))
+    np.cumsum(np.log1p(np.nan_to_num(values, nan=0.0)), axis=0, out=log_wealth[1:])
+
+    nr_windows = nr_rows - window + 1
+    peak = log_wealth[:nr_windows].copy()
+    max_drawdown = np.zeros_like(peak)
+    duration = np.zeros_like(peak)
+    longest = np.zeros_like(peak)
+    for offset in range(1, window + 1):
+        x = log_wealth[offset:offset + nr_windows]
+        np.maximum(peak, x, out=peak)
+        drawdown = x - peak
+        np.minimum(max_drawdown, drawdown, out=max_drawdown)
+        duration = np.where(drawdown < 0, duration + 1, 0.0)
+        np.maximum(longest, duration, out=longest)
+
+    drawdowns[window - 1:] = np.expm1(max_drawdown)
+    durations[window - 1:] = longest
+    return drawdowns, durations
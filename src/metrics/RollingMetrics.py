@@ -0,0 +1,358 @@
+"""
+Rolling versions of the risk-adjusted metrics of BaseMetrics over a 2-D returns array (dates x assets).
+
+Window sums & sums of squares are differences of cumulative sums, so each window costs O(1) regardless of its length,
+and the cumulative sums are computed once and shared by all windows. Returns are centered on their column mean first,
+which keeps the difference of two large cumulative sums precise over long histories.
+Like pandas rolling, a window that contains NaN yields NaN unless min_periods is set lower than the window.
+Results are aligned with the input: the value at row t covers the rows t-window+1 to t, so returns must be ascending.
+
+StreamingRatios keeps the same metrics up to date for many assets at once as new returns arrive, in O(assets) per update.
+
+Usage:
+
+    rm = RollingMetrics()
+    sharpe_63 = rm.rolling_sharpe(returns, window=63)
+    scores = rm.rolling_scores(returns, benchmark_returns, windows=(63, 126, 252))
+    scores["sharpe", 252]
+
+    live = StreamingRatios(window=63, nr_assets=returns.shape[1])
+    live.replay(returns, benchmark_returns)
+    live.update(todays_returns, todays_benchmark_return)
+    live.sharpe()
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.metrics.BaseMetrics import _benchmark, _values
+
+
+DBG = False
+# Windows of rolling_scores, i.e. a quarter, half a year, and a year of trading days
+windows = (63, 126, 252)
+
+
+class RollingMetrics:
+
+    def rolling_volatility(self, returns, window: int = 63, days: int = 255, min_periods: int = None):
+        """
+        Rolling annualized volatility, i.e. the rolling sample standard deviation times the square root of days.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param window: number of periods per window
+        :param days: number of periods per year
+        :param min_periods: minimum number of non-NaN values per window. Defaults to the window
+        :return: same type & shape as the returns
+        """
+        _, std, _ = _RollingSums(_values(returns)).moments(window, min_periods)
+        return _shaped_like(returns, std * np.sqrt(days))
+
+    def rolling_sharpe(self, returns, window: int = 63, risk_free_rate=2.0, days: int = 255, min_periods: int = None):
+        """
+        Rolling sharpe_ratio over the last window periods of each asset.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param window: number of periods per window
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year
+        :param min_periods: minimum number of non-NaN values per window. Defaults to the window
+        :return: same type & shape as the returns
+        """
+        mean, std, _ = _RollingSums(_values(returns)).moments(window, min_periods)
+        return _shaped_like(returns, _sharpe(mean, std, risk_free_rate, days))
+
+    def rolling_information(self, returns, window: int = 63, benchmark_returns=12.0, days: int = 252,
+                            min_periods: int = None):
+        """
+        Rolling information_ratio over the last window periods of each asset.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param window: number of periods per window
+        :param benchmark_returns: scalar, 1-D array with one return per date, or 2-D array with one benchmark per asset
+        :param days: number of periods per year
+        :param min_periods: minimum number of non-NaN values per window. Defaults to the window
+        :return: same type & shape as the returns
+        """
+        excess = _values(returns) - _benchmark(_values_of(benchmark_returns))
+        mean, std, _ = _RollingSums(excess).moments(window, min_periods)
+        return _shaped_like(returns, _sharpe(mean, std, 0.0, days))
+
+    def rolling_m2(self, returns, benchmark_returns, window: int = 63, risk_free_rate=2.0, days: int = 255,
+                   min_periods: int = None):
+        """
+        Rolling m2_ratio over the last window periods of each asset and of the benchmark.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param benchmark_returns: 1-D array with one return per date, or 2-D array with one benchmark per asset
+        :param window: number of periods per window
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year
+        :param min_periods: minimum number of non-NaN values per window. Defaults to the window
+        :return: same type & shape as the returns
+        """
+        mean, std, _ = _RollingSums(_values(returns)).moments(window, min_periods)
+        _, benchmark_std, _ = _RollingSums(_values(_values_of(benchmark_returns))).moments(window, min_periods)
+        m2 = _sharpe(mean, std, risk_free_rate, days) * benchmark_std * np.sqrt(days) + risk_free_rate
+        return _shaped_like(returns, m2)
+
+    def rolling_scores(self, returns, benchmark_returns, windows=windows, risk_free_rate=2.0, days: int = 255,
+                       benchmark_excess=None, information_days: int = 252, min_periods: int = None) -> dict:
+        """
+        Rolling volatility, sharpe, information & m2 ratio of all assets for all windows in one call.
+        The cumulative sums of the returns, the benchmark & the excess returns get computed once for all windows.
+
+        :param returns: 1-D or 2-D numpy array, pandas series or data frame with one column per asset
+        :param benchmark_returns: 1-D array with one return per date, or 2-D array with one benchmark per asset.
+                                  Used for the M2 ratio & the information ratio.
+        :param windows: window lengths
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year of volatility, sharpe & m2 ratio
+        :param benchmark_excess: [Optional] other benchmark return of the information ratio, scalar or array.
+                                 benchmark_returns by default
+        :param information_days: number of periods per year of the information ratio, as in rolling_information
+        :param min_periods: minimum number of non-NaN values per window. Defaults to each window
+        :return: dictionary of (metric, window) -> same type & shape as the returns,
+                 with metric one of volatility, sharpe, information, m2
+        """
+        values = _values(returns)
+        sums = _RollingSums(values)
+        benchmark_sums = _RollingSums(_values(_values_of(benchmark_returns)))
+        if benchmark_excess is None:
+            benchmark_excess = benchmark_returns
+        excess_sums = _RollingSums(values - _benchmark(_values_of(benchmark_excess)))
+
+        scores = {}
+        for window in windows:
+            mean, std, _ = sums.moments(window, min_periods)
+            _, benchmark_std, _ = benchmark_sums.moments(window, min_periods)
+            excess_mean, excess_std, _ = excess_sums.moments(window, min_periods)
+            sharpe = _sharpe(mean, std, risk_free_rate, days)
+
+            scores["volatility", window] = _shaped_like(returns, std * np.sqrt(days))
+            scores["sharpe", window] = _shaped_like(returns, sharpe)
+            information = _sharpe(excess_mean, excess_std, 0.0, information_days)
+            scores["information", window] = _shaped_like(returns, information)
+            scores["m2", window] = _shaped_like(returns, sharpe * benchmark_std * np.sqrt(days) + risk_free_rate)
+            if DBG:
+                print("Scored window ", window, " of ", values.shape[1], " assets")
+        return scores
+
+
+class StreamingRatios:
+    """
+    Rolling volatility, sharpe, information & m2 ratio of many assets, updated with one row of returns at a time.
+
+    Keeps the last window returns of each asset in a ring buffer together with their running sums & sums of squares,
+    so each update adds the new and removes the dropped returns in O(assets). The running sums get recomputed
+    from the buffer once per window to stop rounding errors from piling up.
+    Replaying a returns array yields the last row of the corresponding rolling_ metric.
+    """
+    __slots__ = ("window", "risk_free_rate", "days", "benchmark_excess", "information_days", "returns", "benchmark",
+                 "pos", "nr_updates", "sums", "benchmark_sums", "excess_sums")
+
+    def __init__(self, window: int = 63, nr_assets: int = 1, risk_free_rate=2.0, days: int = 255,
+                 benchmark_excess=None, information_days: int = 252):
+        """
+        :param window: number of periods per window
+        :param nr_assets: number of assets
+        :param risk_free_rate: same unit as the returns
+        :param days: number of periods per year of volatility, sharpe & m2 ratio
+        :param benchmark_excess: [Optional] scalar benchmark return of the information ratio.
+                                 The benchmark return of each update by default, as in rolling_scores
+        :param information_days: number of periods per year of the information ratio
+        """
+        self.window = window
+        self.risk_free_rate = risk_free_rate
+        self.days = days
+        self.benchmark_excess = benchmark_excess
+        self.information_days = information_days
+        self.returns = np.full((window, nr_assets), np.nan)
+        self.benchmark = np.full((window, 1), np.nan)
+        self.pos = 0
+        self.nr_updates = 0
+        self.sums = _RunningSums(nr_assets)
+        self.benchmark_sums = _RunningSums(1)
+        self.excess_sums = _RunningSums(nr_assets)
+
+    def update(self, returns, benchmark_return=np.nan):
+        """
+        Adds the returns of the next period.
+        :param returns: one return per asset
+        :param benchmark_return: return of the benchmark, used for the M2 ratio & the information ratio
+        """
+        returns = np.asarray(returns, dtype=np.float64).reshape(-1)
+        benchmark = np.array([benchmark_return], dtype=np.float64)
+
+        if self.nr_updates >= self.window:
+            dropped = self.returns[self.pos]
+            self.sums.remove(dropped)
+            self.excess_sums.remove(self.__excess(dropped, self.benchmark[self.pos]))
+            self.benchmark_sums.remove(self.benchmark[self.pos])
+
+        self.returns[self.pos] = returns
+        self.benchmark[self.pos] = benchmark
+        self.sums.add(returns)
+        self.excess_sums.add(self.__excess(returns, benchmark))
+        self.benchmark_sums.add(benchmark)
+
+        self.pos = (self.pos + 1) % self.window
+        self.nr_updates += 1
+        if self.pos == 0:
+            self.sums.reset(self.returns)
+            self.excess_sums.reset(self.__excess(self.returns, self.benchmark))
+            self.benchmark_sums.reset(self.benchmark)
+
+    def replay(self, returns, benchmark_returns=None):
+        """
+        Updates with each row of the given returns, i.e. to warm up on history.
+        :param returns: 2-D array (dates x assets), ascending
+        :param benchmark_returns: 1-D array with one return per date
+        """
+        returns = _values(returns)
+        benchmark = np.full(len(returns), np.nan) if benchmark_returns is None \
+            else np.asarray(benchmark_returns, dtype=np.float64).reshape(-1)
+        for row, benchmark_return in zip(returns, benchmark):
+            self.update(row, benchmark_return)
+
+    def volatility(self) -> np.ndarray:
+        """ :return: annualized volatility per asset, NaN until the window is full """
+        _, std = self.__moments(self.sums)
+        return std * np.sqrt(self.days)
+
+    def sharpe(self) -> np.ndarray:
+        """ :return: sharpe ratio per asset, NaN until the window is full """
+        mean, std = self.__moments(self.sums)
+        return _sharpe(mean, std, self.risk_free_rate, self.days)
+
+    def information(self) -> np.ndarray:
+        """ :return: information ratio per asset, NaN until the window is full """
+        mean, std = self.__moments(self.excess_sums)
+        return _sharpe(mean, std, 0.0, self.information_days)
+
+    def m2(self) -> np.ndarray:
+        """ :return: M2 ratio per asset, NaN until the window is full """
+        _, benchmark_std = self.__moments(self.benchmark_sums)
+        return self.sharpe() * benchmark_std * np.sqrt(self.days) + self.risk_free_rate
+
+    def __excess(self, returns, benchmark):
+        return returns - (benchmark if self.benchmark_excess is None else self.benchmark_excess)
+
+    def __moments(self, sums):
+        if self.nr_updates < self.window:
+            nan = np.full(sums.total.shape, np.nan)
+            return nan, nan
+        mean, std = _mean_std(sums.total, sums.squares, sums.count, self.window)
+        return mean + sums.shift, std
+
+
+class _RunningSums:
+    """
+    Running sum, sum of squares & count of the non-NaN values of each column.
+    Values are shifted by the column mean of the last reset, so the sums stay small for returns far from zero.
+    """
+    __slots__ = ("shift", "total", "squares", "count")
+
+    def __init__(self, nr_columns: int):
+        self.shift = np.zeros(nr_columns)
+        self.total = np.zeros(nr_columns)
+        self.squares = np.zeros(nr_columns)
+        self.count = np.zeros(nr_columns)
+
+    def add(self, x):
+        valid = ~np.isnan(x)
+        x = np.where(valid, x - self.shift, 0.0)
+        self.total += x
+        self.squares += x * x
+        self.count += valid
+
+    def remove(self, x):
+        valid = ~np.isnan(x)
+        x = np.where(valid, x - self.shift, 0.0)
+        self.total -= x
+        self.squares -= x * x
+        self.count -= valid
+
+    def reset(self, values):
+        valid = ~np.isnan(values)
+        self.count = valid.sum(axis=0).astype(np.float64)
+        self.shift = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(self.count, 1)
+        x = np.where(valid, values - self.shift, 0.0)
+        self.total = x.sum(axis=0)
+        self.squares = (x * x).sum(axis=0)
+
+
+class _RollingSums:
+    """ Cumulative sums of the centered values, the squared values & the non-NaN count of each column """
+    __slots__ = ("center", "total", "squares", "count")
+
+    def __init__(self, values):
+        valid = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.center = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+        x = np.where(valid, values - self.center, 0.0)
+        self.total = _cumsum(x)
+        self.squares = _cumsum(x * x)
+        self.count = _cumsum(valid.astype(np.float64))
+
+    def moments(self, window: int, min_periods: int = None):
+        """
+        Rolling mean & sample standard deviation of each column, aligned with the values.
+        :return: tuple (mean, std, count) of 2-D numpy arrays with NaN for the first window-1 rows
+        """
+        nr_rows = len(self.total) - 1
+        mean = np.full((nr_rows, self.total.shape[1]), np.nan)
+        std = np.full_like(mean, np.nan)
+        count = np.zeros_like(mean)
+        if window > nr_rows:
+            return mean, std, count
+
+        total = self.total[window:] - self.total[:-window]
+        squares = self.squares[window:] - self.squares[:-window]
+        count[window - 1:] = np.rint(self.count[window:] - self.count[:-window])
+        m, s = _mean_std(total, squares, count[window - 1:], window if min_periods is None else min_periods)
+        mean[window - 1:] = m + self.center
+        std[window - 1:] = s
+        return mean, std, count
+
+
+def _cumsum(values):
+    """ Cumulative sum along the dates with a leading row of zeros, so that window sums are c[t] - c[t - window] """
+    out = np.zeros((len(values) + 1, values.shape[1]))
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+def _mean_std(total, squares, count, min_periods: int):
+    """ Mean & sample standard deviation from sums, NaN where count is below min_periods """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        variance = np.maximum(squares - total * mean, 0.0) / (count - 1)
+        std = np.sqrt(variance)
+    missing = count < max(min_periods, 1)
+    mean[missing] = np.nan
+    std[missing | (count < 2)] = np.nan
+    return mean, std
+
+
+def _sharpe(mean, std, risk_free_rate, days: int):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (mean - risk_free_rate) / (std * np.sqrt(days))
+
+
+def _values_of(returns):
+    """ Returns the numpy values of pandas input, so that benchmarks broadcast by position """
+    if isinstance(returns, (pd.Series, pd.DataFrame)):
+        return returns.to_numpy(dtype=np.float64)
+    return returns
+
+
+def _shaped_like(returns, values):
+    """ Returns the 2-D values with the type & shape of the given returns """
+    if isinstance(returns, pd.DataFrame):
+        return pd.DataFrame(values, index=returns.index, columns=returns.columns)
+    if isinstance(returns, pd.Series):
+        return pd.Series(values[:, 0], index=returns.index, name=returns.name)
+    if np.ndim(returns) == 1:
+        return values[:, 0]
+    return values
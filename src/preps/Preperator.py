@@ -1,6 +1,7 @@
 from typing import List
 
 from src.dataclasses.DataContainer import DataContainer
+from src.dataclasses.SplitDataContainer import SplitDataContainer
 from src.enum import Ticker
 from src.enum import TimeFrame
 from src.procs.ProcFlow import ProcFlow
@@ -70,19 +71,41 @@ class Preperator:
                              train_data=train_data, test_data=test_data,
                              cat_vars=cat_vars, cont_vars=cont_vars)
 
+    def pack_split_data(self, meta_data: bool, split_ratio: float, all_data,
+                        cat_vars: List[str], cont_vars: List[str], scaler=None):
+
+        # restricts the scaler to the features before the meta data gets dropped
+        if scaler is not None:
+            scaler.select(all_data, cont_vars, cat_vars)
+
+        if not meta_data:
+            cat_vars = None
+            cont_vars = None
+
+        return SplitDataContainer.from_frame(df=all_data, split_ratio=split_ratio, meta_data=meta_data,
+                                             cat_vars=cat_vars, cont_vars=cont_vars, scaler=scaler)
+
     def prepare_experiment(self, stock, prep_id: int = 1, all_data=True, proc_flow_id=4,
-                           split_train_test=True, meta_data: bool = True, DBG=True) -> DataContainer:
+                           split_train_test=True, meta_data: bool = True, copy_free: bool = False,
+                           scaler=None, timeframe=TimeFrame.TimeFrame.DAILY, nr_n: int = 5,
+                           DBG=True) -> DataContainer:
         """
 
         ID | Steps
-        1 | Load Data | Apply ProcFlow | Splits data in train & test
-        2 | Load Data | Apply ProcFlow | Regularize data [buggy] | Splits data in train & test
+        1 | Load Data | Apply ProcFlow | Splits data in train & test | Scales with the given scaler
+        2 | Load Data | Apply ProcFlow | Splits data in train & test | Scales with the given scaler
 
         Prepares a DS / DL experiment for the given stock by applying the specified preperations and pre-processors
         :param stock: Stock (ticker)
         :param prep_id: preperation id of the specified prep workflow
         :param all_data: True when working on a full data set. False for a (smaller) sample to speed things up
         :param proc_flow_id: ID of the specified pre-processor workflow (ProcFlow) that preperes the data
+        :param copy_free: Returns a SplitDataContainer that slices train & test data on demand
+                          instead of storing copies. False by default
+        :param scaler: [Optional] Scaler (see Scalers) that gets fitted on the train data only,
+                       and then scales train & test data
+        :param timeframe: [ENUM] TimeFrame of the loaded data. DAILY by default
+        :param nr_n: nr_n parameter of the ProcFlow. 5 by default
         :param DBG: Debug / vebose console output. True by default
         :return:
         """
@@ -93,7 +116,7 @@ class Preperator:
 
         if prep_id == 1:
             if DBG: print("Loading Data for stock: " + stock.name)
-            df_all = n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=all_data)
+            df_all = n.load_data(stock, timeframe, full=all_data)
 
             if DBG: print("Create a ProcFlow")
 
@@ -101,7 +124,7 @@ class Preperator:
             # df_all = pf.proc_switch(data=df_all, stock=stock, y_col=y, nr_n=5, proc_id=proc_flow_id)
 
             #if meta_data:
-            df_all, cat_vars, cont_vars = pf.proc_switch(data=df_all, stock=stock, y_col=y, nr_n=5,
+            df_all, cat_vars, cont_vars = pf.proc_switch(data=df_all, stock=stock, y_col=y, nr_n=nr_n,
                                                          proc_id=proc_flow_id, meta_data=True)
 
             if DBG: print("Remove all NaN values")
@@ -109,9 +132,16 @@ class Preperator:
 
             split_ratio = 0.80
 
+            if copy_free:
+                if DBG: print("Packing all data into copy-free container format")
+                # scales df_all in place, which backs the container
+                return self.pack_split_data(meta_data=meta_data, split_ratio=split_ratio, all_data=df_all,
+                                            cat_vars=cat_vars, cont_vars=cont_vars, scaler=scaler)
+
             if split_train_test:
                 if DBG: print("Split df_all in train & test")
-                train_df, test_df = pf.split_data(df=df_all, split_ratio=split_ratio, vrb=DBG)
+                train_df, test_df = pf.split_data(df=df_all, split_ratio=split_ratio, vrb=DBG, scaler=scaler,
+                                                  cat_vars=cat_vars, cont_vars=cont_vars)
 
             if DBG: print("Packing all data into container format")
             # Stuff all train, test, df_all, cat_vars, cont_vars in one single
@@ -125,11 +155,12 @@ class Preperator:
 
         if prep_id == 2:
             if DBG: print("Loading Data for stock: " + stock.name)
-            df_all = n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=all_data)
+            df_all = n.load_data(stock, timeframe, full=all_data)
             if DBG: print("Create a ProcFlow")
             pf = ProcFlow(DBG)
             if DBG: print("Applying pre-processor: ", proc_flow_id, "on: " + stock.name)
-            df_all = pf.proc_switch(data=df_all, stock=stock, y_col="Close", nr_n=5, proc_id=proc_flow_id)
+            df_all, cat_vars, cont_vars = pf.proc_switch(data=df_all, stock=stock, y_col="Close", nr_n=nr_n,
+                                                         proc_id=proc_flow_id, meta_data=True)
             if DBG: print("Remove all NaN values")
             df_all = df_all.fillna(0)
             # if DBG: print("Apply MinMax regularization")
@@ -138,7 +169,8 @@ class Preperator:
 
             if split_train_test:
                 if DBG: print("Split df_all in train & test")
-                train_df, test_df = pf.split_data(df=df_all, split_ratio=0.80, vrb=True)
+                train_df, test_df = pf.split_data(df=df_all, split_ratio=0.80, vrb=True, scaler=scaler,
+                                                  cat_vars=cat_vars, cont_vars=cont_vars)
                 return train_df, test_df
             else:
                 return df_all
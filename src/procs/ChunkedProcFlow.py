@@ -0,0 +1,224 @@
+"""
+Chunked, out-of-core execution of ProcFlows for histories larger than RAM.
+
+The series streams through the flow in blocks of chunk_rows rows. Each block is processed together with
+exactly as many rows of history as the lookback of the flow requires and as many rows of the next block
+as its lookahead requires, i.e. by proc_add_next_y. Lookback and lookahead of a flow are the sums of the
+windows all its procs declare in Procs.proc_window. Only the rows of the block itself are kept and appended
+to a columnar cache dataset, so the peak memory is bounded by chunk_rows + lookback + lookahead rows,
+not by the length of the history.
+
+The output equals the output of ProcFlow.proc_switch over the whole frame. Flows with procs that compute
+statistics over all rows, i.e. proc_add_direction, can't run chunked and raise a ValueError.
+
+A fitted scaler (see Scalers) scales each block before it gets appended. An unfitted scaler gets fitted in a
+second streaming pass over the train rows of the output, which then get rewritten scaled, chunk by chunk.
+
+Usage:
+
+    cpf = ChunkedProcFlow(DBG, chunk_rows=1_000_000)
+    # source: data frame, columnar cache dataset, or iterable of frames, i.e. pd.read_csv(..., chunksize=...)
+    rows, cat_vars, cont_vars = cpf.proc_switch(source="cache/columnar/SPX-1min", path="cache/columnar/SPX-1min-proc03",
+                                                stock=stock, y_col="Close", nr_n=5, proc_id=3, meta_data=True)
+    df = cc.read("cache/columnar/SPX-1min-proc03", columns=["Date", "Close", "y"])
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.procs import Procs
+from src.procs.ProcFlow import ProcFlow
+from src.utils import ColumnarCache as cc
+
+
+DBG = False
+chunk_rows = 1_000_000
+# Tracks the position of each input row through merges, which reset the index
+row_col = "__row"
+
+
+class ChunkedProcFlow:
+
+    def __init__(self, dbg, chunk_rows: int = chunk_rows):
+        """
+        :param dbg: Debug / verbose console output
+        :param chunk_rows: number of input rows per block
+        """
+        self.DBG = dbg
+        self.chunk_rows = chunk_rows
+        self.pf = ProcFlow(dbg)
+
+    def window(self, stock, y_col="", nr_n=4, proc_id=1):
+        """
+        Returns lookback & lookahead of the given flow by tracing its procs without running them.
+
+        :return: tuple (lookback, lookahead)
+        :raises ValueError: if the flow contains a proc that needs all rows of the series
+        """
+        tracer = _ProcTracer()
+        ProcFlow(False, profiler=tracer).proc_switch(data=pd.DataFrame(), stock=stock, y_col=y_col,
+                                                     nr_n=nr_n, proc_id=proc_id)
+        lookback, lookahead = 0, 0
+        for name, kwargs in tracer.steps:
+            window = Procs.proc_window(name, **kwargs)
+            if window is None:
+                raise ValueError("Proc %s of flow %d needs all rows of the series and can't run chunked"
+                                 % (name, proc_id))
+            lookback += window[0]
+            lookahead += window[1]
+
+        if self.DBG:
+            print("Flow ", proc_id, " lookback ", lookback, " lookahead ", lookahead)
+        return lookback, lookahead
+
+    def proc_switch(self, source, path: str, stock, y_col="", nr_n=4, proc_id=1, meta_data=False, scaler=None,
+                    split_ratio: float = 0.80):
+        """
+        Runs the given flow chunk by chunk and appends the results to a columnar cache dataset.
+
+        :param source: input data: pandas data frame, path of a columnar cache dataset, or iterable of frames
+        :param path: folder of the output dataset. Gets overwritten
+        :param stock: [Ticker] the stock to which the data belong
+        :param y_col: the column to predict
+        :param nr_n: the number of n, serves as an input to other procs such as previous-n
+        :param proc_id: the id of the ProcFlow
+        :param meta_data: returns the meta data of the flow too. False by default
+        :param scaler: [Optional] Scaler that scales the output. Unfitted scalers get fitted on the train rows only
+        :param split_ratio: ratio between train & test rows of the output, to fit the scaler
+        :return: number of output rows, or tuple (rows, cat_vars, cont_vars) if meta_data is set
+        """
+        lookback, lookahead = self.window(stock, y_col, nr_n, proc_id)
+        if lookahead > self.chunk_rows:
+            raise ValueError("Lookahead %d exceeds chunk size %d" % (lookahead, self.chunk_rows))
+
+        history = None
+        pending = None
+        meta = None
+        start = 0
+        fitted = scaler is not None and scaler.nr_rows > 0
+
+        with cc.ColumnarWriter(path) as writer:
+            for block in _blocks(source, self.chunk_rows):
+                block = block.reset_index(drop=True)
+                block[row_col] = np.arange(start, start + len(block))
+                start += len(block)
+
+                if pending is not None:
+                    meta = self.__process(writer, history, pending, block.iloc[:lookahead],
+                                          stock, y_col, nr_n, proc_id, meta, scaler if fitted else None)
+                    history = _tail(history, pending, lookback)
+                pending = block
+
+            if pending is not None:
+                meta = self.__process(writer, history, pending, None, stock, y_col, nr_n, proc_id, meta,
+                                      scaler if fitted else None)
+            rows = writer.rows
+
+        if scaler is not None and not fitted:
+            cat_vars, cont_vars = meta if meta is not None else (None, None)
+            self.__fit_scaler(path, scaler, int(rows * split_ratio), cat_vars, cont_vars)
+
+        if meta_data:
+            cat_vars, cont_vars = meta if meta is not None else ([], [])
+            return rows, cat_vars, cont_vars
+        return rows
+
+    def __process(self, writer, history, block, ahead, stock, y_col, nr_n, proc_id, meta, scaler):
+        """ Runs the flow over one block plus context rows and appends the rows of the block """
+        frame = pd.concat([f for f in (history, block, ahead) if f is not None and len(f)], ignore_index=True)
+        data, cat_vars, cont_vars = self.pf.proc_switch(data=frame, stock=stock, y_col=y_col, nr_n=nr_n,
+                                                        proc_id=proc_id, meta_data=True)
+
+        rows = data[row_col].to_numpy()
+        first, last = block[row_col].iloc[0], block[row_col].iloc[-1]
+        data = data.loc[(rows >= first) & (rows <= last)].drop(columns=row_col)
+        if scaler is not None:
+            scaler.transform(data)
+        writer.append(data)
+
+        if self.DBG:
+            print("Processed rows ", first, " - ", last, " with ", len(frame) - len(block), " context rows")
+        return meta if meta is not None else (cat_vars, cont_vars)
+
+
+    def __fit_scaler(self, path: str, scaler, train_rows: int, cat_vars, cont_vars):
+        """ Fits the scaler on the first train_rows rows of the dataset, then rewrites the dataset scaled """
+        scaler.select(cc.read(path, stop=1), cont_vars, cat_vars)
+        scaler.fit(chunk.iloc[:train_rows - start]
+                   for start, chunk in zip(range(0, train_rows, self.chunk_rows),
+                                           cc.iter_chunks(path, self.chunk_rows)))
+        tmp = path + ".scaled"
+        with cc.ColumnarWriter(tmp) as writer:
+            for chunk in cc.iter_chunks(path, self.chunk_rows):
+                writer.append(scaler.transform(chunk))
+        cc.remove(path)
+        os.replace(tmp, path)
+        if self.DBG:
+            print("Fitted ", scaler.kind, " on ", train_rows, " rows and scaled ", path)
+
+
+def _blocks(source, nr_rows: int):
+    """ Yields the source in blocks of exactly nr_rows rows, except for the last block """
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), nr_rows):
+            yield source.iloc[start:start + nr_rows]
+        return
+
+    if isinstance(source, str):
+        source = cc.iter_chunks(source, nr_rows)
+
+    buffer = []
+    buffered = 0
+    for frame in source:
+        buffer.append(frame)
+        buffered += len(frame)
+        if buffered < nr_rows:
+            continue
+        frame = pd.concat(buffer, ignore_index=True)
+        for start in range(0, len(frame) - nr_rows + 1, nr_rows):
+            yield frame.iloc[start:start + nr_rows]
+        rest = frame.iloc[len(frame) - len(frame) % nr_rows:]
+        buffer = [rest] if len(rest) else []
+        buffered = len(rest)
+
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def _tail(history, block, nr_rows: int):
+    """ Returns the last nr_rows rows of history and block """
+    if nr_rows == 0:
+        return None
+    if history is None or len(block) >= nr_rows:
+        return block.iloc[-nr_rows:]
+    return pd.concat([history, block], ignore_index=True).iloc[-nr_rows:]
+
+
+class _ProcTracer:
+    """ Stands in for a ProcProfiler and records the procs a flow calls without running them """
+
+    def __init__(self):
+        self.steps = []
+
+    def instrument(self, procs, flow: str = "", ticker: str = ""):
+        return _TracedProcs(procs, self.steps)
+
+
+class _TracedProcs:
+
+    def __init__(self, procs, steps):
+        self._procs = procs
+        self._steps = steps
+
+    def __getattr__(self, name):
+        attr = getattr(self._procs, name)
+        if not (callable(attr) and name.startswith("proc_")):
+            return attr
+
+        def traced(*args, **kwargs):
+            self._steps.append((name, kwargs))
+            return kwargs.get("df", args[0] if args else None)
+
+        return traced
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.utils import DTypeManager as dm
+
+
+class FeatureExecutor:
+    """
+    Parallel executor for independent feature kernels, i.e. ta-lib functions.
+
+    Each kernel writes its result(s) into its own column(s) of one preallocated output matrix.
+    Because the ta-lib C kernels release the GIL, kernels run in parallel on a thread pool.
+    With workers=1, all kernels run serial in the order they were added, which is deterministic
+    and does not start any thread. Results are identical in both modes since no kernel depends on another.
+
+    Usage:
+
+        fx = FeatureExecutor(workers=8)
+        fx.add("SMA-20", talib.SMA, close, timeperiod=20)
+        fx.add(["UP_BB", "MID_BB", "LOW_BB"], talib.BBANDS, close, timeperiod=5)
+        df = fx.apply(df)
+    """
+
+    def __init__(self, workers: int = None, dtype=None):
+        """
+        :param workers: Number of threads. None uses the default of the ThreadPoolExecutor, 1 runs serial.
+        :param dtype: dtype of the output matrix. Feature dtype of the current dtype policy by default.
+        """
+        self.workers = workers
+        self.dtype = dtype if dtype is not None else dm.float_dtype()
+        self.names = []
+        self.kernels = []
+
+    def add(self, names, func, *args, **kwargs):
+        """
+        Adds a kernel. Kernels returning several arrays, i.e. BBANDS or MACD, take a list of names,
+        one for each returned array.
+
+        :param names: column name or list of column names
+        :param func: kernel function
+        :param args: positional arguments passed to the kernel
+        :param kwargs: keyword arguments passed to the kernel
+        :return: void
+        """
+        if isinstance(names, str):
+            names = [names]
+        self.kernels.append((len(self.names), len(names), func, args, kwargs))
+        self.names.extend(names)
+
+    def run(self, nr_rows: int):
+        """
+        Runs all kernels and returns the column names and the output matrix.
+        The matrix is column-major so that each kernel writes contiguous memory.
+
+        :param nr_rows: number of rows of the output matrix
+        :return: column names, numpy array of shape (nr_rows, nr_columns)
+        """
+        out = np.empty((nr_rows, len(self.names)), dtype=self.dtype, order="F")
+
+        def run_kernel(kernel):
+            start, nr_cols, func, args, kwargs = kernel
+            result = func(*args, **kwargs)
+            if nr_cols == 1:
+                result = [result]
+            for i in range(nr_cols):
+                out[:, start + i] = result[i]
+
+        if self.workers == 1:
+            for kernel in self.kernels:
+                run_kernel(kernel)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # list() re-raises the first exception of any kernel
+                list(pool.map(run_kernel, self.kernels))
+
+        return self.names, out
+
+    def apply(self, df):
+        """
+        Runs all kernels and returns the given frame with all features appended as one block.
+        Existing columns with the same name are replaced.
+
+        :param df: pandas data frame
+        :return: pandas data frame
+        """
+        names, out = self.run(len(df))
+        features = pd.DataFrame(out, index=df.index, columns=names)
+        existing = [name for name in names if name in df.columns]
+        if existing:
+            df = df.drop(columns=existing)
+        return pd.concat([df, features], axis=1)
+
+    @staticmethod
+    def map_frames(func, frames, processes: int = None):
+        """
+        Applies the given function to each frame on a process pool, i.e. to compute features for many tickers.
+        The function must be defined at module level so that it can be pickled.
+        With processes=1, all frames are processed serial in the current process.
+
+        :param func: function that takes and returns a pandas data frame
+        :param frames: list of pandas data frames
+        :param processes: Number of processes. None uses the number of cores, 1 runs serial.
+        :return: list of pandas data frames in the same order as the given frames
+        """
+        if processes == 1:
+            return [func(df) for df in frames]
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return list(pool.map(func, frames))
@@ -0,0 +1,158 @@
+"""
+Lag & lead matrices as strided views over the source column, instead of one shifted column per lag.
+
+proc_add_previous_values adds number shifted copies of a column to the frame, i.e. 60 lags copy the series
+60 times and add 60 pandas blocks. lag_matrix returns the same values as a read-only view with one row per row of
+the source and one column per lag, without copying: column n-1 equals df[column].shift(n).
+lead_matrix does the same for multi-horizon targets: column h-1 equals df[column].shift(-h), as proc_add_next_y does.
+
+A view only covers the rows for which all lags, resp. leads, exist, i.e. lag_matrix starts at row number.
+LagFeatures collects the views of a frame and materializes them once when exporting to the model,
+either for the rows where all features exist, or for all rows with NaN, as the shifted columns would have.
+
+Usage:
+
+    lf = LagFeatures(df)
+    lf.add_lags("Close", 60)               # names Close-1 .. Close-60
+    lf.add_targets("Close", [1, 5, 20])    # names y+1, y+5, y+20
+    X = lf.to_numpy(["Open", "Close"])     # float32 array, complete rows only
+    names = lf.names(["Open", "Close"])
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DBG = False
+
+
+def lag_matrix(values, number: int) -> np.ndarray:
+    """
+    Lags 1 to number of the given values as strided view.
+
+    :param values: 1-D numpy array or pandas series
+    :param number: number of lags
+    :return: read-only view (len(values) - number, number). Row r belongs to row r + number of the values
+    """
+    x = np.asarray(values)
+    if number >= len(x):
+        return np.empty((0, number), dtype=x.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(x, number + 1)
+    # row r covers x[r .. r + number], so lag n of row r + number sits at position number - n
+    return windows[:, number - 1::-1] if number > 0 else windows[:, :0]
+
+
+def lead_matrix(values, horizon: int) -> np.ndarray:
+    """
+    Leads 1 to horizon of the given values as strided view, i.e. multi-horizon targets.
+
+    :param values: 1-D numpy array or pandas series
+    :param horizon: largest horizon
+    :return: read-only view (len(values) - horizon, horizon). Row r belongs to row r of the values
+    """
+    x = np.asarray(values)
+    if horizon >= len(x):
+        return np.empty((0, horizon), dtype=x.dtype)
+    return np.lib.stride_tricks.sliding_window_view(x, horizon + 1)[:, 1:]
+
+
+class LagFeatures:
+
+    def __init__(self, df):
+        """
+        :param df: pandas data frame with the source columns, in the order the lags refer to
+        """
+        self.df = df
+        self.nr_rows = len(df)
+        # names, source values, view, first row of the view, selected columns of the view (None for all),
+        # and the shift of each name
+        self.blocks = []
+
+    def add_lags(self, column_name: str, number: int, cont_vars: list = None):
+        """
+        Adds lags 1 to number of the given column, named as proc_add_previous_values names them.
+        :param cont_vars: [Optional] meta data that gets the names appended
+        :return: list of names
+        """
+        names = [column_name + "-" + str(n) for n in range(1, number + 1)]
+        x = self.df[column_name].to_numpy()
+        self.blocks.append((names, x, lag_matrix(x, number), number, None, np.arange(1, number + 1)))
+        return self.__register(names, cont_vars)
+
+    def add_targets(self, y_column: str, horizons, cont_vars: list = None):
+        """
+        Adds the values of y_column the given number of rows ahead, named y+h for each horizon h.
+        :param horizons: horizon, or list of horizons
+        :param cont_vars: [Optional] meta data that gets the names appended
+        :return: list of names
+        """
+        horizons = [horizons] if np.isscalar(horizons) else sorted(horizons)
+        names = ["y+" + str(h) for h in horizons]
+        x = self.df[y_column].to_numpy()
+        selected = None if horizons == list(range(1, horizons[-1] + 1)) else np.asarray(horizons) - 1
+        self.blocks.append((names, x, lead_matrix(x, horizons[-1]), 0, selected, -np.asarray(horizons)))
+        return self.__register(names, cont_vars)
+
+    def names(self, columns=()) -> list:
+        """ :return: the names of the given frame columns followed by all lag & lead names, in export order """
+        return list(columns) + [name for block in self.blocks for name in block[0]]
+
+    def valid_rows(self):
+        """ :return: tuple (start, stop) of the rows where all lags & leads exist """
+        start = max([first for _, _, _, first, _, _ in self.blocks], default=0)
+        stop = min([first + len(view) for _, _, view, first, _, _ in self.blocks], default=self.nr_rows)
+        return start, max(start, stop)
+
+    def to_numpy(self, columns=(), dtype=np.float32, dropna: bool = True) -> np.ndarray:
+        """
+        Materializes the given frame columns and all lags & leads in one array, the only copy of the lags.
+
+        :param columns: frame columns that come first
+        :param dtype: dtype of the array. float32 by default, the default tensor type of PyTorch
+        :param dropna: only the rows where all lags & leads exist if True, all rows with NaN otherwise
+        :return: numpy array (rows, features) in the order of names(columns)
+        """
+        start, stop = self.valid_rows() if dropna else (0, self.nr_rows)
+        columns = list(columns)
+        nr_features = len(self.names(columns))
+        out = np.empty((stop - start, nr_features), dtype=dtype)
+        if columns:
+            out[:, :len(columns)] = self.df[columns].to_numpy()[start:stop]
+
+        position = len(columns)
+        for names, x, view, first, selected, shifts in self.blocks:
+            block = out[:, position:position + len(names)]
+            # rows of the output covered by the view
+            lo = max(start, first)
+            hi = max(lo, min(stop, first + len(view)))
+            if hi > lo:
+                rows = view[lo - first:hi - first]
+                block[lo - start:hi - start] = rows if selected is None else rows[:, selected]
+            # the few rows outside of the view, where some lags or leads exist and the others are NaN
+            edges = np.r_[start:min(lo, stop), hi:stop]
+            if len(edges):
+                block[edges - start] = _shifted(x, shifts, edges)
+            position += len(names)
+
+        if DBG:
+            print("Exported ", out.shape[0], " rows with ", nr_features, " features")
+        return out
+
+    def to_frame(self, columns=(), dtype=np.float32, dropna: bool = True) -> pd.DataFrame:
+        """ Like to_numpy, as pandas data frame with the names as columns and the index of the source frame """
+        start, stop = self.valid_rows() if dropna else (0, self.nr_rows)
+        return pd.DataFrame(self.to_numpy(columns, dtype, dropna), index=self.df.index[start:stop],
+                            columns=self.names(columns))
+
+    @staticmethod
+    def __register(names, cont_vars):
+        if cont_vars is not None:
+            cont_vars.extend(names)
+        return names
+
+
+def _shifted(x, shifts, rows):
+    """ Values of x at the given rows shifted by each shift, as pandas shift, NaN where the shifted row doesn't exist """
+    source = rows[:, None] - shifts
+    valid = (source >= 0) & (source < len(x))
+    return np.where(valid, x[np.clip(source, 0, len(x) - 1)], np.nan)
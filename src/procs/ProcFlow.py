@@ -1,5 +1,3 @@
-from src.procs import Procs as p
-
 """
 Pre-processor-worklows (ProcFlows) simplify data pre-processing as each apply a well 
 specified formula of how to prepare the data. 
@@ -98,40 +96,65 @@ Open ares of exploration:
  
 """
 
+from src.procs import Procs as p
+
 
 class ProcFlow():
-    def __init__(self, dbg):
+    def __init__(self, dbg, profiler=None):
+        """
+        :param dbg: Debug / verbose console output
+        :param profiler: [Optional] ProcProfiler that records time & memory of every proc called by proc_switch
+        """
         self.DBG = dbg
+        self.profiler = profiler
 
-    def split_data(self, df, split_ratio: float = 0.80, vrb: bool = False):
+    def split_data(self, df, split_ratio: float = 0.80, vrb: bool = False, scaler=None, cat_vars=None, cont_vars=None):
         """
         Util to split a pandas dataframe in train, test, and validation data.
         :param df:
         :param split_ratio:
         :param vrb:
+        :param scaler: [Optional] Scaler (see Scalers) that gets fitted on the train data only,
+                       and then scales train & test data
+        :param cat_vars: [Optional] categorial meta data, not scaled by a scaler without columns
+        :param cont_vars: [Optional] continuous meta data, the only columns a scaler without columns scales
         :return: train_df, test_df
         """
-        return p.split_data(df=df, split_ratio=split_ratio, vrb=vrb)
+        train_df, test_df = p.split_data(df=df, split_ratio=split_ratio, vrb=vrb)
+        if scaler is not None:
+            scaler.select(df, cont_vars, cat_vars)
+            # slices of df, so copy before scaling
+            train_df = scaler.fit_transform(train_df.copy())
+            test_df = scaler.transform(test_df.copy())
+        return train_df, test_df
 
     def proc_switch(self, data, stock, y_col="", nr_n=4, proc_id=1, meta_data=False):
+        # All flows call procs through the procs argument, which is an instrumented proxy of the
+        # Procs module when profiling, so that concurrent flows don't affect each other.
+        procs = p
+        if self.profiler is not None:
+            procs = self.profiler.instrument(p, flow="proc_%02d" % proc_id, ticker=getattr(stock, "name", str(stock)))
+        return self.__proc_switch(data, stock, y_col, nr_n=nr_n, proc_id=proc_id, meta_data=meta_data, procs=procs)
+
+    def __proc_switch(self, data, stock, y_col="", nr_n=4, proc_id=1, meta_data=False, procs=p):
 
         if proc_id == 1:
-            return self.proc_01(data, stock, y_col, nr_n=nr_n, meta_data=meta_data)
+            return self.proc_01(data, stock, y_col, nr_n=nr_n, meta_data=meta_data, procs=procs)
 
         if proc_id == 2:
-            return self.proc_02(data, stock, y_col, nr_n=nr_n, meta_data=meta_data)
+            return self.proc_02(data, stock, y_col, nr_n=nr_n, meta_data=meta_data, procs=procs)
 
         if proc_id == 3:
-            return self.proc_03(data, stock, y_col, nr_n=nr_n, meta_data=meta_data)
+            return self.proc_03(data, stock, y_col, nr_n=nr_n, meta_data=meta_data, procs=procs)
 
         if proc_id == 4:
-            return self.proc_04(data, stock, y_col, nr_n=nr_n, meta_data=meta_data)
+            return self.proc_04(data, stock, y_col, nr_n=nr_n, meta_data=meta_data, procs=procs)
 
         else:
             print("No matching proc ID found")
 
     @staticmethod
-    def base_proc_00(data, stock, y_col, nr_n: int, meta_data=False):
+    def base_proc_00(data, stock, y_col, nr_n: int, meta_data=False, procs=p):
         """
         Base proc that is meant to be used as template.
 
@@ -141,6 +164,7 @@ class ProcFlow():
         :param y_col: the column to predict, for a regression problem.
                       Otherwise, this is the one you want to pass as input to other procs
         :param nr_n: the number of n, serves as an input to other procs such as previous-n.
+        :param procs: the Procs module, or an instrumented proxy of it when profiled. Call all procs through it.
         :return: pre-processed data in a pandas dataframe
         """
         # Meta-data tracking [Optional]
@@ -155,25 +179,25 @@ class ProcFlow():
         # Usually, renaming & date conversion is done in the DataLoader.
         # HOwever, in case that didn't happaned for any reason or any proc needs a different
         # naming convention, use rename_column function to adjust accordingly
-        # data = p.__rename_column(data, "date", 'Date')
-        # data = p.convert_date(data, "Date")
+        # data = procs.__rename_column(data, "date", 'Date')
+        # data = procs.convert_date(data, "Date")
 
         # run procs
         # add previous n values of y-column
-        p.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
+        procs.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
         # percent change of y-column
-        p.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
 
         # Your procs ...
         # Example: RSI
-        # data = p.proc_add_rsi(df=data, cont_vars=cont_vars, stock=stock, change=True)
+        # data = procs.proc_add_rsi(df=data, cont_vars=cont_vars, stock=stock, change=True)
         # Example: MACD
-        # data = p.proc_add_macd(df=data, cont_vars=cont_vars, stock=stock)
+        # data = procs.proc_add_macd(df=data, cont_vars=cont_vars, stock=stock)
 
         # Replace NaN
         # Many neuronal net and other models crash when they encounter NaN values.
         # Thus, the proc below replaces any possible NaN value with zero.
-        # data = p.proc_fill_nan
+        # data = procs.proc_fill_nan
 
         if meta_data:
             return data, cat_vars, cont_vars
@@ -181,7 +205,7 @@ class ProcFlow():
             return data
 
     @staticmethod
-    def proc_01(data, stock, y_col, nr_n: int, meta_data=False):
+    def proc_01(data, stock, y_col, nr_n: int, meta_data=False, procs=p):
         # seperate  columns into continous data columns and category data columns
         cont_vars = []  # clear everything, just in case
         cat_vars = []
@@ -189,13 +213,13 @@ class ProcFlow():
 
         # run procs
         # add previous n values of y-column
-        data = p.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
+        data = procs.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
         # percennt change of y-column
-        data = p.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
 
         # Example Bollinger Band
-        # data = p.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
-        data = p.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=False, add_ohlc_diff=True)
+        # data = procs.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
+        data = procs.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=False, add_ohlc_diff=True)
 
         if meta_data:
             return data, cat_vars, cont_vars
@@ -203,7 +227,7 @@ class ProcFlow():
             return data
 
     @staticmethod
-    def proc_02(data, stock, y_col, nr_n: int, meta_data=False):
+    def proc_02(data, stock, y_col, nr_n: int, meta_data=False, procs=p):
         # seperate  columns into continous data columns and category data columns
         cont_vars = []  # clear everything, just in case
         cat_vars = []
@@ -211,26 +235,26 @@ class ProcFlow():
 
         # run procs
         # add previous n values of y-column
-        p.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
+        procs.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
 
         # categorify date
-        # p.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
+        # procs.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
 
         # percennt change
-        p.proc_add_percent_change(df=data, column_name="Open", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="High", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="Low", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Open", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="High", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Low", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
         #
-        p.proc_add_abs_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
+        procs.proc_add_abs_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
 
         # add Bollinger Band
-        data = p.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=False, add_ohlc_diff=True)
+        data = procs.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=False, add_ohlc_diff=True)
         # Add SMA
-        data = p.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
-        data = p.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
+        data = procs.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
+        data = procs.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
 
         if meta_data:
             return data, cat_vars, cont_vars
@@ -238,50 +262,50 @@ class ProcFlow():
             return data
 
     @staticmethod
-    def proc_03(data, stock, y_col="", nr_n=1, meta_data=False):
+    def proc_03(data, stock, y_col="", nr_n=1, meta_data=False, procs=p):
         # seperate  columns into continous and category data columns
         cont_vars = []  # clear everything, just in case
         cat_vars = []
         cont_vars = ["Open", "High", "Low", "Close", "Volume"]
 
         # categorify date
-        # p.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
+        # procs.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
 
         # Add percent change for each of the OHLC
-        p.proc_add_percent_change(df=data, column_name="Open", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="High", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="Low", cont_vars=cont_vars)
-        p.proc_add_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Open", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="High", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Low", cont_vars=cont_vars)
+        procs.proc_add_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
 
         # Add absolute percentage change
-        p.proc_add_abs_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
+        procs.proc_add_abs_percent_change(df=data, column_name="Close", cont_vars=cont_vars)
 
         # add momentum
-        data = p.proc_add_mom(df=data, cont_vars=cont_vars, stock=stock)
+        data = procs.proc_add_mom(df=data, cont_vars=cont_vars, stock=stock)
         # add momentum percentage change
-        data = p.proc_add_percent_change(df=data, column_name="MOM", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="MOM", cont_vars=cont_vars)
         # add y
-        p.proc_add_next_y(df=data, y_column=y_col, number=nr_n, cont_vars=cont_vars)
+        procs.proc_add_next_y(df=data, y_column=y_col, number=nr_n, cont_vars=cont_vars)
         # run procs
         # add previous n y values
-        p.proc_add_previous_values(df=data, column_name=y_col, number=5, cont_vars=cont_vars)
+        procs.proc_add_previous_values(df=data, column_name=y_col, number=5, cont_vars=cont_vars)
 
         # add Bollinger Band
-        data = p.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
+        data = procs.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
 
         # Add SMA
-        data = p.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
+        data = procs.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
         # SMA percentage change
-        data = p.proc_add_percent_change(df=data, column_name="SMA_20", cont_vars=cont_vars)
-        data = p.proc_add_percent_change(df=data, column_name="SMA_200", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="SMA_20", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="SMA_200", cont_vars=cont_vars)
 
         # Add WMA with ohlc_diff=True
-        data = p.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
+        data = procs.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
         # WMA percentage change
-        data = p.proc_add_percent_change(df=data, column_name="WMA_20", cont_vars=cont_vars)
-        data = p.proc_add_percent_change(df=data, column_name="WMA_60", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="WMA_20", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="WMA_60", cont_vars=cont_vars)
 
         if meta_data:
             return data, cat_vars, cont_vars
@@ -289,7 +313,7 @@ class ProcFlow():
             return data
 
     @staticmethod
-    def proc_04(data, stock, y_col="", nr_n=1, meta_data=False):
+    def proc_04(data, stock, y_col="", nr_n=1, meta_data=False, procs=p):
         # seperate  columns into continous and category data columns
         cont_vars = []  # clear everything, just in case
         cat_vars = []
@@ -297,58 +321,58 @@ class ProcFlow():
         DBG = False
 
         # categorify date
-        # p.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
+        # procs.proc_add_datepart(df=data, cont_vars=cont_vars, cat_vars=cat_vars)
 
         if DBG: print("add previous n values of y-column")
-        data = p.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
+        data = procs.proc_add_previous_values(df=data, column_name=y_col, number=nr_n, cont_vars=cont_vars)
         if DBG: print("percent change of y-column")
-        data = p.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name=y_col, cont_vars=cont_vars)
         if DBG: print("y-column Direction")
-        data = p.proc_add_direction(df=data, column_name=y_col, cat_vars=cat_vars, cont_vars=cont_vars)
+        data = procs.proc_add_direction(df=data, column_name=y_col, cat_vars=cat_vars, cont_vars=cont_vars)
         if DBG: print("y-column volatility")
-        data = p.proc_add_volatility(df=data, column_name=y_col, cont_vars=cont_vars)
+        data = procs.proc_add_volatility(df=data, column_name=y_col, cont_vars=cont_vars)
         if DBG: print("y-column volatility change")
-        data = p.proc_add_percent_change(df=data, column_name=y_col+"-volatility", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name=y_col+"-volatility", cont_vars=cont_vars)
 
         # Add volume change
         if DBG: print("Add Add volume change")
-        data = p.proc_add_percent_change(df=data, column_name="Volume", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="Volume", cont_vars=cont_vars)
         if DBG: print("Add volume volatility")
-        data = p.proc_add_volatility(df=data, column_name="Volume", cont_vars=cont_vars)
+        data = procs.proc_add_volatility(df=data, column_name="Volume", cont_vars=cont_vars)
         if DBG: print("Volume volatility change")
-        data = p.proc_add_percent_change(df=data, column_name="Volume"+"-volatility", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="Volume"+"-volatility", cont_vars=cont_vars)
 
         # Add momentum
         if DBG: print("Add momentum")
-        data = p.proc_add_mom(df=data, stock=stock, cont_vars=cont_vars, change=False)
+        data = procs.proc_add_mom(df=data, stock=stock, cont_vars=cont_vars, change=False)
         if DBG: print("Add momentum percentage change")
-        data = p.proc_add_percent_change(df=data, column_name="MOM", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="MOM", cont_vars=cont_vars)
         if DBG: print("Add momentum direction")
-        data = p.proc_add_direction(df=data, column_name="MOM", cat_vars=cat_vars, cont_vars=cont_vars)
+        data = procs.proc_add_direction(df=data, column_name="MOM", cat_vars=cat_vars, cont_vars=cont_vars)
         # Add momentum volatility
         if DBG: print("Add momentum volatility")
-        data = p.proc_add_volatility(df=data, column_name="MOM", cont_vars=cont_vars)
+        data = procs.proc_add_volatility(df=data, column_name="MOM", cont_vars=cont_vars)
         if DBG: print("Add Volume momentum volatility change")
-        data = p.proc_add_percent_change(df=data, column_name="MOM" + "-volatility", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="MOM" + "-volatility", cont_vars=cont_vars)
 
         if DBG: print("Add Bollinger Band")
-        data = p.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
+        data = procs.proc_add_bband(df=data, stock=stock, cont_vars=cont_vars, add_diff_to_bb=True)
 
         if DBG: print("Add SMA with ohlc_diff=True")
-        data = p.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
-        data = p.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
+        data = procs.proc_add_sma20(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma200(df=data, cont_vars=cont_vars, stock=stock, add_diff=True)
+        data = procs.proc_add_sma20_sma_200_diff(df=data, cont_vars=cont_vars, stock=stock)
 
         if DBG: print("SMA percentage change")
-        data = p.proc_add_percent_change(df=data, column_name="SMA_20", cont_vars=cont_vars)
-        data = p.proc_add_percent_change(df=data, column_name="SMA_200", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="SMA_20", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="SMA_200", cont_vars=cont_vars)
 
         if DBG: print("Add WMA with ohlc_diff=True")
-        data = p.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
+        data = procs.proc_add_wma20_wma_60_diff(df=data, cont_vars=cont_vars, stock=stock, add_ohlc_diff=True)
         if DBG: print("WMA percentage change")
 
-        data = p.proc_add_percent_change(df=data, column_name="WMA_20", cont_vars=cont_vars)
-        data = p.proc_add_percent_change(df=data, column_name="WMA_60", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="WMA_20", cont_vars=cont_vars)
+        data = procs.proc_add_percent_change(df=data, column_name="WMA_60", cont_vars=cont_vars)
 
         if meta_data:
             return data, cat_vars, cont_vars
@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class ProcProfiler:
+    """
+    Opt-in instrumentation of procs. Records for every proc invocation:
+
+    * wall time & CPU time
+    * peak traced memory (tracemalloc, only when trace_memory is set) & peak RSS of the process
+    * rows & columns added
+    * bytes added to the frame & bytes copied into a new frame, i.e. by a merge
+
+    Usage:
+
+        profiler = ProcProfiler()
+        pf = ProcFlow(DBG, profiler=profiler)
+        df_all = pf.proc_switch(data=df_all, stock=stock, y_col="Close", nr_n=5, proc_id=4)
+        print(profiler.report())
+        profiler.to_json("proc_04.json")
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        :param trace_memory: Traces Python memory allocations with tracemalloc while a proc runs.
+                             Slows down all procs. False by default
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self.steps = {}
+        # procs currently traced, and whether the profiler started tracemalloc for them
+        self.tracing = 0
+        self.started_tracing = False
+        self.lock = threading.Lock()
+
+    def instrument(self, procs, flow: str = "", ticker: str = ""):
+        """
+        Returns a proxy of the given procs module that records every call of a proc_ function.
+        :param procs: procs module, i.e. src.procs.Procs
+        :param flow: name of the flow, i.e. proc_04
+        :param ticker: name of the ticker
+        :return: proxy with the same functions as the procs module
+        """
+        return _InstrumentedProcs(procs, self, flow, ticker)
+
+    def clear(self):
+        self.records = []
+        self.steps = {}
+
+    def call(self, func, flow: str, ticker: str, args, kwargs):
+        """
+        Calls the given proc and records its stats
+        :return: result of the proc
+        """
+        df_in = kwargs.get("df", args[0] if args else None)
+        shape_in, bytes_in = _frame_stats(df_in)
+
+        mem_peak = 0
+        if self.trace_memory:
+            self.__start_tracing()
+            tracemalloc.reset_peak()
+            mem_start, _ = tracemalloc.get_traced_memory()
+
+        try:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            result = func(*args, **kwargs)
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                mem_peak = peak - mem_start
+        finally:
+            if self.trace_memory:
+                self.__stop_tracing()
+
+        df_out = result[0] if isinstance(result, tuple) else result
+        shape_out, bytes_out = _frame_stats(df_out)
+        copied = isinstance(df_out, pd.DataFrame) and df_out is not df_in
+
+        step = self.steps.get((flow, ticker), 0)
+        self.steps[(flow, ticker)] = step + 1
+
+        self.records.append(dict(flow=flow,
+                                 ticker=ticker,
+                                 step=step,
+                                 proc=func.__name__,
+                                 wall_ms=wall * 1000,
+                                 cpu_ms=cpu * 1000,
+                                 mem_peak_kb=mem_peak / 1024,
+                                 max_rss_mb=_max_rss_mb(),
+                                 rows_added=shape_out[0] - shape_in[0],
+                                 cols_added=shape_out[1] - shape_in[1],
+                                 bytes_added=bytes_out - bytes_in,
+                                 bytes_copied=bytes_out if copied else 0))
+        return result
+
+    def __start_tracing(self):
+        """ Starts tracemalloc unless it is already tracing, i.e. started by the caller """
+        with self.lock:
+            if self.tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            self.tracing += 1
+
+    def __stop_tracing(self):
+        """ Stops tracemalloc once the last traced proc returns, but only if the profiler started it """
+        with self.lock:
+            self.tracing -= 1
+            if self.tracing == 0 and self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+
+    def summary(self):
+        """
+        Aggregates all records by proc, i.e. across flows & tickers.
+        :return: pandas data frame with one row per proc, sorted by total wall time
+        """
+        df = pd.DataFrame(self.records)
+        if df.empty:
+            return df
+        agg = df.groupby("proc").agg(calls=("proc", "size"),
+                                     wall_ms=("wall_ms", "sum"),
+                                     cpu_ms=("cpu_ms", "sum"),
+                                     mem_peak_kb=("mem_peak_kb", "max"),
+                                     bytes_copied=("bytes_copied", "sum"))
+        return agg.sort_values("wall_ms", ascending=False)
+
+    def report(self, flow: str = None):
+        """
+        Returns a per-flow report as text table.
+        :param flow: only reports the given flow. All flows by default
+        :return: str
+        """
+        records = [r for r in self.records if flow is None or r["flow"] == flow]
+        header = "%-8s %-6s %4s %-28s %10s %10s %10s %9s %7s %7s %12s %12s" % (
+            "flow", "ticker", "step", "proc", "wall ms", "cpu ms", "peak KB", "RSS MB",
+            "rows+", "cols+", "bytes+", "bytes copy")
+        lines = [header, "-" * len(header)]
+        for r in records:
+            lines.append("%-8s %-6s %4d %-28s %10.2f %10.2f %10.1f %9.1f %7d %7d %12d %12d" % (
+                r["flow"], r["ticker"], r["step"], r["proc"], r["wall_ms"], r["cpu_ms"], r["mem_peak_kb"],
+                r["max_rss_mb"], r["rows_added"], r["cols_added"], r["bytes_added"], r["bytes_copied"]))
+        lines.append("-" * len(header))
+        lines.append("Total wall ms: %.2f   Total bytes copied: %d" % (
+            sum(r["wall_ms"] for r in records), sum(r["bytes_copied"] for r in records)))
+        return "\n".join(lines)
+
+    def to_json(self, path: str = None):
+        """
+        Returns all records as JSON and writes them to the given path, if any.
+        :param path: output file. Optional
+        :return: str
+        """
+        out = json.dumps(self.records, indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(out)
+        return out
+
+
+class _InstrumentedProcs:
+    """ Proxy of the procs module that routes all proc_ functions through the profiler """
+
+    def __init__(self, procs, profiler: ProcProfiler, flow: str, ticker: str):
+        self._procs = procs
+        self._profiler = profiler
+        self._flow = flow
+        self._ticker = ticker
+
+    def __getattr__(self, name):
+        attr = getattr(self._procs, name)
+        if not (callable(attr) and name.startswith("proc_")):
+            return attr
+
+        def instrumented(*args, **kwargs):
+            return self._profiler.call(attr, self._flow, self._ticker, args, kwargs)
+
+        return instrumented
+
+
+def _frame_stats(df):
+    """ Returns shape and shallow memory usage of the given frame """
+    if not isinstance(df, pd.DataFrame):
+        return (0, 0), 0
+    return df.shape, int(df.memory_usage(index=True, deep=False).sum())
+
+
+def _max_rss_mb():
+    """ Returns the peak resident set size of the process in MB, or zero if unknown """
+    if resource is None:
+        return 0.0
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
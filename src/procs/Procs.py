@@ -1,12 +1,46 @@
+import numpy as np
 import pandas as pd
 
 from src.enum import TECHIND
 from src.enum import Ticker
 from src.procs.OnlineVariance import OnlineVariance
+from src.utils import DTypeManager as dm
 from src.utils import TechInd as t
 
 DBG = False
 
+# Procs that add a percentage change right after merging an indicator read one previous row when change=True
+__change_procs = ["proc_add_adx", "proc_add_obv", "proc_add_mom", "proc_add_rsi"]
+# Procs that compute statistics over all rows of the frame
+__global_procs = ["proc_min_max_normalize", "proc_add_direction"]
+
+
+def proc_window(proc_name: str, **kwargs):
+    """
+    Returns the number of previous rows (lookback) and next rows (lookahead) a proc reads to compute one row.
+    The ChunkedProcFlow uses these to carry history across chunks.
+    Procs that merge cached indicators read no neighbour rows since indicators are computed over the full history.
+
+    :param proc_name: name of the proc, i.e. proc_add_volatility
+    :param kwargs: arguments of the proc call. Defaults apply for missing arguments
+    :return: tuple (lookback, lookahead), or None if the proc needs all rows of the series
+    """
+    if proc_name in __global_procs:
+        return None
+    if proc_name in ["proc_add_percent_change", "proc_add_abs_percent_change", "proc_add_macd"]:
+        return 1, 0
+    if proc_name in __change_procs:
+        return (1, 0) if kwargs.get("change", False) else (0, 0)
+    if proc_name == "proc_add_previous_values":
+        return kwargs["number"], 0
+    if proc_name == "proc_add_next_y":
+        return 0, kwargs["number"]
+    if proc_name == "proc_add_volatility":
+        # the volatility of a row includes the row itself and nr_days - 1 previous rows
+        return kwargs.get("nr_days", 255) - 1, 0
+    # row-wise procs, i.e. ohlc_avg, and procs that merge indicators
+    return 0, 0
+
 
 def proc_fill_nan(df):
     """ replaces NaN with zeros  """
@@ -25,6 +59,10 @@ def proc_min_max_normalize(df, max_scale: int = 100, all_col=True, exclude_col=[
     :param all_col: Set to false to esclude columns pass in the exclude_col string array
     :param exclude_col: string array (or list) with column nams to exclude.
     :return:
+
+    Note, min & max are taken over all rows, including the test rows, which leaks information from the test data
+    into the train data. Use a scaler of Scalers, i.e. MinMaxScaler(max_scale), fitted on the train data only,
+    i.e. with ProcFlow.split_data(df, scaler=scaler).
     """
 
     # replaces all NaN values with zero
@@ -84,6 +122,8 @@ def proc_add_next_y(df, y_column, number, cont_vars):
     :param number:
     :param cont_vars:
     :return:
+
+    For several horizons at once, see LagFeatures.add_targets.
     """
     # https://riptutorial.com/pandas/example/24907/shifting-or-lagging-values-in-a-dataframe
     c_name = "y"
@@ -101,6 +141,9 @@ def proc_add_previous_values(df, column_name, number, cont_vars):
     :param column_name: source column
     :param number: number of time periods to add
     :return: Void - modifies the frame in place
+
+    Each lag is a copy of the column. For many lags, use LagFeatures, which keeps them as a strided view
+    and copies them once when exporting to the model.
     """
     for n in range(1, (number + 1)):
         df[column_name + str("-") + str(n)] = df[column_name].shift(n)
@@ -162,6 +205,10 @@ def proc_add_direction(df, column_name, cat_vars, cont_vars, noise_threshold: fl
     The noise threshold percentile should be set below 0.10 to ensure that over 90% of the data get
     a direction value assigned.
 
+    Directions are stored as float64 by default. Under the compact dtype policy (see DTypeManager),
+    directions are stored as int8 and unassigned values are set to dm.LABEL_NA (-128),
+    which keeps them apart from the ZERO class.
+
     :param noise_threshold:
     :param df: pandas dataframe
     :param column_name: Name of the column from which the direction should be calculated
@@ -178,18 +225,58 @@ def proc_add_direction(df, column_name, cat_vars, cont_vars, noise_threshold: fl
     if target not in df.columns.values.tolist():
         df = proc_add_percent_change(df=df, column_name=column_name, cont_vars=cont_vars)
 
+    thresholds = direction_thresholds(df[target], noise_threshold)
+    # Rows not matching any category, i.e. NaN or values exactly on a threshold, remain NaN.
+    direction = direction_of(df[target].to_numpy(dtype=np.float64), thresholds)
+
+    # float64 by default, int8 under the compact dtype policy
+    df[column_name + name] = dm.cast_labels(direction)
+
+    # add meta data
+    cat_vars.append(column_name + name)
+
+    return df
+
+
+def direction_thresholds(pct, noise_threshold: float = 0.07):
+    """
+    Returns the percentile thresholds proc_add_direction derives from all percentage changes of a column.
+
+    :param pct: pandas series of percentage changes
+    :param noise_threshold: see proc_add_direction
+    :return: tuple (lowest_ten, bottom, min_negative, min_positive, top, top_fifteen, top_five)
+    """
     # percentile values of given column
     # https://stackoverflow.com/questions/39581893/pandas-find-percentile-stats-of-a-given-column
     # 10 th percentile = 10% of a values fall below this one
-    lowest_ten_quantile = df[target].quantile(0.10)
+    lowest_ten_quantile = pct.quantile(0.10)
     # 25 th percentile = 25% of a values fall below this one
-    bottom_quantile = df[target].quantile(0.25)
+    bottom_quantile = pct.quantile(0.25)
     # 75 th percentile = 75% of a values fall below this one
-    top_quantile = df[target].quantile(0.75)
+    top_quantile = pct.quantile(0.75)
     # 85 th percentile = 75% of a values fall below this one
-    top_fifteen_quantile = df[target].quantile(0.85)
+    top_fifteen_quantile = pct.quantile(0.85)
     # 95 th percentile = Top 10% of a values
-    top_five_quantile = df[target].quantile(0.95)
+    top_five_quantile = pct.quantile(0.95)
+
+    # min & max threshold to exclude noise
+    min_positive_pct = pct.loc[pct > 0].quantile(noise_threshold)
+    min_negative_pct = pct.loc[pct < 0].quantile(1 - noise_threshold)
+
+    return (lowest_ten_quantile, bottom_quantile, min_negative_pct, min_positive_pct,
+            top_quantile, top_fifteen_quantile, top_five_quantile)
+
+
+def direction_of(pct, thresholds):
+    """
+    Assigns the direction categories of proc_add_direction to the given percentage changes.
+
+    :param pct: float64 numpy array of percentage changes
+    :param thresholds: tuple, see direction_thresholds
+    :return: float64 numpy array of directions, NaN where no category matches
+    """
+    (lowest_ten_quantile, bottom_quantile, min_negative_pct, min_positive_pct,
+     top_quantile, top_fifteen_quantile, top_five_quantile) = thresholds
 
     # Direction categories, encoded as integers
     SKYFALL = -7
@@ -201,33 +288,29 @@ def proc_add_direction(df, column_name, cat_vars, cont_vars, noise_threshold: fl
     STRONG_UP = 5
     SKY_UP = 7
 
-    # min & max threshold to exclude noise
-    min_positive_pct = df[target].loc[df[target] > 0].quantile(noise_threshold)
-    min_negative_pct = df[target].loc[df[target] < 0].quantile(1 - noise_threshold)
+    # Assign all categories into one array. Later categories overwrite earlier ones.
+    direction = np.full(len(pct), np.nan)
 
     # SKYFALL = percentage change falls below the bottom 10%
-    df.loc[(df[target] < lowest_ten_quantile), column_name + name] = SKYFALL
+    direction[(pct < lowest_ten_quantile)] = SKYFALL
     # STRONG_DOWN = percentage change falls below the bottom 25% but stays above the lowest 10%
-    df.loc[(df[target] < bottom_quantile) & (df[target] > lowest_ten_quantile), column_name + name] = STRONG_DOWN
+    direction[(pct < bottom_quantile) & (pct > lowest_ten_quantile)] = STRONG_DOWN
     # DOWN = percentage change is negative but still above the bottom 25%
-    df.loc[(df[target] < min_negative_pct) & (df[target] > bottom_quantile), column_name + name] = DOWN
+    direction[(pct < min_negative_pct) & (pct > bottom_quantile)] = DOWN
     #
     # ZERO, if value is either zero or within noise level
-    df.loc[(df[target] > min_negative_pct) & (df[target] < min_positive_pct), column_name + name] = ZERO
+    direction[(pct > min_negative_pct) & (pct < min_positive_pct)] = ZERO
     #
     # UP = percentage change is positive, above the noise threshold, but below the 75% percentile
-    df.loc[(df[target] > min_positive_pct) & (df[target] < top_quantile), column_name + name] = UP
+    direction[(pct > min_positive_pct) & (pct < top_quantile)] = UP
     # MORE_UP = percentage change is above the 75% percentile but below the top 15%
-    df.loc[(df[target] > top_quantile) & (df[target] < top_fifteen_quantile), column_name + name] = MORE_UP
+    direction[(pct > top_quantile) & (pct < top_fifteen_quantile)] = MORE_UP
     # MORE_UP = percentage change is above the 85% percentile but below the top 5%
-    df.loc[(df[target] > top_fifteen_quantile) & (df[target] < top_five_quantile), column_name + name] = STRONG_UP
+    direction[(pct > top_fifteen_quantile) & (pct < top_five_quantile)] = STRONG_UP
     # SKY_UP = percentage change is above the top 5%
-    df.loc[(df[target] > top_five_quantile), column_name + name] = SKY_UP
+    direction[(pct > top_five_quantile)] = SKY_UP
 
-    # add meta data
-    cat_vars.append(column_name + name)
-
-    return df
+    return direction
 
 
 def proc_add_volatility(df, column_name, cont_vars, nr_days=255):
@@ -245,10 +328,12 @@ def proc_add_volatility(df, column_name, cont_vars, nr_days=255):
     name = column_name + "-volatility"
 
     # Compute Volatility using the Welford's method
+    # Accumulate in float64, even for float32 features, and cast the result back
+    values = df[column_name].astype(np.float64)
     ov = OnlineVariance()
     for n in range(nr_days):
-        ov.include(df[column_name].shift(n))
-    df[name] = ov.std
+        ov.include(values.shift(n))
+    df[name] = ov.std.astype(dm.float_dtype())
 
     cont_vars.append(name)
 
@@ -900,16 +985,13 @@ def rename_data(data, crypto: bool = False):
     :param data:
     :return:
     """
-    data = __rename_column(data, "date", 'Date')
-    data = __rename_column(data, "1. open", 'Open')
-    data = __rename_column(data, "2. high", 'High')
-    data = __rename_column(data, "3. low", 'Low')
-    data = __rename_column(data, "4. close", 'Close')
-    data = __rename_column(data, "5. volume", 'Volume')
+    # one rename for all columns, see Ingest for the complete ingest stage
+    names = {"date": 'Date', "1. open": 'Open', "2. high": 'High', "3. low": 'Low', "4. close": 'Close',
+             "5. volume": 'Volume'}
     if crypto:
-        data = __rename_column(data, "6. market cap (USD)", 'Market Cap')
+        names["6. market cap (USD)"] = 'Market Cap'
 
-    return data
+    return data.rename(columns=names)
 
 
 def convert_date(df, date_col_name: str = None):
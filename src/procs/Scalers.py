@@ -0,0 +1,342 @@
+"""
+Fit / transform scalers that replace proc_min_max_normalize.
+
+Scalers compute their statistics in one streaming pass over the train data only, either over a whole frame or
+chunk by chunk with partial_fit, i.e. over ColumnarCache.iter_chunks, and then apply the same transformation to
+train, test, and live data. Fitted parameters get saved to & loaded from a small JSON file.
+
+All scalers transform x to (x - offset) * scale:
+
+* MinMaxScaler: offset = min, scale = max_scale / (max - min), i.e. train data fall between 0 and max_scale
+* ZScoreScaler: offset = mean, scale = 1 / std, with mean & variance merged chunk by chunk (Chan et al.)
+* RobustScaler: offset = median, scale = 1 / interquartile range. Quantiles come from a seeded reservoir sample
+  of sample_size rows, which is exact as long as the train data have at most sample_size rows
+
+transform works in place on numpy float arrays in their own dtype, i.e. float32, and on the float columns of a frame.
+A scaler fitted on arrays scales the float columns of a frame by position. Under the default dtype policy,
+labels are float columns too, so the ProcFlow & container integrations restrict a scaler without columns to the
+continuous features with select: direction labels (cat_vars) and targets (y, y+1, ...) keep their values.
+NaN values are ignored by fit and stay NaN. Constant columns get mapped to 0.
+
+Usage:
+
+    scaler = ZScoreScaler()
+    train_df, test_df = pf.split_data(df_all, split_ratio=0.80, scaler=scaler)    # fits on train only
+    scaler.save("cache/AAPL-proc04-scaler.json")
+
+    scaler = Scalers.load("cache/AAPL-proc04-scaler.json")
+    scaler.transform(live_values)                                                 # float32 array, in place
+"""
+
+import json
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+
+DBG = False
+
+
+class Scaler(ABC):
+    """ Abstract base class of all scalers. Subclasses collect statistics in _update and derive offset & scale in _params """
+    kind = "Scaler"
+
+    def __init__(self, columns=None):
+        """
+        :param columns: columns of a frame to scale. All float columns by default
+        """
+        self.columns = None if columns is None else list(columns)
+        self.nr_rows = 0
+        self._offset = None
+        self._scale = None
+
+    def fit(self, data):
+        """
+        Computes the statistics over the given train data.
+        :param data: pandas data frame, 2-D numpy array, or an iterable of frames or arrays (chunks)
+        :return: self
+        """
+        self.reset()
+        chunks = [data] if isinstance(data, (pd.DataFrame, np.ndarray)) else data
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def partial_fit(self, chunk):
+        """
+        Adds the rows of the given chunk to the statistics.
+        :param chunk: pandas data frame or 2-D numpy array
+        :return: self
+        """
+        values = self.__values(chunk).astype(np.float64, copy=False)
+        self._update(values)
+        self.nr_rows += len(values)
+        self._offset = None
+        if DBG:
+            print(self.kind, " fitted on ", self.nr_rows, " rows")
+        return self
+
+    def transform(self, data, inplace: bool = True):
+        """
+        Scales the given data with the fitted parameters.
+        :param data: pandas data frame, or numpy float array (rows x columns) that gets scaled in its own dtype
+        :param inplace: scales the given data if True, a copy otherwise
+        :return: the scaled data
+        """
+        offset, scale = self.params
+        if isinstance(data, pd.DataFrame):
+            df = data if inplace else data.copy()
+            columns = self.__columns_of(df, len(offset))
+            values = df[columns].to_numpy(copy=True)
+            if not np.issubdtype(values.dtype, np.floating):
+                values = values.astype(np.float64)
+            df[columns] = self.__apply(values, offset, scale)
+            return df
+
+        values = data if inplace else data.copy()
+        return self.__apply(values, offset, scale)
+
+    def select(self, df, cont_vars=None, cat_vars=None):
+        """
+        Restricts a scaler without columns to the float columns of cont_vars, or to all float columns,
+        without cat_vars & targets. A scaler with columns stays as is.
+        :param df: pandas data frame
+        :param cont_vars: [Optional] continuous meta data
+        :param cat_vars: [Optional] categorial meta data, i.e. direction labels
+        :return: self
+        """
+        if self.columns is None:
+            floats = set(df.select_dtypes(include="floating").columns)
+            candidates = df.columns if cont_vars is None else dict.fromkeys(cont_vars)
+            excluded = set(cat_vars or [])
+            self.columns = [c for c in candidates if c in floats and c not in excluded and not _is_target(c)]
+        return self
+
+    def fit_transform(self, data, inplace: bool = True):
+        return self.fit(data).transform(data, inplace)
+
+    def inverse_transform(self, data, inplace: bool = True):
+        """ Maps scaled values back to the original scale. Constant columns map back to their offset """
+        offset, scale = self.params
+        values = data if inplace else data.copy()
+        inverse = np.divide(1.0, scale, out=np.zeros_like(scale), where=scale != 0)
+        np.multiply(values, inverse.astype(values.dtype), out=values)
+        np.add(values, offset.astype(values.dtype), out=values)
+        return values
+
+    @property
+    def params(self):
+        """ :return: tuple (offset, scale) of float64 numpy arrays, one value per column """
+        if self.nr_rows == 0:
+            raise ValueError(self.kind + " is not fitted.")
+        if self._offset is None:
+            self._offset, self._scale = self._params()
+        return self._offset, self._scale
+
+    def reset(self):
+        self.nr_rows = 0
+        self._offset = None
+        self._scale = None
+
+    def save(self, path: str):
+        """ Stores the fitted parameters & settings in a JSON file """
+        offset, scale = self.params
+        state = dict(kind=self.kind, columns=self.columns, nr_rows=self.nr_rows,
+                     offset=offset.tolist(), scale=scale.tolist(), settings=self._settings())
+        with open(path, "w") as f:
+            json.dump(state, f)
+
+    def _settings(self) -> dict:
+        return {}
+
+    @abstractmethod
+    def _update(self, values):
+        """
+        Collects the statistics of the given values.
+
+        :param values: 2-D numpy float array (rows, columns)
+        :return: void
+        """
+        pass
+
+    @abstractmethod
+    def _params(self):
+        """
+        Derives offset & scale from the collected statistics.
+
+        :return: tuple (offset, scale) of 1-D numpy arrays, one value per column
+        """
+        pass
+
+    def __values(self, chunk):
+        if isinstance(chunk, pd.DataFrame):
+            if self.columns is None:
+                self.columns = chunk.select_dtypes(include="floating").columns.tolist()
+            return chunk[self.columns].to_numpy()
+        values = np.asarray(chunk)
+        return values.reshape(-1, 1) if values.ndim == 1 else values
+
+    def __columns_of(self, df, nr_columns: int):
+        """ Columns of the fit, or the float columns by position for a scaler fitted on arrays """
+        if self.columns is not None:
+            return self.columns
+        columns = df.select_dtypes(include="floating").columns.tolist()
+        if len(columns) != nr_columns:
+            raise ValueError("%s was fitted on %d array columns, but the frame has %d float columns. "
+                             "Fit on a frame or set columns." % (self.kind, nr_columns, len(columns)))
+        return columns
+
+    @staticmethod
+    def __apply(values, offset, scale):
+        np.subtract(values, offset.astype(values.dtype), out=values)
+        np.multiply(values, scale.astype(values.dtype), out=values)
+        return values
+
+
+class MinMaxScaler(Scaler):
+    """ Scales the train data to the range 0 to max_scale, as proc_min_max_normalize does over all rows """
+    kind = "MinMaxScaler"
+
+    def __init__(self, max_scale: float = 1.0, columns=None):
+        """
+        :param max_scale: maximum of the scaled train data
+        :param columns: columns of a frame to scale. All float columns by default
+        """
+        super().__init__(columns)
+        self.max_scale = max_scale
+        self.min = None
+        self.max = None
+
+    def reset(self):
+        super().reset()
+        self.min = None
+        self.max = None
+
+    def _update(self, values):
+        with np.errstate(invalid="ignore"):
+            low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        self.min = low if self.min is None else np.fmin(self.min, low)
+        self.max = high if self.max is None else np.fmax(self.max, high)
+
+    def _params(self):
+        span = self.max - self.min
+        scale = np.divide(self.max_scale, span, out=np.zeros_like(span), where=span > 0)
+        return np.nan_to_num(self.min), scale
+
+    def _settings(self) -> dict:
+        return dict(max_scale=self.max_scale)
+
+
+class ZScoreScaler(Scaler):
+    """ Scales the train data to zero mean & unit standard deviation (population) """
+    kind = "ZScoreScaler"
+
+    def __init__(self, columns=None):
+        super().__init__(columns)
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def reset(self):
+        super().reset()
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def _update(self, values):
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(valid, values, 0.0).sum(axis=0) / count
+            deviation = np.where(valid, values - mean, 0.0)
+        m2 = (deviation * deviation).sum(axis=0)
+        mean = np.nan_to_num(mean)
+
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        # merge the moments of the chunk with the moments so far
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0.0)
+            self.m2 = self.m2 + m2 + np.where(total > 0, delta * delta * self.count * count / total, 0.0)
+        self.count = total
+
+    def _params(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2 / self.count)
+        scale = np.divide(1.0, std, out=np.zeros_like(std), where=std > 0)
+        return self.mean, scale
+
+
+class RobustScaler(Scaler):
+    """ Scales the train data by median & interquartile range, which outliers hardly move """
+    kind = "RobustScaler"
+
+    def __init__(self, columns=None, sample_size: int = 100_000, seed: int = 42):
+        """
+        :param columns: columns of a frame to scale. All float columns by default
+        :param sample_size: number of rows of the reservoir sample
+        :param seed: seed of the reservoir sample
+        """
+        super().__init__(columns)
+        self.sample_size = sample_size
+        self.seed = seed
+        self.sample = None
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self):
+        super().reset()
+        self.sample = None
+        self.rng = np.random.default_rng(self.seed)
+
+    def _update(self, values):
+        if self.sample is None:
+            self.sample = np.empty((0, values.shape[1]))
+        free = max(0, self.sample_size - len(self.sample))
+        if free:
+            self.sample = np.vstack([self.sample, values[:free]])
+        rest = values[free:]
+        if len(rest) == 0:
+            return
+        # Algorithm R: row i of the stream replaces a random row of the reservoir with probability size / (i + 1)
+        seen = self.nr_rows + free + np.arange(len(rest))
+        slots = self.rng.integers(0, seen + 1)
+        keep = slots < self.sample_size
+        self.sample[slots[keep]] = rest[keep]
+
+    def _params(self):
+        with np.errstate(invalid="ignore"):
+            low, median, high = np.nanquantile(self.sample, [0.25, 0.5, 0.75], axis=0)
+        span = high - low
+        scale = np.divide(1.0, span, out=np.zeros_like(span), where=span > 0)
+        return np.nan_to_num(median), scale
+
+    def _settings(self) -> dict:
+        return dict(sample_size=self.sample_size, seed=self.seed)
+
+
+scalers = {s.kind: s for s in (MinMaxScaler, ZScoreScaler, RobustScaler)}
+
+
+def _is_target(name) -> bool:
+    """ True for the targets of proc_add_next_y (y) and LagFeatures.add_targets (y+1, y+5, ...) """
+    name = str(name)
+    return name == "y" or name.startswith("y+")
+
+
+def load(path: str) -> Scaler:
+    """
+    Loads a scaler stored with save. The loaded scaler transforms, but can't continue fitting.
+    :param path: JSON file
+    :return: MinMaxScaler, ZScoreScaler, or RobustScaler
+    """
+    with open(path) as f:
+        state = json.load(f)
+    scaler = scalers[state["kind"]](columns=state["columns"], **state["settings"])
+    scaler.nr_rows = state["nr_rows"]
+    scaler._offset = np.asarray(state["offset"], dtype=np.float64)
+    scaler._scale = np.asarray(state["scale"], dtype=np.float64)
+    return scaler
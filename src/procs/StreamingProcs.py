@@ -0,0 +1,426 @@
+"""
+Streaming counterparts of the technical indicators and of the volatility & direction procs.
+
+Each indicator keeps its state in __slots__ and fixed-size numpy ring buffers and updates in O(1) per bar,
+so a live loop updates its features on every new bar instead of recomputing them over the whole series.
+update(bar) takes either a number or a bar with the source column, i.e. a dict, a pandas row, or a named tuple,
+and returns the current value, or NaN during the warm-up period.
+
+Replaying a series through an indicator returns the values of its batch version:
+
+* SMA, EMA, WMA, RSI, MOM, MACD, BBANDS follow ta-lib (see TechProcs), i.e. EMA & RSI are seeded with
+  the simple average of the first time period, and the first value is at the same index as in ta-lib.
+* Volatility equals proc_add_volatility on an ascending frame.
+* Direction equals proc_add_direction given the thresholds fitted on the same series. The batch version
+  derives its thresholds from quantiles over all rows, so live updates need thresholds fitted on history.
+
+snapshot() returns a deep copy of the state, and restore(snapshot) resets an indicator to it,
+i.e. to roll back a bar that got revised or to persist the state between sessions.
+
+Usage:
+
+    rsi = RSI(time_period=14)
+    values = rsi.replay(df_hist["Close"])   # warm up on history
+    state = rsi.snapshot()
+    for bar in live_bars:
+        value = rsi.update(bar)
+"""
+
+import copy
+import math
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from src.procs import Procs
+
+
+DBG = False
+
+
+def _value(bar, column: str) -> float:
+    """ Returns the source value of the given bar, which is either a number or indexable by column name """
+    if isinstance(bar, (int, float, np.number)):
+        return float(bar)
+    try:
+        return float(bar[column])
+    except (TypeError, IndexError, KeyError):
+        return float(getattr(bar, column))
+
+
+class RingBuffer:
+    """ Fixed-size float64 buffer of the last size values """
+    __slots__ = ("values", "pos", "count")
+
+    def __init__(self, size: int):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self) -> bool:
+        return self.count == len(self.values)
+
+    def push(self, value: float) -> float:
+        """
+        Appends the given value.
+        :return: the value that dropped out of the buffer, or NaN if the buffer wasn't full.
+                 Check full before the push to tell a dropped NaN apart.
+        """
+        dropped = self.values[self.pos] if self.full else math.nan
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % len(self.values)
+        if self.count < len(self.values):
+            self.count += 1
+        return float(dropped)
+
+    def oldest(self) -> float:
+        """ Returns the oldest value, which the next push drops if the buffer is full """
+        return float(self.values[self.pos if self.full else 0])
+
+
+class StreamingProc(ABC):
+    """ Abstract base class with snapshot, restore & replay for all streaming indicators """
+    __slots__ = ("column",)
+
+    @abstractmethod
+    def update(self, bar):
+        """
+        Updates the state with the given bar.
+
+        :param bar: mapping of column name to value, i.e. a dictionary or pandas series
+        :return: current value of the indicator
+        """
+        pass
+
+    def snapshot(self) -> dict:
+        """ Returns a deep copy of the state """
+        return {name: copy.deepcopy(getattr(self, name)) for name in self.__state_slots()}
+
+    def restore(self, snapshot: dict):
+        """ Resets the state to the given snapshot. The snapshot remains unchanged. """
+        for name, value in snapshot.items():
+            setattr(self, name, copy.deepcopy(value))
+        return self
+
+    def replay(self, values):
+        """
+        Updates the indicator with all given values, i.e. a column of a frame in ascending order.
+        :return: numpy array of all outputs. Two-dimensional for indicators with several outputs
+        """
+        return np.array([self.update(v) for v in np.asarray(values, dtype=np.float64)])
+
+    def __state_slots(self):
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                yield name
+
+
+class SMA(StreamingProc):
+    """ Simple moving average, ta-lib SMA """
+    __slots__ = ("time_period", "window", "total")
+
+    def __init__(self, time_period: int = 20, column: str = "Close"):
+        self.column = column
+        self.time_period = time_period
+        self.window = RingBuffer(time_period)
+        self.total = 0.0
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        was_full = self.window.full
+        dropped = self.window.push(x)
+        self.total += x - dropped if was_full else x
+        return self.total / self.time_period if self.window.full else math.nan
+
+
+class EMA(StreamingProc):
+    """ Exponential moving average, ta-lib EMA: seeded with the SMA of the first time period """
+    __slots__ = ("time_period", "k", "count", "total", "ema")
+
+    def __init__(self, time_period: int = 20, column: str = "Close"):
+        self.column = column
+        self.time_period = time_period
+        self.k = 2.0 / (time_period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.ema = math.nan
+
+    def update(self, bar) -> float:
+        return self.update_value(_value(bar, self.column))
+
+    def update_value(self, x: float) -> float:
+        if self.count < self.time_period:
+            self.count += 1
+            self.total += x
+            if self.count == self.time_period:
+                self.ema = self.total / self.time_period
+            return self.ema
+        self.ema = (x - self.ema) * self.k + self.ema
+        return self.ema
+
+
+class WMA(StreamingProc):
+    """ Linearly weighted moving average, ta-lib WMA """
+    __slots__ = ("time_period", "window", "total", "weighted", "divider")
+
+    def __init__(self, time_period: int = 20, column: str = "Close"):
+        self.column = column
+        self.time_period = time_period
+        self.window = RingBuffer(time_period)
+        self.total = 0.0
+        # sum of the weighted values, where the newest value has weight time_period
+        self.weighted = 0.0
+        self.divider = time_period * (time_period + 1) / 2.0
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        if not self.window.full:
+            self.window.push(x)
+            self.total += x
+            self.weighted += len(self.window) * x
+            return self.weighted / self.divider if self.window.full else math.nan
+        # every value loses one weight, the new value gets the full weight
+        self.weighted += self.time_period * x - self.total
+        self.total += x - self.window.push(x)
+        return self.weighted / self.divider
+
+
+class MOM(StreamingProc):
+    """ Momentum, ta-lib MOM: difference to the value time_period bars ago """
+    __slots__ = ("window",)
+
+    def __init__(self, time_period: int = 10, column: str = "Close"):
+        self.column = column
+        self.window = RingBuffer(time_period + 1)
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        self.window.push(x)
+        return x - self.window.oldest() if self.window.full else math.nan
+
+
+class RSI(StreamingProc):
+    """ Relative strength index, ta-lib RSI: Wilder's smoothing seeded with the average of the first time period """
+    __slots__ = ("time_period", "count", "previous", "gain", "loss")
+
+    def __init__(self, time_period: int = 14, column: str = "Close"):
+        self.column = column
+        self.time_period = time_period
+        self.count = 0
+        self.previous = math.nan
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        if self.count == 0:
+            self.count = 1
+            self.previous = x
+            return math.nan
+
+        diff = x - self.previous
+        self.previous = x
+        gain = diff if diff > 0 else 0.0
+        loss = -diff if diff < 0 else 0.0
+        n = self.time_period
+
+        if self.count < n:
+            self.count += 1
+            self.gain += gain
+            self.loss += loss
+            return math.nan
+        if self.count == n:
+            self.count += 1
+            self.gain = (self.gain + gain) / n
+            self.loss = (self.loss + loss) / n
+        else:
+            self.gain = (self.gain * (n - 1) + gain) / n
+            self.loss = (self.loss * (n - 1) + loss) / n
+
+        total = self.gain + self.loss
+        return 100.0 * self.gain / total if total != 0 else 0.0
+
+
+class MACD(StreamingProc):
+    """
+    Moving average convergence / divergence, ta-lib MACD.
+    ta-lib aligns the fast EMA with the slow EMA, so the fast EMA gets seeded with the SMA of the fast period
+    that ends at the first value of the slow EMA. The signal is the EMA of the MACD.
+    update returns (macd, signal, hist), all NaN until the first signal value.
+    """
+    __slots__ = ("fast", "slow", "signal", "window", "fast_ema", "slow_ema")
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9, column: str = "Close"):
+        self.column = column
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        # last fast_period values before the slow EMA starts
+        self.window = RingBuffer(fast_period)
+        self.fast_ema = math.nan
+        self.slow_ema = math.nan
+
+    def update(self, bar):
+        x = _value(bar, self.column)
+        self.slow_ema = self.slow.update_value(x)
+
+        if math.isnan(self.slow_ema):
+            self.window.push(x)
+            return math.nan, math.nan, math.nan
+
+        if math.isnan(self.fast_ema):
+            # seed the fast EMA with the last fast_period values, including x
+            self.window.push(x)
+            for value in np.roll(self.window.values, -self.window.pos):
+                self.fast_ema = self.fast.update_value(float(value))
+        else:
+            self.fast_ema = self.fast.update_value(x)
+
+        macd = self.fast_ema - self.slow_ema
+        signal = self.signal.update_value(macd)
+        if math.isnan(signal):
+            return math.nan, math.nan, math.nan
+        return macd, signal, macd - signal
+
+
+class BBANDS(StreamingProc):
+    """ Bollinger bands, ta-lib BBANDS with SMA: middle band +/- nr_std population standard deviations """
+    __slots__ = ("time_period", "nr_std_up", "nr_std_down", "window", "total", "total_sq")
+
+    def __init__(self, time_period: int = 20, nr_std_up: float = 2.0, nr_std_down: float = 2.0,
+                 column: str = "Close"):
+        self.column = column
+        self.time_period = time_period
+        self.nr_std_up = nr_std_up
+        self.nr_std_down = nr_std_down
+        self.window = RingBuffer(time_period)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, bar):
+        """ :return: tuple (upper, middle, lower), as ta-lib """
+        x = _value(bar, self.column)
+        was_full = self.window.full
+        dropped = self.window.push(x)
+        self.total += x
+        self.total_sq += x * x
+        if was_full:
+            self.total -= dropped
+            self.total_sq -= dropped * dropped
+        if not self.window.full:
+            return math.nan, math.nan, math.nan
+
+        n = self.time_period
+        mid = self.total / n
+        variance = self.total_sq / n - mid * mid
+        std = math.sqrt(variance) if variance > 0 else 0.0
+        return mid + self.nr_std_up * std, mid, mid - self.nr_std_down * std
+
+
+class Volatility(StreamingProc):
+    """
+    Rolling sample standard deviation over the last nr_days values, as proc_add_volatility.
+    Values get added & removed with Welford's method. NaN values in the window yield NaN, as in the batch version.
+    """
+    __slots__ = ("nr_days", "window", "count", "nr_nan", "mean", "m2")
+
+    def __init__(self, nr_days: int = 255, column: str = "Close"):
+        self.column = column
+        self.nr_days = nr_days
+        self.window = RingBuffer(nr_days)
+        self.count = 0
+        self.nr_nan = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        was_full = self.window.full
+        dropped = self.window.push(x)
+        if was_full:
+            self.__remove(dropped)
+        self.__include(x)
+
+        if not self.window.full or self.nr_nan > 0 or self.count < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+
+    def __include(self, x: float):
+        if math.isnan(x):
+            self.nr_nan += 1
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def __remove(self, x: float):
+        if math.isnan(x):
+            self.nr_nan -= 1
+            return
+        if self.count == 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self.m2 -= delta * (x - self.mean)
+
+
+class Direction(StreamingProc):
+    """
+    Direction category of the percentage change, as proc_add_direction, with fixed thresholds.
+    Use fit to derive the thresholds from history the same way the batch version does.
+    """
+    __slots__ = ("thresholds", "previous")
+
+    def __init__(self, thresholds, column: str = "Close"):
+        """
+        :param thresholds: tuple, see Procs.direction_thresholds
+        :param column: source column
+        """
+        self.column = column
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.previous = math.nan
+
+    @classmethod
+    def fit(cls, values, noise_threshold: float = 0.07, column: str = "Close"):
+        """
+        Returns a Direction with the thresholds of the given history.
+        :param values: source values in ascending order, i.e. the close price
+        """
+        pct = pd.Series(np.asarray(values, dtype=np.float64)).pct_change()
+        return cls(Procs.direction_thresholds(pct, noise_threshold), column=column)
+
+    def update(self, bar) -> float:
+        x = _value(bar, self.column)
+        pct = x / self.previous - 1
+        self.previous = x
+        return self.classify(pct)
+
+    def classify(self, pct: float) -> float:
+        """ Returns the direction of the given percentage change. Checks categories in reverse order of
+        Procs.direction_of, since later categories overwrite earlier ones there. """
+        (lowest_ten, bottom, min_negative, min_positive, top, top_fifteen, top_five) = self.thresholds
+        if pct > top_five:
+            return 7.0
+        if top_fifteen < pct < top_five:
+            return 5.0
+        if top < pct < top_fifteen:
+            return 3.0
+        if min_positive < pct < top:
+            return 1.0
+        if min_negative < pct < min_positive:
+            return 0.0
+        if bottom < pct < min_negative:
+            return -1.0
+        if lowest_ten < pct < bottom:
+            return -3.0
+        if pct < lowest_ten:
+            return -7.0
+        return math.nan
@@ -1,6 +1,79 @@
 import numpy as np
+import pandas as pd
 import talib
 
+from src.procs.FeatureExecutor import FeatureExecutor
+from src.utils import DTypeManager as dm
+
+# all 61 chart patterns in TA lib version 4.0.17 as (name, function, kwargs)
+# The position in the list is the bit position in the packed pattern column.
+CHART_PATTERNS = [
+    ("CDL2CROWS", talib.CDL2CROWS, {}),  # Two Crows
+    ("CDL3BLACKCROWS", talib.CDL3BLACKCROWS, {}),  # Three Black Crows
+    ("CDL3INSIDE", talib.CDL3INSIDE, {}),  # Three Inside Up/Down
+    ("CDL3LINESTRIKE", talib.CDL3LINESTRIKE, {}),  # Three-Line Strike
+    ("CDL3OUTSIDE", talib.CDL3OUTSIDE, {}),  # Three Outside Up/Down
+    ("CDL3STARSINSOUTH", talib.CDL3STARSINSOUTH, {}),  # Three Stars In The South
+    ("CDL3WHITESOLDIERS", talib.CDL3WHITESOLDIERS, {}),  # Three Advancing White Soldiers
+    ("CDLABANDONEDBABY", talib.CDLABANDONEDBABY, {'penetration': 0}),  # Abandoned Baby
+    ("CDLADVANCEBLOCK", talib.CDLADVANCEBLOCK, {}),  # Advance Block
+    ("CDLBELTHOLD", talib.CDLBELTHOLD, {}),  # Belt-hold
+    ("CDLBREAKAWAY", talib.CDLBREAKAWAY, {}),  # Breakaway
+    ("CDLCLOSINGMARUBOZU", talib.CDLCLOSINGMARUBOZU, {}),  # Closing Marubozu
+    ("CDLCONCEALBABYSWALL", talib.CDLCONCEALBABYSWALL, {}),  # Concealing Baby Swallow # WTF???
+    ("CDLCOUNTERATTACK", talib.CDLCOUNTERATTACK, {}),  # Counterattack
+    ("CDLDARKCLOUDCOVER", talib.CDLDARKCLOUDCOVER, {'penetration': 0}),  # Dark Cloud Cover
+    ("CDLDOJI", talib.CDLDOJI, {}),  # Doji
+    ("CDLDOJISTAR", talib.CDLDOJISTAR, {}),  # Doji Star
+    ("CDLDRAGONFLYDOJI", talib.CDLDRAGONFLYDOJI, {}),  # Dragonfly Doji
+    ("CDLENGULFING", talib.CDLENGULFING, {}),  # Engulfing Pattern
+    ("CDLEVENINGDOJISTAR", talib.CDLEVENINGDOJISTAR, {'penetration': 0}),  # Evening Doji Star
+    ("CDLEVENINGSTAR", talib.CDLEVENINGSTAR, {'penetration': 0}),  # Evening Star
+    ("CDLGAPSIDESIDEWHITE", talib.CDLGAPSIDESIDEWHITE, {}),  # Up/Down-gap side-by-side white lines
+    ("CDLGRAVESTONEDOJI", talib.CDLGRAVESTONEDOJI, {}),  # Gravestone Doji
+    ("CDLHAMMER", talib.CDLHAMMER, {}),  # Hammer
+    ("CDLHANGINGMAN", talib.CDLHANGINGMAN, {}),  # Hanging Man
+    ("CDLHARAMI", talib.CDLHARAMI, {}),  # Harami Pattern
+    ("CDLHARAMICROSS", talib.CDLHARAMICROSS, {}),  # Harami Cross Pattern
+    ("CDLHIGHWAVE", talib.CDLHIGHWAVE, {}),  # High-Wave Candle
+    ("CDLHIKKAKE", talib.CDLHIKKAKE, {}),  # Hikkake Pattern
+    ("CDLHIKKAKEMOD", talib.CDLHIKKAKEMOD, {}),  # Modified Hikkake Pattern
+    ("CDLHOMINGPIGEON", talib.CDLHOMINGPIGEON, {}),  # Homing Pigeon
+    ("CDLIDENTICAL3CROWS", talib.CDLIDENTICAL3CROWS, {}),  # Identical Three Crows
+    ("CDLINNECK", talib.CDLINNECK, {}),  # In-Neck Pattern
+    ("CDLINVERTEDHAMMER", talib.CDLINVERTEDHAMMER, {}),  # Inverted Hammer
+    ("CDLKICKING", talib.CDLKICKING, {}),  # Kicking
+    ("CDLKICKINGBYLENGTH", talib.CDLKICKINGBYLENGTH, {}),  # Kicking - bull/bear determined by the longer marubozu
+    ("CDLLADDERBOTTOM", talib.CDLLADDERBOTTOM, {}),  # Ladder Bottom
+    ("CDLLONGLEGGEDDOJI", talib.CDLLONGLEGGEDDOJI, {}),  # Long Legged Doji
+    ("CDLLONGLINE", talib.CDLLONGLINE, {}),  # Long Line Candle
+    ("CDLMARUBOZU", talib.CDLMARUBOZU, {}),  # Marubozu
+    ("CDLMATCHINGLOW", talib.CDLMATCHINGLOW, {}),  # Matching Low
+    ("CDLMATHOLD", talib.CDLMATHOLD, {'penetration': 0}),  # Mat Hold
+    ("CDLMORNINGDOJISTAR", talib.CDLMORNINGDOJISTAR, {'penetration': 0}),  # Morning Doji Star
+    ("CDLMORNINGSTAR", talib.CDLMORNINGSTAR, {'penetration': 0}),  # Morning Star
+    ("CDLONNECK", talib.CDLONNECK, {}),  # On-Neck Pattern
+    ("CDLPIERCING", talib.CDLPIERCING, {}),  # Piercing Pattern
+    ("CDLRICKSHAWMAN", talib.CDLRICKSHAWMAN, {}),  # Rickshaw Man
+    ("CDLRISEFALL3METHODS", talib.CDLRISEFALL3METHODS, {}),  # Rising/Falling Three Methods
+    ("CDLSEPARATINGLINES", talib.CDLSEPARATINGLINES, {}),  # Separating Lines
+    ("CDLSHOOTINGSTAR", talib.CDLSHOOTINGSTAR, {}),  # Shooting Star
+    ("CDLSHORTLINE", talib.CDLSHORTLINE, {}),  # Short Line Candle
+    ("CDLSPINNINGTOP", talib.CDLSPINNINGTOP, {}),  # Spinning Top
+    ("CDLSTALLEDPATTERN", talib.CDLSTALLEDPATTERN, {}),  # Stalled Pattern
+    ("CDLSTICKSANDWICH", talib.CDLSTICKSANDWICH, {}),  # Stick Sandwich
+    ("CDLTAKURI", talib.CDLTAKURI, {}),  # Takuri (Dragonfly Doji with very long lower shadow)
+    ("CDLTASUKIGAP", talib.CDLTASUKIGAP, {}),  # Tasuki Gap
+    ("CDLTHRUSTING", talib.CDLTHRUSTING, {}),  # Thrusting Pattern
+    ("CDLTRISTAR", talib.CDLTRISTAR, {}),  # Tristar Pattern
+    ("CDLUNIQUE3RIVER", talib.CDLUNIQUE3RIVER, {}),  # Unique 3 River
+    ("CDLUPSIDEGAP2CROWS", talib.CDLUPSIDEGAP2CROWS, {}),  # Upside Gap Two Crows
+    ("CDLXSIDEGAP3METHODS", talib.CDLXSIDEGAP3METHODS, {}),  # Upside/Downside Gap Three Methods
+]
+PATTERN_NAMES = [name for name, _, _ in CHART_PATTERNS]
+PATTERN_INDEX = {name: bit for bit, name in enumerate(PATTERN_NAMES)}
+PATTERN_COLUMN = "CDL_PATTERNS"
+
 
 class TechProcs:
 
@@ -11,7 +84,9 @@ class TechProcs:
         :param column_name: MUST refer to the close price of the stock
         :return: Void - modifies the frame in place
         """
-        close = np.asarray(df[column_name])
+        columns = df.columns.tolist()
+        # ta-lib requires float64 input, even when the features are stored as float32
+        close = np.asarray(df[column_name], dtype=np.float64)
         # This is for experimenting to generate a wide range of technical indicators
         # requires subsequent feature ranking
         full_range = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 25, 26, 27, 28, 29]
@@ -99,181 +174,251 @@ class TechProcs:
                 print("Cycle Indicator Functions")
                 print(df.corr())
 
-    def calc_all_features(df):
-        open = np.asarray(df['Open'])
-        close = np.asarray(df['Close'])
-        high = np.asarray(df['High'])
-        low = np.asarray(df['Low'])
-        volume = df['Volume']  # . For magic reasons, volume must be a pandas data frame.
+        _cast_new_columns(df, columns)
+
+    def calc_all_features(df, workers: int = None):
+        """
+        Calculates all price, average, volume, momentum, and cycle studies.
+        All independent ta-lib kernels run in parallel on a thread pool and write
+        into one preallocated feature matrix, see FeatureExecutor.
+
+        :param df: pandas data frame with OHLCV columns
+        :param workers: Number of threads. None uses the default of the ThreadPoolExecutor, 1 runs serial.
+        :return: pandas data frame with all features appended
+        """
+        # ta-lib requires float64 input, even when the features are stored as float32
+        open = np.asarray(df['Open'], dtype=np.float64)
+        close = np.asarray(df['Close'], dtype=np.float64)
+        high = np.asarray(df['High'], dtype=np.float64)
+        low = np.asarray(df['Low'], dtype=np.float64)
+        volume = np.asarray(df['Volume'], dtype=np.float64)
+
+        fx = FeatureExecutor(workers=workers)
+        TechProcs.get_price_studies(open, low, high, close, fx)
+        TechProcs.get_average_studies(open, low, high, close, fx)
+        TechProcs.get_volume_studies(open, low, high, close, volume, fx)
+        TechProcs.get_momentum_studies(open, low, high, close, volume, fx)
+        TechProcs.get_cycle_studies(close, fx)
+
+        return fx.apply(df)
+
+    def calc_all_features_many(frames, processes: int = None):
+        """
+        Calculates all features for many tickers on a process pool, one frame per ticker.
+        Each process computes its features serial.
 
-        get_price_studies(open, low, high, close, df)
-        get_average_studies(open, low, high, close, df)
-        get_volume_studies(open, low, high, close, volume, df)
-        get_momentum_studies(open, low, high, close, volume, df)
-        get_cycle_studies(close, df)
+        :param frames: list of pandas data frames with OHLCV columns
+        :param processes: Number of processes. None uses the number of cores, 1 runs serial.
+        :return: list of pandas data frames in the same order as the given frames
+        """
+        return FeatureExecutor.map_frames(_calc_all_features_serial, frames, processes=processes)
 
-    def get_price_studies(open, low, high, close, df):
+    def get_price_studies(open, low, high, close, fx):
         # https://mrjbq7.github.io/ta-lib/func_groups/price_transform.html
-        df["AVGPRICE"] = talib.AVGPRICE(open, high, low, close)
-        df["MEDPRICE"] = talib.MEDPRICE(high, low)
-        df["TYPPRICE"] = talib.TYPPRICE(high, low, close)
-        df["WCLPRICE"] = talib.WCLPRICE(high, low, close)
-        df["ATR-5"] = talib.ATR(high, low, close, timeperiod=5)
-        df["ATR-10"] = talib.ATR(high, low, close, timeperiod=10)
-        df["ATR-20"] = talib.ATR(high, low, close, timeperiod=20)
-        df["ATR-50"] = talib.ATR(high, low, close, timeperiod=50)
-        df["ATR-200"] = talib.ATR(high, low, close, timeperiod=200)
-
-    def get_volume_studies(open, low, high, close, volume, df):
+        fx.add("AVGPRICE", talib.AVGPRICE, open, high, low, close)
+        fx.add("MEDPRICE", talib.MEDPRICE, high, low)
+        fx.add("TYPPRICE", talib.TYPPRICE, high, low, close)
+        fx.add("WCLPRICE", talib.WCLPRICE, high, low, close)
+        fx.add("ATR-5", talib.ATR, high, low, close, timeperiod=5)
+        fx.add("ATR-10", talib.ATR, high, low, close, timeperiod=10)
+        fx.add("ATR-20", talib.ATR, high, low, close, timeperiod=20)
+        fx.add("ATR-50", talib.ATR, high, low, close, timeperiod=50)
+        fx.add("ATR-200", talib.ATR, high, low, close, timeperiod=200)
+
+    def get_volume_studies(open, low, high, close, volume, fx):
         # Volume Indicator Functions
-        # @TODO: Fix type case error of volume column
         # https://mrjbq7.github.io/ta-lib/func_groups/volume_indicators.html
-        df["AD"] = talib.AD(high, low, close, volume)
-        df["ADOSC"] = talib.ADOSC(high, low, close, volume, fastperiod=3, slowperiod=10)
-        df["OBV"] = talib.OBV(close, volume)
+        fx.add("AD", talib.AD, high, low, close, volume)
+        fx.add("ADOSC", talib.ADOSC, high, low, close, volume, fastperiod=3, slowperiod=10)
+        fx.add("OBV", talib.OBV, close, volume)
 
-    def get_momentum_studies(open, low, high, close, volume, df):
+    def get_momentum_studies(open, low, high, close, volume, fx):
         # Momentum studies
         # https://mrjbq7.github.io/ta-lib/func_groups/momentum_indicators.html
-        df['MACD'], df['MACD_SIGN'], df['MACD_HIST'] = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-        df['STOCH-SLOW-K'], df['STOCH-SLOW-D'] = talib.STOCH(high, low, close, fastk_period=5, slowk_period=3,
-                                                             slowk_matype=0, slowd_period=3, slowd_matype=0)
-        df['STOCH-FAST-K'], df['STOCH-FAST-D'] = talib.STOCHF(high, low, close, fastk_period=5, fastd_period=3,
-                                                              fastd_matype=0)
-        df['STOCH-RSI-K'], df['STOCH-RSI-D'] = talib.STOCHRSI(close, timeperiod=14, fastk_period=5, fastd_period=3,
-                                                              fastd_matype=0)
-        df['AROON-DOWN'], df['AROON-UP'] = talib.AROON(high, low, timeperiod=14)
-        df["MINUS_DI"] = talib.MINUS_DI(high, low, close, timeperiod=14)
-        df["MINUS_DM"] = talib.MINUS_DM(high, low, timeperiod=14)
-        df["PLUS_DI"] = talib.PLUS_DI(high, low, close, timeperiod=14)
-        df["PLUS_DM"] = talib.PLUS_DM(high, low, timeperiod=14)
-        df["MOM"] = talib.MOM(close, timeperiod=10)
-        df["MFI"] = talib.MFI(high, low, close, volume, timeperiod=14)
-        df["ADX"] = talib.ADX(high, low, close, timeperiod=14)
-        df["ADXR"] = talib.ADXR(high, low, close, timeperiod=14)
-        df["APO"] = talib.APO(close, fastperiod=12, slowperiod=26, matype=0)
-        df["AROONOSC"] = talib.AROONOSC(high, low, timeperiod=14)
-        df["BOP"] = talib.BOP(open, high, low, close)
-        df["CCI"] = talib.CCI(high, low, close, timeperiod=14)
-        df["CMO"] = talib.CMO(close, timeperiod=14)
-        df["DX"] = talib.DX(high, low, close, timeperiod=14)
-        df["PPO"] = talib.PPO(close, fastperiod=12, slowperiod=26, matype=0)
-        df["ROC"] = talib.ROC(close, timeperiod=10)
-        df["RSI"] = talib.RSI(close, timeperiod=14)
-        df["TRIX"] = talib.TRIX(close, timeperiod=30)
-        df["ULT"] = talib.ULTOSC(high, low, close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-        df["WILLR"] = talib.WILLR(high, low, close, timeperiod=14)
-
-    def get_average_studies(open, low, high, close, df):
+        fx.add(['MACD', 'MACD_SIGN', 'MACD_HIST'], talib.MACD, close, fastperiod=12, slowperiod=26, signalperiod=9)
+        fx.add(['STOCH-SLOW-K', 'STOCH-SLOW-D'], talib.STOCH, high, low, close, fastk_period=5, slowk_period=3,
+               slowk_matype=0, slowd_period=3, slowd_matype=0)
+        fx.add(['STOCH-FAST-K', 'STOCH-FAST-D'], talib.STOCHF, high, low, close, fastk_period=5, fastd_period=3,
+               fastd_matype=0)
+        fx.add(['STOCH-RSI-K', 'STOCH-RSI-D'], talib.STOCHRSI, close, timeperiod=14, fastk_period=5, fastd_period=3,
+               fastd_matype=0)
+        fx.add(['AROON-DOWN', 'AROON-UP'], talib.AROON, high, low, timeperiod=14)
+        fx.add("MINUS_DI", talib.MINUS_DI, high, low, close, timeperiod=14)
+        fx.add("MINUS_DM", talib.MINUS_DM, high, low, timeperiod=14)
+        fx.add("PLUS_DI", talib.PLUS_DI, high, low, close, timeperiod=14)
+        fx.add("PLUS_DM", talib.PLUS_DM, high, low, timeperiod=14)
+        fx.add("MOM", talib.MOM, close, timeperiod=10)
+        fx.add("MFI", talib.MFI, high, low, close, volume, timeperiod=14)
+        fx.add("ADX", talib.ADX, high, low, close, timeperiod=14)
+        fx.add("ADXR", talib.ADXR, high, low, close, timeperiod=14)
+        fx.add("APO", talib.APO, close, fastperiod=12, slowperiod=26, matype=0)
+        fx.add("AROONOSC", talib.AROONOSC, high, low, timeperiod=14)
+        fx.add("BOP", talib.BOP, open, high, low, close)
+        fx.add("CCI", talib.CCI, high, low, close, timeperiod=14)
+        fx.add("CMO", talib.CMO, close, timeperiod=14)
+        fx.add("DX", talib.DX, high, low, close, timeperiod=14)
+        fx.add("PPO", talib.PPO, close, fastperiod=12, slowperiod=26, matype=0)
+        fx.add("ROC", talib.ROC, close, timeperiod=10)
+        fx.add("RSI", talib.RSI, close, timeperiod=14)
+        fx.add("TRIX", talib.TRIX, close, timeperiod=30)
+        fx.add("ULT", talib.ULTOSC, high, low, close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
+        fx.add("WILLR", talib.WILLR, high, low, close, timeperiod=14)
+
+    def get_average_studies(open, low, high, close, fx):
         # https://mrjbq7.github.io/ta-lib/func_groups/overlap_studies.html
         # Bollinger bands
-        df['UP_BB'], df['MID_BB'], df['LOW_BB'] = talib.BBANDS(close, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0)
+        fx.add(['UP_BB', 'MID_BB', 'LOW_BB'], talib.BBANDS, close, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0)
         # HT_TRENDLINE - Hilbert Transform - Instantaneous Trendline
-        df["HT"] = talib.HT_TRENDLINE(close)
+        fx.add("HT", talib.HT_TRENDLINE, close)
         # SAR - Parabolic SAR
-        df["SAR"] = talib.SAR(high, low, acceleration=0, maximum=0)
+        fx.add("SAR", talib.SAR, high, low, acceleration=0, maximum=0)
         #
         periods = [5, 15, 30, 50, 100, 200]
         for period in periods:
-            df['SMA-' + str(period)] = talib.SMA(close, timeperiod=period)
-            df['DEMA-' + str(period)] = talib.DEMA(close, timeperiod=period)
-            df['TEMA-' + str(period)] = talib.TEMA(close, timeperiod=period)
-            df['WMA-' + str(period)] = talib.WMA(close, timeperiod=period)
-            df['MIDPOINT-' + str(period)] = talib.MIDPOINT(close, timeperiod=period)
-            df['MIDPRICE-' + str(period)] = talib.MIDPRICE(high, low, timeperiod=period)
-
-    def get_cycle_studies(close, df):
+            fx.add('SMA-' + str(period), talib.SMA, close, timeperiod=period)
+            fx.add('DEMA-' + str(period), talib.DEMA, close, timeperiod=period)
+            fx.add('TEMA-' + str(period), talib.TEMA, close, timeperiod=period)
+            fx.add('WMA-' + str(period), talib.WMA, close, timeperiod=period)
+            fx.add('MIDPOINT-' + str(period), talib.MIDPOINT, close, timeperiod=period)
+            fx.add('MIDPRICE-' + str(period), talib.MIDPRICE, high, low, timeperiod=period)
+
+    def get_cycle_studies(close, fx):
         # Cycle Indicator Functions
         # https://mrjbq7.github.io/ta-lib/func_groups/cycle_indicators.html
-        df["HT_DCPERIOD"] = talib.HT_DCPERIOD(close)
-        df["HT_DCPHASE"] = talib.HT_DCPHASE(close)
-        df["HT_TRENDMODE"] = talib.HT_TRENDMODE(close)
-
-    def get_chart_patterns(df):
-        open = np.asarray(df['Open'])
-        close = np.asarray(df['Close'])
-        high = np.asarray(df['High'])
-        low = np.asarray(df['Low'])
-        # all 61 chart patterns in TA lib version 4.0.17
-        # converted all int32 to bool as to conserve memory and storage
+        fx.add("HT_DCPERIOD", talib.HT_DCPERIOD, close)
+        fx.add("HT_DCPHASE", talib.HT_DCPHASE, close)
+        fx.add("HT_TRENDMODE", talib.HT_TRENDMODE, close)
+
+    def get_chart_patterns(df, packed: bool = False, workers: int = None):
+        """
+        Adds all 61 chart patterns in TA lib version 4.0.17.
+
+        By default, each pattern is added as a separate bool column.
+        When packed is set to true, all patterns are stored as bits of one single uint64 column, CDL_PATTERNS,
+        which takes 8 bytes per row instead of 61. Use has_pattern, count_patterns, pattern_events, and
+        unpack_patterns to query the packed column.
+
+        The pattern kernels run in parallel on a thread pool since ta-lib releases the GIL.
+
+        :param df: pandas data frame
+        :param packed: Stores all patterns as bitmask in a single column. False by default
+        :param workers: Number of threads. None uses the default of the ThreadPoolExecutor, 1 runs serial.
+        :return: Void - modifies the frame in place
+        """
+        open = np.asarray(df['Open'], dtype=np.float64)
+        close = np.asarray(df['Close'], dtype=np.float64)
+        high = np.asarray(df['High'], dtype=np.float64)
+        low = np.asarray(df['Low'], dtype=np.float64)
+
         # https://mrjbq7.github.io/ta-lib/func_groups/pattern_recognition.html
-        df["CDL2CROWS"] = talib.CDL2CROWS(open, high, low, close).astype(bool)  # CDL2CROWS - Two Crows
-        df["CDL3BLACKCROWS"] = talib.CDL3BLACKCROWS(open, high, low, close).astype(
-            bool)  # CDL3BLACKCROWS - Three Black Crows
-        df["CDL3INSIDE"] = talib.CDL3INSIDE(open, high, low, close).astype(bool)  # CDL3INSIDE - Three Inside Up/Down
-        df["CDL3LINESTRIKE"] = talib.CDL3LINESTRIKE(open, high, low, close).astype(
-            bool)  # CDL3LINESTRIKE - Three-Line Strike
-        df["CDL3OUTSIDE"] = talib.CDL3OUTSIDE(open, high, low, close).astype(
-            bool)  # CDL3OUTSIDE - Three Outside Up/Down
-        df["CDL3STARSINSOUTH"] = talib.CDL3STARSINSOUTH(open, high, low, close).astype(
-            bool)  # CDL3STARSINSOUTH - Three Stars In The South
-        df["CDL3WHITESOLDIERS"] = talib.CDL3WHITESOLDIERS(open, high, low, close).astype(
-            bool)  # CDL3WHITESOLDIERS - Three Advancing White Soldiers
-        df["CDLABANDONEDBABY"] = talib.CDLABANDONEDBABY(open, high, low, close, penetration=0).astype(
-            bool)  # CDLABANDONEDBABY - Abandoned Baby
-        df["CDLADVANCEBLOCK"] = talib.CDLADVANCEBLOCK(open, high, low, close).astype(
-            bool)  # CDLADVANCEBLOCK - Advance Block
-        df["CDLBELTHOLD"] = talib.CDLBELTHOLD(open, high, low, close).astype(bool)  # CDLBELTHOLD - Belt-hold
-        df["CDLBREAKAWAY"] = talib.CDLBREAKAWAY(open, high, low, close).astype(bool)  # CDLBREAKAWAY - Breakaway
-        df["CDLCLOSINGMARUBOZU"] = talib.CDLCLOSINGMARUBOZU(open, high, low, close).astype(
-            bool)  # CDLCLOSINGMARUBOZU - Closing Marubozu
-        df["CDLCONCEALBABYSWALL"] = talib.CDLCONCEALBABYSWALL(open, high, low, close).astype(
-            bool)  # CDLCONCEALBABYSWALL - Concealing Baby Swallow # WTF???
-        df["CDLCOUNTERATTACK"] = talib.CDLCOUNTERATTACK(open, high, low, close).astype(
-            bool)  # CDLCOUNTERATTACK - Counterattack
-        df["CDLDARKCLOUDCOVER"] = talib.CDLDARKCLOUDCOVER(open, high, low, close, penetration=0).astype(
-            bool)  # CDLDARKCLOUDCOVER - Dark Cloud Cover
-        df["CDLDOJI"] = talib.CDLDOJI(open, high, low, close).astype(bool)  # CDLDOJI - Doji
-        df["CDLDOJISTAR"] = talib.CDLDOJISTAR(open, high, low, close).astype(bool)  # CDLDOJISTAR - Doji Star
-        df["CDLDRAGONFLYDOJI"] = talib.CDLDRAGONFLYDOJI(open, high, low, close).astype(bool)  # Dragonfly Doji
-        df["CDLENGULFING"] = talib.CDLENGULFING(open, high, low, close).astype(bool)  # Engulfing Pattern
-        df["CDLEVENINGDOJISTAR"] = talib.CDLEVENINGDOJISTAR(open, high, low, close, penetration=0).astype(
-            bool)  # Evening Doji Star
-        df["CDLEVENINGSTAR"] = talib.CDLEVENINGSTAR(open, high, low, close, penetration=0).astype(bool)  # Evening Star
-        df["CDLGAPSIDESIDEWHITE"] = talib.CDLGAPSIDESIDEWHITE(open, high, low, close).astype(
-            bool)  # Up/Down-gap side-by-side white lines
-        df["CDLGRAVESTONEDOJI"] = talib.CDLGRAVESTONEDOJI(open, high, low, close).astype(bool)  # Gravestone Doji
-        df["CDLHAMMER "] = talib.CDLHAMMER(open, high, low, close).astype(bool)  # Hammer
-        df["CDLHANGINGMAN"] = talib.CDLHANGINGMAN(open, high, low, close).astype(bool)  # Hanging Man
-        df["CDLHARAMI"] = talib.CDLHARAMI(open, high, low, close).astype(bool)  # Harami Pattern
-        df["CDLHARAMICROSS"] = talib.CDLHARAMICROSS(open, high, low, close).astype(bool)  # Harami Cross Pattern
-        df["CDLHIGHWAVE"] = talib.CDLHIGHWAVE(open, high, low, close).astype(bool)  # High-Wave Candle
-        df["CDLHIKKAKE"] = talib.CDLHIKKAKE(open, high, low, close).astype(bool)  # Hikkake Pattern
-        df["CDLHIKKAKEMOD"] = talib.CDLHIKKAKEMOD(open, high, low, close).astype(bool)  # Modified Hikkake Pattern
-        df["CDLHOMINGPIGEON"] = talib.CDLHOMINGPIGEON(open, high, low, close).astype(bool)  # Homing Pigeon
-        df["CDLIDENTICAL3CROWS"] = talib.CDLIDENTICAL3CROWS(open, high, low, close).astype(
-            bool)  # Identical Three Crows
-        df["CDLINNECK"] = talib.CDLINNECK(open, high, low, close).astype(bool)  # In-Neck Pattern
-        df["CDLINVERTEDHAMMER"] = talib.CDLINVERTEDHAMMER(open, high, low, close).astype(bool)  # Inverted Hammer
-        df["CDLKICKING"] = talib.CDLKICKING(open, high, low, close).astype(bool)  # Kicking
-        df["CDLKICKINGBYLENGTH"] = talib.CDLKICKINGBYLENGTH(open, high, low, close).astype(
-            bool)  # Kicking - bull/bear determined by the longer marubozu
-        df["CDLLADDERBOTTOM"] = talib.CDLLADDERBOTTOM(open, high, low, close).astype(bool)  # Ladder Bottom
-        df["CDLLONGLEGGEDDOJI"] = talib.CDLLONGLEGGEDDOJI(open, high, low, close).astype(bool)  # Long Legged Doji
-        df["CDLLONGLINE"] = talib.CDLLONGLINE(open, high, low, close).astype(bool)  # Long Line Candle
-        df["CDLMARUBOZU"] = talib.CDLMARUBOZU(open, high, low, close).astype(bool)  # Marubozu
-        df["CDLMATCHINGLOW"] = talib.CDLMATCHINGLOW(open, high, low, close).astype(bool)  # Matching Low
-        df["CDLMATHOLD"] = talib.CDLMATHOLD(open, high, low, close, penetration=0).astype(bool)  # Mat Hold
-        df["CDLMORNINGDOJISTAR"] = talib.CDLMORNINGDOJISTAR(open, high, low, close, penetration=0).astype(
-            bool)  # Morning Doji Star
-        df["CDLMORNINGSTAR"] = talib.CDLMORNINGSTAR(open, high, low, close, penetration=0).astype(bool)  # Morning Star
-        df["CDLONNECK"] = talib.CDLONNECK(open, high, low, close).astype(bool)  # On-Neck Pattern
-        df["CDLPIERCING"] = talib.CDLPIERCING(open, high, low, close).astype(bool)  # Piercing Pattern
-        df["CDLRICKSHAWMAN"] = talib.CDLRICKSHAWMAN(open, high, low, close).astype(bool)  # Rickshaw Man
-        df["CDLRISEFALL3METHODS"] = talib.CDLRISEFALL3METHODS(open, high, low, close).astype(
-            bool)  # Rising/Falling Three Methods
-        df["CDLSEPARATINGLINES"] = talib.CDLSEPARATINGLINES(open, high, low, close).astype(bool)  # Separating Lines
-        df["CDLSHOOTINGSTAR"] = talib.CDLSHOOTINGSTAR(open, high, low, close).astype(bool)  # Shooting Star
-        df["CDLSHORTLINE"] = talib.CDLSHORTLINE(open, high, low, close).astype(bool)  # Short Line Candle
-        df["CDLSPINNINGTOP"] = talib.CDLSPINNINGTOP(open, high, low, close).astype(bool)  # Spinning Top
-        df["CDLSTALLEDPATTERN"] = talib.CDLSTALLEDPATTERN(open, high, low, close).astype(bool)  # Stalled Pattern
-        df["CDLSTICKSANDWICH"] = talib.CDLSTICKSANDWICH(open, high, low, close).astype(bool)  # Stick Sandwich
-        df["CDLTAKURI"] = talib.CDLTAKURI(open, high, low, close).astype(
-            bool)  # Takuri (Dragonfly Doji with very long lower shadow)
-        df["CDLTASUKIGAP"] = talib.CDLTASUKIGAP(open, high, low, close).astype(bool)  # Tasuki Gap
-        df["CDLTHRUSTING"] = talib.CDLTHRUSTING(open, high, low, close).astype(bool)  # Thrusting Pattern
-        df["CDLTRISTAR"] = talib.CDLTRISTAR(open, high, low, close).astype(bool)  # Tristar Pattern
-        df["CDLUNIQUE3RIVER"] = talib.CDLUNIQUE3RIVER(open, high, low, close).astype(bool)  # Unique 3 River
-        df["CDLUPSIDEGAP2CROWS"] = talib.CDLUPSIDEGAP2CROWS(open, high, low, close).astype(bool)  # Upside Gap Two Crows
-        df["CDLXSIDEGAP3METHODS "] = talib.CDLXSIDEGAP3METHODS(open, high, low, close).astype(
-            bool)  # Upside/Downside Gap Three Methods
+        # converted all int32 to bool as to conserve memory and storage
+        fx = FeatureExecutor(workers=workers, dtype=dm.pattern_dtype())
+        for name, func, kwargs in CHART_PATTERNS:
+            fx.add(name, func, open, high, low, close, **kwargs)
+        names, flags = fx.run(len(df))
+
+        if packed:
+            mask = np.zeros(len(df), dtype=np.uint64)
+            for bit in range(len(names)):
+                mask |= flags[:, bit].astype(np.uint64) << np.uint64(bit)
+            df[PATTERN_COLUMN] = mask
+        else:
+            for bit, name in enumerate(names):
+                df[name] = flags[:, bit]
+
+    def pattern_bits(names):
+        """
+        Returns the bitmask of the given chart pattern names
+        :param names: pattern name or list of pattern names, i.e. "CDLDOJI"
+        :return: numpy uint64
+        """
+        if isinstance(names, str):
+            names = [names]
+        bits = np.uint64(0)
+        for name in names:
+            bits |= np.uint64(1) << np.uint64(PATTERN_INDEX[name])
+        return bits
+
+    def has_pattern(mask, names, match_all: bool = False):
+        """
+        Tests the packed pattern column for the given patterns.
+
+        Usage:
+            doji = TechProcs.has_pattern(df["CDL_PATTERNS"], ["CDLDOJI", "CDLDOJISTAR"])
+            df_doji = df[doji]
+
+        :param mask: packed pattern column
+        :param names: pattern name or list of pattern names
+        :param match_all: True requires all given patterns, False requires at least one. False by default
+        :return: numpy bool array
+        """
+        mask = np.asarray(mask, dtype=np.uint64)
+        bits = TechProcs.pattern_bits(names)
+        if match_all:
+            return (mask & bits) == bits
+        return (mask & bits) != 0
+
+    def count_patterns(mask, names=None):
+        """
+        Counts the number of patterns in each row of the packed pattern column.
+        :param mask: packed pattern column
+        :param names: count only the given patterns. All patterns by default
+        :return: numpy uint8 array
+        """
+        mask = np.asarray(mask, dtype=np.uint64)
+        if names is not None:
+            mask = mask & TechProcs.pattern_bits(names)
+        return _popcount(mask)
+
+    def pattern_events(mask, names=None):
+        """
+        Returns the sparse event list of the packed pattern column, that is,
+        a dictionary of pattern name and the row positions at which the pattern occurs.
+        :param mask: packed pattern column
+        :param names: list of pattern names. All patterns by default
+        :return: dict of pattern name and numpy array of row positions
+        """
+        mask = np.asarray(mask, dtype=np.uint64)
+        names = names or PATTERN_NAMES
+        return {name: np.flatnonzero(mask & TechProcs.pattern_bits(name)) for name in names}
+
+    def unpack_patterns(mask, names=None):
+        """
+        Unpacks the packed pattern column into one bool column per pattern
+        :param mask: packed pattern column
+        :param names: list of pattern names. All patterns by default
+        :return: pandas data frame with one bool column per pattern
+        """
+        index = mask.index if isinstance(mask, pd.Series) else None
+        mask = np.asarray(mask, dtype=np.uint64)
+        names = names or PATTERN_NAMES
+        return pd.DataFrame({name: TechProcs.has_pattern(mask, name) for name in names}, index=index)
+
+def _cast_new_columns(df, columns):
+    """
+    Casts all columns added after the given list of columns to the feature dtype of the current dtype policy.
+    :param df: pandas data frame
+    :param columns: column names before adding new features
+    :return: Void - modifies the frame in place
+    """
+    dtype = dm.float_dtype()
+    for c_name in df.columns:
+        if c_name not in columns and df[c_name].dtype != dtype:
+            df[c_name] = df[c_name].astype(dtype)
+
+
+def _calc_all_features_serial(df):
+    """ Module level function so that it can be pickled for the process pool """
+    return TechProcs.calc_all_features(df, workers=1)
+
+
+def _popcount(mask):
+    """
+    Counts the set bits of each uint64 value
+    :param mask: numpy uint64 array
+    :return: numpy uint8 array
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(mask)
+    octets = mask.reshape(-1, 1).view(np.uint8)
+    return np.unpackbits(octets, axis=1).sum(axis=1, dtype=np.uint8)
@@ -6,25 +6,49 @@ from pathlib import Path
 from typing import Any, Union
 
 import pandas as pd
-from alpha_vantage.cryptocurrencies import CryptoCurrencies
-from alpha_vantage.timeseries import TimeSeries
 
 from src.enum import INTERVAL
 from src.enum import Ticker
 from src.enum import TimeFrame
-from src.procs import Procs as p
+from src.utils import DTypeManager as dm
+from src.utils import Ingest as ig
+from src.utils import LoaderMetrics as lm
+from src.utils import Resampler as rs
 
 
 class CachedNetLoader:
     def __init__(self, api_key: str, dbg: bool = False):
         # set key
         self.API_KEY = api_key
-        self.cc = CryptoCurrencies(key=self.API_KEY, output_format='pandas')
-        self.ts = TimeSeries(key=self.API_KEY, output_format='pandas')
+        # web clients are created on first use, see cc & ts
+        self._cc = None
+        self._ts = None
         self.DBG = dbg
         self.cache_folder = "cache"
         self.exp_file = self.cache_folder + "/" + "expiration.p"
         self.out_form = 'pandas'
+        # Stores all resampled intervals & timeframes in the columnar cache, see Resampler.build_pyramid
+        self.pyramid = False
+        # Number of bars of a compact data set
+        self.compact_size = 100
+        # load_data & load_intraday_data return the newest bar first if True, as AlphaVantage does
+        self.newest_first = False
+
+    @property
+    def cc(self):
+        """ AlphaVantage crypto currency client, created on first use """
+        if self._cc is None:
+            from alpha_vantage.cryptocurrencies import CryptoCurrencies
+            self._cc = CryptoCurrencies(key=self.API_KEY, output_format=self.out_form)
+        return self._cc
+
+    @property
+    def ts(self):
+        """ AlphaVantage time series client, created on first use """
+        if self._ts is None:
+            from alpha_vantage.timeseries import TimeSeries
+            self._ts = TimeSeries(key=self.API_KEY, output_format=self.out_form)
+        return self._ts
 
     def load_local_data(path: str, vrb: bool = False):
 
@@ -46,6 +70,9 @@ class CachedNetLoader:
         Returns OHLCV data for the given stock and timeframe.
         If full is false, then a smaller one year sample will be returned
 
+        The data come in the canonical schema, oldest bar first unless newest_first is set,
+        with a DatetimeIndex and a Date column. See Ingest.
+
         :param stock:
         :param timeframe:
         :param full:
@@ -54,34 +81,27 @@ class CachedNetLoader:
         """
         DBG = vrb
         if DBG: print("Loading Data for stock: " + stock.name)
-        df_all, df_meta = self.cached_stock_loader(stock, timeframe, full=full)
+        df_all = self.__ingested(stock, timeframe.name.lower(), full, ig.daily_format,
+                                 lambda: self.cached_stock_loader(stock, timeframe, full=full)[0])
         if DBG:
             print("Done!")
-            print("Raw data: ")
             print(df_all.info())
 
-        if DBG: print("Renaming columns: ")
-        df_all = p.rename_data(df_all)
-        if DBG: print("Done! New columns : ", df_all.info())
-
-        if DBG: print("Converting date to DateTime: ")
-        df_all = p.convert_date(df_all, "Date")
-        if DBG: print("Done!")
+        if DBG: print("Apply dtype policy: ", dm.get_policy().name)
+        df_all = dm.cast_features(df_all)
 
         return df_all
 
     def load_intraday_data(self, stock: Ticker.Ticker, interval: INTERVAL.INTERVAL, full: bool, vrb: bool):
         DBG = vrb
         if DBG: print("Loading Intraday Data for stock: " + stock.name)
-        df_all, _ = self.get_intraday(stock, interval, full)
+        df_all = self.__ingested(stock, interval.value, full, ig.intraday_format,
+                                 lambda: self.cached_intraday_loader(stock, interval, full)[0])
         if DBG:
             print("Done!")
-            print("Raw data: ")
             print(df_all.info())
 
-        if DBG: print("Renaming columns: ")
-        df_all = p.rename_data(df_all)
-        if DBG: print("Done! New columns : ", df_all.info())
+        df_all = dm.cast_features(df_all)
 
         return df_all
 
@@ -113,12 +133,22 @@ class CachedNetLoader:
 
         Important, cached data have no expiration data so to bypass caching, just clear the cache.
 
+        Only daily data get loaded from the web. Weekly and monthly data are resampled from the full daily data set;
+        the compact version contains the last 100 bars.
+
         :param stock: [ENUM] stock ticker
         :param period: [ENUM] DAILY, WEEKLY, MONTHLY
         :param full: Full dataset from IP to today. False by default.
         :return: Tuple: [Data, Meta_Data]
         """
         dbg: bool = self.DBG
+
+        if period is not TimeFrame.TimeFrame.DAILY:
+            if dbg: print("Resample daily data to: " + period.name)
+            df, df_meta = self.cached_stock_loader(stock, TimeFrame.TimeFrame.DAILY, full=True)
+            df = self.__resample(df, stock, period, "daily")
+            return (df if full else df.head(self.compact_size)), df_meta
+
         # Meta-data cannot be stored as CSV and thus gets pickled as plain python objects.
         f_full = self.cache_folder + "/" + stock.name + "-full.csv"
         f_meta_full = self.cache_folder + "/" + stock.name + "-full-meta.p"
@@ -131,6 +161,7 @@ class CachedNetLoader:
             path: Union[Path, Any] = Path(f_full)
             exists: bool = os.path.isfile(path)
 
+            lm.record_cache("stock", "full", stock.name, hit=exists, path=path if exists else None)
             if exists:
                 if dbg: print("Load full data from cache")
                 return self.__load_from_local_file(data_path=path, meta_path=f_meta_full)
@@ -141,6 +172,8 @@ class CachedNetLoader:
                 if dbg: print("Cache full data to local file")
                 df.to_csv(f_full)
                 pickle.dump(df_meta, open(f_meta_full, "wb"))
+                lm.inc("loader_cache_bytes_written_total", os.path.getsize(f_full),
+                       loader="stock", tier="full", ticker=stock.name)
 
                 if dbg: print("Return full data file")
                 return self.__load_from_local_file(data_path=path, meta_path=f_meta_full)
@@ -150,20 +183,23 @@ class CachedNetLoader:
             path = Path(f_comp)
             exists = os.path.isfile(path)
 
+            lm.record_cache("stock", "compact", stock.name, hit=exists, path=path if exists else None)
             if exists:
                 if dbg: print("Load compact (last 100 days) from cache")
-                return self.__load_from_local_file(data_path=path, meta_path=f_meta_full)
+                return self.__load_from_local_file(data_path=path, meta_path=f_meta_com)
 
             else:
                 if dbg: print("Load compact data from web")
                 df, df_meta = self.get_stock(stock=stock, period=period, full=False)
                 if dbg: print("Cache compact data to file")
                 df.to_csv(f_comp)
+                lm.inc("loader_cache_bytes_written_total", os.path.getsize(f_comp),
+                       loader="stock", tier="compact", ticker=stock.name)
                 if dbg: print("Cache compact meta data to file")
                 pickle.dump(df_meta, open(f_meta_com, "wb"))
 
                 if dbg: print("Return compact data file")
-                return df, df_meta
+                return self.__load_from_local_file(data_path=path, meta_path=f_meta_com)
 
     def check_cache(self, stock: Ticker):
         """
@@ -240,14 +276,15 @@ class CachedNetLoader:
         else:
             output_size = 'compact'
 
-        if period is TimeFrame.TimeFrame.DAILY:
-            return self.ts.get_daily(symbol=stock.name, outputsize=output_size)
+        with lm.timed(period.name.lower(), ticker=stock.name):
+            if period is TimeFrame.TimeFrame.DAILY:
+                return self.ts.get_daily(symbol=stock.name, outputsize=output_size)
 
-        if period is TimeFrame.TimeFrame.WEEKLY:
-            return self.ts.get_weekly(symbol=stock.name, outputsize=output_size)
+            if period is TimeFrame.TimeFrame.WEEKLY:
+                return self.ts.get_weekly(symbol=stock.name, outputsize=output_size)
 
-        if period is TimeFrame.TimeFrame.MONTHLY:
-            return self.ts.get_monthly(symbol=stock.name, outputsize=output_size)
+            if period is TimeFrame.TimeFrame.MONTHLY:
+                return self.ts.get_monthly(symbol=stock.name, outputsize=output_size)
 
 
     def warm_cache(self, stock: Ticker):
@@ -273,10 +310,98 @@ class CachedNetLoader:
         :return: stock data, meta_data
         """
 
-        if full:
-            return self.ts.get_intraday(symbol=stock.name, interval=interval.value, outputsize='full')
-        else:
-            return self.ts.get_intraday(symbol=stock.name, interval=interval.value, outputsize='compact')
+        with lm.timed("intraday_" + interval.value, ticker=stock.name):
+            if full:
+                return self.ts.get_intraday(symbol=stock.name, interval=interval.value, outputsize='full')
+            else:
+                return self.ts.get_intraday(symbol=stock.name, interval=interval.value, outputsize='compact')
+
+    def cached_intraday_loader(self, stock: Ticker, interval: INTERVAL = INTERVAL.INTERVAL.FIVE_MIN,
+                               full: bool = False):
+        """
+        Cached intraday data loader. Only 1min data get loaded from the web and cached.
+        All coarser intervals are resampled from the full 1min data set; the compact version contains the last 100 bars.
+
+        :param stock: [ENUM] ticker
+        :param interval: [ENUM] 1min, 5min, 15min, 30min, 60min
+        :param full: Returns only last 100 ticks if False, otherwise full tick data set if True. False by default.
+        :return: Tuple: [Data, Meta_Data]
+        """
+        dbg: bool = self.DBG
+        one_min = INTERVAL.INTERVAL.ONE_MIN
+        self.check_cache(stock=stock)
+
+        if interval is not one_min:
+            if dbg: print("Resample 1min data to: " + interval.value)
+            df, df_meta = self.cached_intraday_loader(stock, one_min, full=True)
+            df = self.__resample(df, stock, interval, "1min")
+            return (df if full else df.head(self.compact_size)), df_meta
+
+        tier = "full" if full else "compact"
+        f_data = self.cache_folder + "/" + stock.name + "-1min-" + tier + ".csv"
+        f_meta = self.cache_folder + "/" + stock.name + "-1min-" + tier + "-meta.p"
+        exists = os.path.isfile(f_data)
+
+        lm.record_cache("intraday", tier, stock.name, hit=exists, path=f_data if exists else None)
+        if not exists:
+            if dbg: print("Load " + tier + " 1min data from web")
+            df, df_meta = self.get_intraday(stock=stock, interval=one_min, full=full)
+            df.to_csv(f_data)
+            pickle.dump(df_meta, open(f_meta, "wb"))
+            lm.inc("loader_cache_bytes_written_total", os.path.getsize(f_data),
+                   loader="intraday", tier=tier, ticker=stock.name)
+
+        return self.__load_from_local_file(data_path=f_data, meta_path=f_meta)
+
+    def __ingested(self, stock: Ticker, level: str, full: bool, date_format: str, raw):
+        """
+        Returns the ingested data set from the columnar cache, and ingests & caches the raw data on a miss.
+
+        :param level: name of the interval or timeframe, i.e. daily or 5min
+        :param date_format: format of the dates in the raw data
+        :param raw: function that returns the raw data, i.e. from the CSV cache
+        :return: pandas data frame, see Ingest
+        """
+        tier = "full" if full else "compact"
+        # the compact size is part of the key, since resampled compact data sets depend on it
+        key = tier if full else tier + str(self.compact_size)
+        path = self.cache_folder + "/columnar/ingest/" + stock.name + "-" + level + "-" + key
+        self.check_cache(stock=stock)
+
+        df = ig.load(path, ascending=not self.newest_first)
+        lm.record_cache("ingest", tier, stock.name, hit=df is not None)
+        if df is None:
+            if self.DBG: print("Ingest raw data: " + path)
+            df = ig.ingest(raw(), date_format)
+            ig.store(path, df)
+            if self.newest_first:
+                df = df.iloc[::-1]
+        return df
+
+    def __resample(self, df, stock: Ticker, level, source: str):
+        """
+        Resamples the given raw data to the given interval or timeframe.
+        Reads & writes the resampled pyramid in the columnar cache if enabled.
+
+        :param df: raw data, i.e. from the local cache file
+        :param level: [ENUM] INTERVAL or TimeFrame
+        :param source: name of the source data, i.e. 1min or daily
+        :return: pandas data frame, newest first
+        """
+        intraday = isinstance(level, INTERVAL.INTERVAL)
+        if not self.pyramid:
+            if intraday:
+                return rs.resample_intraday(df, level, date_col="date")
+            return rs.resample_timeframe(df, level, date_col="date")
+
+        path = self.cache_folder + "/columnar/" + stock.name + "-" + source
+        df_level = rs.load_level(path, level)
+        lm.record_cache("pyramid", source, stock.name, hit=df_level is not None)
+        if df_level is None:
+            if self.DBG: print("Materialize resampled pyramid: " + path)
+            rs.build_pyramid(df, path, date_col="date")
+            df_level = rs.load_level(path, level)
+        return df_level
 
     def __load_from_local_file(self, data_path, meta_path):
         """
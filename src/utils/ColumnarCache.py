@@ -0,0 +1,190 @@
+"""
+Columnar on-disk cache.
+
+A dataset is a folder with one raw binary file per column plus a schema.json that lists
+column names, dtypes, and the number of rows. Columns are appended chunk by chunk without
+rewriting earlier data and are read back as memory-mapped numpy arrays, so reading a few
+columns or a row range of a large dataset only touches those bytes.
+
+Datetime columns are stored as int64 nanoseconds. Object columns, i.e. strings, are not supported.
+
+Usage:
+
+    from src.utils import ColumnarCache as cc
+    with cc.ColumnarWriter("cache/columnar/AAPL-1min") as w:
+        for chunk in chunks:
+            w.append(chunk)
+
+    df = cc.read("cache/columnar/AAPL-1min", columns=["Date", "Close"], start=1_000_000, stop=2_000_000)
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+DBG = False
+schema_file = "schema.json"
+cache_folder = "cache/columnar"
+
+
+def exists(path: str) -> bool:
+    """ Returns True if a complete dataset is stored at the given path """
+    return os.path.isfile(os.path.join(path, schema_file))
+
+
+def remove(path: str):
+    """ Deletes the dataset at the given path, if any """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def load_schema(path: str) -> dict:
+    with open(os.path.join(path, schema_file)) as f:
+        return json.load(f)
+
+
+def _column_file(path: str, i: int) -> str:
+    return os.path.join(path, "%d.bin" % i)
+
+
+def _storage_dtype(dtype) -> np.dtype:
+    """ Returns the dtype of the raw column file """
+    if np.issubdtype(dtype, np.datetime64):
+        return np.dtype(np.int64)
+    return np.dtype(dtype)
+
+
+class ColumnarWriter:
+    """
+    Appends frames with identical columns to a dataset. The schema is taken from the first frame.
+    The schema file is written on close, so an interrupted writer leaves no complete dataset behind.
+    When appending to an existing dataset, the old schema stays until close replaces it,
+    so an interrupted append leaves the existing rows readable.
+    """
+
+    def __init__(self, path: str, overwrite: bool = True):
+        """
+        :param path: dataset folder
+        :param overwrite: deletes an existing dataset at the path. True by default.
+                          If False, appends to the existing dataset.
+        """
+        self.path = path
+        self.columns = None
+        self.dtypes = None
+        self.rows = 0
+
+        if overwrite:
+            remove(path)
+        elif exists(path):
+            schema = load_schema(path)
+            self.columns = [c["name"] for c in schema["columns"]]
+            self.dtypes = [np.dtype(c["dtype"]) for c in schema["columns"]]
+            self.rows = schema["rows"]
+            # drops the rows of an earlier interrupted append, which the schema doesn't cover
+            for i, dtype in enumerate(self.dtypes):
+                with open(_column_file(path, i), "ab") as f:
+                    f.truncate(self.rows * _storage_dtype(dtype).itemsize)
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+    def append(self, df):
+        """
+        Appends all rows of the given frame. Columns must match the schema; values are cast to the schema dtype.
+        :param df: pandas data frame
+        :return: number of rows in the dataset
+        """
+        if self.columns is None:
+            for name, dtype in df.dtypes.items():
+                if dtype == object:
+                    raise ValueError("Object column not supported in columnar cache: " + str(name))
+            self.columns = [str(c) for c in df.columns]
+            self.dtypes = [np.dtype(d) for d in df.dtypes]
+        elif [str(c) for c in df.columns] != self.columns:
+            raise ValueError("Columns do not match the schema of " + self.path)
+
+        for i, (name, dtype) in enumerate(zip(df.columns, self.dtypes)):
+            values = np.ascontiguousarray(df[name].to_numpy(dtype=dtype))
+            with open(_column_file(self.path, i), "ab") as f:
+                f.write(values.view(_storage_dtype(dtype)).tobytes())
+
+        self.rows += len(df)
+        if DBG:
+            print("Appended ", len(df), " rows to ", self.path)
+        return self.rows
+
+    def close(self):
+        """ Writes the schema, which completes the dataset """
+        schema = dict(rows=self.rows,
+                      columns=[dict(name=n, dtype=d.str) for n, d in zip(self.columns or [], self.dtypes or [])])
+        tmp = os.path.join(self.path, schema_file + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(schema, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, schema_file))
+
+
+def write(path: str, df):
+    """ Stores the given frame as new dataset """
+    with ColumnarWriter(path) as w:
+        w.append(df)
+
+
+def columns_of(path: str) -> dict:
+    """
+    Returns all columns of the dataset as memory-mapped numpy arrays without reading any data.
+    :return: dictionary of column name and numpy array
+    """
+    schema = load_schema(path)
+    out = {}
+    for i, c in enumerate(schema["columns"]):
+        dtype = np.dtype(c["dtype"])
+        if schema["rows"] == 0:
+            out[c["name"]] = np.empty(0, dtype=dtype)
+            continue
+        values = np.memmap(_column_file(path, i), dtype=_storage_dtype(dtype), mode="r", shape=(schema["rows"],))
+        out[c["name"]] = values.view(dtype) if np.issubdtype(dtype, np.datetime64) else values
+    return out
+
+
+def read(path: str, columns=None, start: int = 0, stop: int = None, mmap: bool = True):
+    """
+    Reads the given columns and row range of a dataset.
+
+    :param path: dataset folder
+    :param columns: list of column names. All columns by default
+    :param start: first row
+    :param stop: row after the last row. All remaining rows by default
+    :param mmap: returns memory-mapped, read-only columns if True, otherwise copies into memory
+    :return: pandas data frame with a RangeIndex starting at start
+    """
+    arrays = columns_of(path)
+    names = columns or list(arrays)
+    data = {}
+    for name in names:
+        values = arrays[name][start:stop]
+        data[name] = values if mmap else np.array(values)
+    nr_rows = len(next(iter(data.values()))) if data else 0
+    return pd.DataFrame(data, index=pd.RangeIndex(start, start + nr_rows), copy=False)
+
+
+def iter_chunks(path: str, chunk_rows: int, columns=None):
+    """
+    Yields the dataset in chunks of chunk_rows rows. Each chunk is copied into memory,
+    so the memory of a loop over all chunks is bounded by the chunk size.
+    :return: generator of pandas data frames
+    """
+    nr_rows = load_schema(path)["rows"]
+    for start in range(0, nr_rows, chunk_rows):
+        yield read(path, columns, start, min(start + chunk_rows, nr_rows), mmap=False)
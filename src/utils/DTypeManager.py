@@ -0,0 +1,105 @@
+from enum import Enum, unique, auto
+
+import numpy as np
+
+
+@unique
+class DTYPES(Enum):
+    """ ENUM to encode valid dtype policies """
+    # float64 features & float64 labels, as returned by pandas.
+    DEFAULT = auto()
+    # float32 features, int8 categorial labels, bool patterns.
+    # Halves memory & bandwidth and matches the default tensor type of PyTorch.
+    COMPACT = auto()
+
+
+DBG = False
+policy = DTYPES.DEFAULT
+# Integer labels cannot hold NaN. Missing labels (no direction) get a code outside of the label range,
+# since zero is the ZERO direction class.
+LABEL_NA = -128
+
+
+def set_policy(dtype_policy: DTYPES):
+    """
+    Sets the pipeline-wide dtype policy. The policy is applied at ingest in CachedNetLoader.load_data,
+    when loading technical indicators, and preserved by all procs.
+
+    Usage:
+        dm.set_policy(DTYPES.COMPACT)
+        df_all = n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=True)
+
+    :param dtype_policy: [ENUM] DTYPES
+    :return: void
+    """
+    global policy
+    if DBG:
+        print("Set dtype policy: " + dtype_policy.name)
+    policy = dtype_policy
+
+
+def get_policy() -> DTYPES:
+    return policy
+
+
+def float_dtype():
+    """ Returns the dtype of continous features under the current policy """
+    if policy is DTYPES.COMPACT:
+        return np.float32
+    return np.float64
+
+
+def label_dtype():
+    """ Returns the dtype of categorial labels under the current policy """
+    if policy is DTYPES.COMPACT:
+        return np.int8
+    return np.float64
+
+
+def pattern_dtype():
+    """ Returns the dtype of chart pattern flags under the current policy """
+    return np.bool_
+
+
+def cast_features(df, exclude_col=None):
+    """
+    Casts all numeric columns of the given data frame to the feature dtype of the current policy.
+    Integer columns wider than 16 bit, i.e. Volume, are cast to float64 instead,
+    since float32 represents integers exactly up to 2^24 only.
+    The default policy leaves the frame unchanged.
+
+    :param df: pandas data frame
+    :param exclude_col: string array (or list) with column names to exclude, i.e. categorial labels
+    :return: pandas data frame
+    """
+    if policy is DTYPES.DEFAULT:
+        return df
+
+    exclude_col = exclude_col or []
+    dtype = float_dtype()
+    columns = {}
+    for c_name, c_type in df.dtypes.items():
+        if c_name in exclude_col or c_type == dtype:
+            continue
+        if np.issubdtype(c_type, np.floating):
+            columns[c_name] = dtype
+        elif np.issubdtype(c_type, np.integer) and c_type.itemsize > 1:
+            columns[c_name] = dtype if c_type.itemsize == 2 else np.float64
+
+    if columns:
+        return df.astype(columns)
+    return df
+
+
+def cast_labels(values):
+    """
+    Casts categorial labels to the label dtype of the current policy.
+    Integer labels cannot hold NaN, thus missing labels are set to LABEL_NA under the compact policy.
+
+    :param values: numpy array of labels
+    :return: numpy array
+    """
+    dtype = label_dtype()
+    if np.issubdtype(dtype, np.integer):
+        values = np.nan_to_num(values, nan=LABEL_NA)
+    return values.astype(dtype, copy=False)
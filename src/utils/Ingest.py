@@ -0,0 +1,94 @@
+"""
+Single-pass ingest of raw provider data into the canonical OHLCV schema.
+
+ingest renames all provider columns with one rename, parses the dates with an explicit format, or takes
+pre-parsed datetime & int64 dates as they are, casts the bar columns to float64, sorts by date, drops duplicate
+bars, keeping the last one, and sets a DatetimeIndex. The Date column stays, since procs merge on it.
+
+The loader stores the ingested frame in the columnar cache, where dates are int64, so later loads read the
+canonical frame back without renaming or parsing, and the ingest cost is paid once per cached data set.
+The loader applies the dtype policy after reading, so the cache does not depend on it.
+
+Usage:
+
+    df = ingest(raw_df, date_format=daily_format)
+    store("cache/columnar/ingest/AAPL-daily-full", df)
+    df = load("cache/columnar/ingest/AAPL-daily-full")
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.utils import ColumnarCache as cc
+
+
+DBG = False
+# AlphaVantage columns -> canonical columns
+columns = {"date": "Date",
+           "1. open": "Open",
+           "2. high": "High",
+           "3. low": "Low",
+           "4. close": "Close",
+           "5. volume": "Volume",
+           "6. market cap (USD)": "Market Cap"}
+bar_columns = ["Open", "High", "Low", "Close", "Volume", "Market Cap"]
+daily_format = "%Y-%m-%d"
+intraday_format = "%Y-%m-%d %H:%M:%S"
+
+
+def ingest(df, date_format: str = None, ascending: bool = True) -> pd.DataFrame:
+    """
+    Maps the given raw data to the canonical schema in one pass.
+
+    :param df: pandas data frame with AlphaVantage or canonical column names
+    :param date_format: strftime format of string dates, i.e. daily_format. Inferred if None
+    :param ascending: oldest bar first if True, newest first otherwise
+    :return: pandas data frame with the columns Date, Open, High, Low, Close, Volume and a DatetimeIndex
+    """
+    df = df.rename(columns={k: v for k, v in columns.items() if k in df.columns})
+    dates = _parse_dates(df["Date"], date_format)
+    df = df.drop(columns="Date").astype({c: np.float64 for c in bar_columns if c in df.columns})
+
+    # stable sort, so that the last of duplicate bars stays last
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+    keep = np.append(dates[1:] != dates[:-1], True)
+    order, dates = order[keep], dates[keep]
+    if not ascending:
+        order, dates = order[::-1], dates[::-1]
+
+    out = df.iloc[order]
+    out.insert(0, "Date", dates)
+    out.index = pd.DatetimeIndex(dates)
+    if DBG:
+        print("Ingested ", len(out), " of ", len(df), " bars")
+    return out
+
+
+def store(path: str, df):
+    """ Stores an ingested frame in the columnar cache. The index gets restored from the Date column on load """
+    cc.write(path, df.reset_index(drop=True))
+
+
+def load(path: str, ascending: bool = True):
+    """
+    Loads an ingested frame from the columnar cache.
+    :return: pandas data frame, or None if nothing is cached at the given path
+    """
+    if not cc.exists(path):
+        return None
+    df = cc.read(path, mmap=False)
+    if not ascending:
+        df = df.iloc[::-1]
+    df.index = pd.DatetimeIndex(df["Date"].to_numpy())
+    return df
+
+
+def _parse_dates(values, date_format: str = None) -> np.ndarray:
+    """ :return: datetime64[ns] numpy array """
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.to_numpy(dtype="M8[ns]")
+    if np.issubdtype(values.dtype, np.integer):
+        # pre-parsed nanoseconds, i.e. from the columnar cache
+        return values.to_numpy(dtype=np.int64).view("M8[ns]")
+    return pd.to_datetime(values, format=date_format).to_numpy(dtype="M8[ns]")
@@ -0,0 +1,234 @@
+"""
+In-process telemetry for the data loaders.
+
+Counters and latency histograms are labeled, i.e. by endpoint, cache tier, and ticker,
+and can be queried in-process or exported in the Prometheus text exposition format.
+
+Metrics recorded by CachedNetLoader & TechInd:
+
+* loader_cache_requests_total{loader, tier, ticker, result}  - result is either hit or miss
+* loader_cache_bytes_read_total{loader, tier, ticker}         - bytes read from the local cache
+* loader_cache_bytes_written_total{loader, tier, ticker}      - bytes written to the local cache
+* loader_requests_total{endpoint, ticker, status}             - status is either ok, error, or throttled
+* loader_request_seconds{endpoint, ticker}                    - latency histogram of web requests
+
+Usage:
+
+    from src.utils import LoaderMetrics as lm
+    df_all = n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=True)
+    print(lm.cache_hit_ratio(loader="stock"))
+    lm.export_text("cache/metrics.prom")
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+DBG = False
+
+# Upper bounds of the latency buckets in seconds
+buckets = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf")]
+
+# AlphaVantage returns this note instead of data when the call frequency is exceeded
+throttle_message = "call frequency"
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+
+def _matches(key, name: str, labels: dict):
+    key_name, key_labels = key
+    if key_name != name:
+        return False
+    key_labels = dict(key_labels)
+    return all(key_labels.get(k) == v for k, v in labels.items())
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Increments the counter with the given name and labels
+    :param name: metric name
+    :param value: increment. 1 by default
+    :param labels: metric labels, i.e. ticker="AAPL"
+    :return: void
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Records the given value, i.e. the latency in seconds, in the histogram with the given name and labels
+    :param name: metric name
+    :param value: observed value
+    :param labels: metric labels
+    :return: void
+    """
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = dict(count=0, sum=0.0, buckets=[0] * len(buckets))
+        hist["count"] += 1
+        hist["sum"] += value
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist["buckets"][i] += 1
+                break
+
+
+def record_cache(loader: str, tier: str, ticker: str, hit: bool, path=None):
+    """
+    Records a cache lookup. On a hit, the size of the cached file counts as bytes read.
+    Bytes written on a miss are recorded by the loaders once they have written the web response to the cache.
+    :param loader: name of the loader, i.e. stock or indicator
+    :param tier: cache tier, i.e. full or compact
+    :param ticker: name of the ticker
+    :param hit: True if the data were served from the cache
+    :param path: cached file of a hit. Optional
+    :return: void
+    """
+    labels = dict(loader=loader, tier=tier, ticker=ticker)
+    inc("loader_cache_requests_total", result="hit" if hit else "miss", **labels)
+    if hit and path is not None and os.path.isfile(path):
+        inc("loader_cache_bytes_read_total", os.path.getsize(path), **labels)
+    if DBG:
+        print("Cache ", "hit" if hit else "miss", labels)
+
+
+@contextmanager
+def timed(endpoint: str, **labels):
+    """
+    Context manager that records the latency and status of a web request.
+    Exceptions are counted as error, or throttled when AlphaVantage reports an exceeded call frequency,
+    and re-raised.
+
+    Usage:
+        with lm.timed("daily", ticker=stock.name):
+            data, meta = ts.get_daily(symbol=stock.name)
+
+    :param endpoint: name of the endpoint
+    :param labels: metric labels
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception as e:
+        status = "throttled" if throttle_message in str(e) else "error"
+        raise
+    finally:
+        observe("loader_request_seconds", time.perf_counter() - start, endpoint=endpoint, **labels)
+        inc("loader_requests_total", endpoint=endpoint, status=status, **labels)
+        if DBG:
+            print("Request ", endpoint, labels, status)
+
+
+def get_counter(name: str, **labels) -> float:
+    """
+    Returns the sum of all counters with the given name that match the given labels
+    :param name: metric name
+    :param labels: subset of labels to match. Matches all counters if empty.
+    :return: counter value
+    """
+    with _lock:
+        return sum(v for k, v in _counters.items() if _matches(k, name, labels))
+
+
+def get_histogram(name: str, **labels) -> dict:
+    """
+    Returns the merged histogram of all histograms with the given name that match the given labels
+    :param name: metric name
+    :param labels: subset of labels to match. Matches all histograms if empty.
+    :return: dictionary with count, sum, mean, and cumulative bucket counts
+    """
+    merged = dict(count=0, sum=0.0, buckets=[0] * len(buckets))
+    with _lock:
+        for k, hist in _histograms.items():
+            if _matches(k, name, labels):
+                merged["count"] += hist["count"]
+                merged["sum"] += hist["sum"]
+                merged["buckets"] = [a + b for a, b in zip(merged["buckets"], hist["buckets"])]
+    merged["mean"] = merged["sum"] / merged["count"] if merged["count"] else 0.0
+    cumulative = 0
+    for i, count in enumerate(merged["buckets"]):
+        cumulative += count
+        merged["buckets"][i] = cumulative
+    return merged
+
+
+def cache_hit_ratio(**labels) -> float:
+    """
+    Returns the cache hit ratio for the given labels, i.e. loader="indicator" or ticker="AAPL"
+    :param labels: subset of labels to match
+    :return: hits / (hits + misses) or zero if there was no request
+    """
+    hits = get_counter("loader_cache_requests_total", result="hit", **labels)
+    total = get_counter("loader_cache_requests_total", **labels)
+    return hits / total if total else 0.0
+
+
+def snapshot() -> dict:
+    """
+    Returns a copy of all counters & histograms
+    :return: dictionary of counters & histograms keyed by (name, labels)
+    """
+    with _lock:
+        return dict(counters=dict(_counters),
+                    histograms={k: dict(v, buckets=list(v["buckets"])) for k, v in _histograms.items()})
+
+
+def reset():
+    """ Clears all counters & histograms """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def export_text(path: str = None) -> str:
+    """
+    Exports all metrics in the Prometheus text exposition format.
+    :param path: output file, i.e. for the node exporter textfile collector. Optional
+    :return: str
+    """
+
+    def fmt_labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        return "{" + ",".join('%s="%s"' % (k, v) for k, v in items) + "}"
+
+    data = snapshot()
+    lines = []
+    for name in sorted({k[0] for k in data["counters"]}):
+        lines.append("# TYPE %s counter" % name)
+        for (k_name, labels), value in sorted(data["counters"].items()):
+            if k_name == name:
+                lines.append("%s%s %s" % (name, fmt_labels(labels), value))
+
+    for name in sorted({k[0] for k in data["histograms"]}):
+        lines.append("# TYPE %s histogram" % name)
+        for (k_name, labels), hist in sorted(data["histograms"].items()):
+            if k_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, hist["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("%s_bucket%s %d" % (name, fmt_labels(labels, [("le", le)]), cumulative))
+            lines.append("%s_sum%s %s" % (name, fmt_labels(labels), hist["sum"]))
+            lines.append("%s_count%s %d" % (name, fmt_labels(labels), hist["count"]))
+
+    out = "\n".join(lines) + "\n"
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(out)
+    return out
@@ -0,0 +1,239 @@
+"""
+Event-driven replay of cached intraday bars.
+
+Streams the bars of many symbols in timestamp order, merged with a heap over the per-symbol streams,
+and drives streaming procs and callbacks with every bar, as the live path would. Replays run as fast as
+possible or paced relative to the bar timestamps, i.e. speed=1 replays in real time and speed=60 one hour
+per minute. Each replay reports the number of events and events/sec, to load-test the live feature path offline.
+
+Bars with the same timestamp are emitted in the order the symbols were added.
+Every replay starts with new streaming procs unless resume is set.
+
+Usage:
+
+    engine = ReplayEngine(speed=0)
+    engine.load(loader, [Ticker.AAPL, Ticker.AMZN], INTERVAL.INTERVAL.FIVE_MIN)
+    engine.add_proc("RSI_14", lambda: sp.RSI(14))
+    engine.add_proc("SMA_20", lambda: sp.SMA(20))
+    engine.on_bar(lambda bar, features: print(bar.symbol, bar.Date, features["RSI_14"]))
+    stats = engine.run()
+    print(engine.report())
+
+    # or as generator, resp. async iterator
+    for bar, features in engine.events(): ...
+    async for bar, features in engine.stream(): ...
+"""
+
+import asyncio
+import heapq
+import inspect
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.dataclasses.BarEvent import BarEvent
+from src.enum import INTERVAL
+
+
+DBG = False
+columns = ["Open", "High", "Low", "Close", "Volume"]
+# Async replays yield control to the event loop after this many events when not paced
+yield_every = 1000
+
+
+class ReplayEngine:
+
+    def __init__(self, speed: float = 0.0, max_gap: float = None, dbg: bool = False):
+        """
+        :param speed: replay speed relative to the bar timestamps. 0 replays as fast as possible, 1 in real time
+        :param max_gap: caps the pause between two bars in seconds of replay time, i.e. to skip nights & weekends.
+                        No cap by default
+        :param dbg: Debug / verbose console output
+        """
+        self.speed = speed
+        self.max_gap = max_gap
+        self.DBG = dbg
+        self.symbols = []
+        self._dates = []
+        self._values = []
+        self._factories = {}
+        self._procs = []
+        self._callbacks = []
+        self.stats = dict(events=0, seconds=0.0, events_per_sec=0.0)
+
+    def add(self, symbol, df):
+        """
+        Adds the bars of a symbol. Bars may come in any order, i.e. newest first.
+
+        :param symbol: Ticker, Symbol, or name. Passed through as BarEvent.symbol
+        :param df: pandas data frame with Date column or DatetimeIndex & the OHLCV columns
+        """
+        dates = df["Date"] if "Date" in df.columns else df.index
+        dates = pd.to_datetime(dates).to_numpy(dtype="M8[ns]").view(np.int64)
+        values = df[columns].to_numpy(dtype=np.float64)
+
+        order = np.argsort(dates, kind="stable")
+        self.symbols.append(symbol)
+        self._dates.append(dates[order])
+        self._values.append(values[order])
+        self._procs.append(self.__create_procs())
+        if self.DBG:
+            print("Added ", len(dates), " bars of ", getattr(symbol, "name", symbol))
+
+    def load(self, loader, symbols, interval: INTERVAL = INTERVAL.INTERVAL.FIVE_MIN, full: bool = True):
+        """
+        Adds the intraday bars of all given symbols from the given loader, i.e. the CachedNetLoader.
+        :param loader: DataLoader with load_intraday_data
+        :param symbols: list of Ticker or Symbol
+        :param interval: [ENUM] 1min, 5min, 15min, 30min, 60min
+        :param full: full history if True, last 100 bars otherwise
+        """
+        for symbol in symbols:
+            self.add(symbol, loader.load_intraday_data(symbol, interval, full, self.DBG))
+
+    def add_proc(self, name: str, factory):
+        """
+        Adds a streaming proc to every symbol. Its value gets passed to the callbacks under the given name.
+        :param name: feature name, i.e. RSI_14
+        :param factory: callable that returns a new streaming proc, i.e. lambda: RSI(14)
+        """
+        self._factories[name] = factory
+        for procs in self._procs:
+            procs[name] = factory()
+
+    def on_bar(self, callback):
+        """
+        Adds a callback that gets called with (bar, features) for every bar.
+        Coroutine callbacks get awaited when replaying with stream.
+        """
+        self._callbacks.append(callback)
+
+    def procs_of(self, symbol) -> dict:
+        """ Returns the streaming procs of the given symbol by feature name, i.e. to snapshot their state """
+        return self._procs[self.symbols.index(symbol)]
+
+    def reset(self):
+        """ Replaces all streaming procs with new ones """
+        self._procs = [self.__create_procs() for _ in self.symbols]
+
+    def events(self, start=None, end=None, resume: bool = False):
+        """
+        Replays all bars between start and end in timestamp order and calls procs & callbacks.
+        Paced by the replay speed. Each replay starts with new streaming procs, so bars of a previous,
+        possibly interrupted, replay are not fed twice.
+
+        :param start: first timestamp. All bars by default
+        :param end: last timestamp, inclusive. All bars by default
+        :param resume: keeps the state of the streaming procs, i.e. after restoring a snapshot. False by default
+        :return: generator of tuples (BarEvent, features)
+        """
+        if not resume:
+            self.reset()
+        pace = self.__pacer()
+        for ts, bar, features in self.__merge(start, end):
+            delay = pace(ts)
+            if delay > 0:
+                time.sleep(delay)
+            for callback in self._callbacks:
+                callback(bar, features)
+            yield bar, features
+
+    async def stream(self, start=None, end=None, resume: bool = False):
+        """
+        Async version of events. Pauses with asyncio.sleep, so other tasks, i.e. a live feed, keep running.
+        :return: async generator of tuples (BarEvent, features)
+        """
+        if not resume:
+            self.reset()
+        pace = self.__pacer()
+        for nr, (ts, bar, features) in enumerate(self.__merge(start, end), start=1):
+            delay = pace(ts)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif nr % yield_every == 0:
+                await asyncio.sleep(0)
+            for callback in self._callbacks:
+                result = callback(bar, features)
+                if inspect.isawaitable(result):
+                    await result
+            yield bar, features
+
+    def run(self, start=None, end=None, max_events: int = None, resume: bool = False) -> dict:
+        """
+        Replays all bars, or the first max_events bars, and returns the stats.
+        :return: dictionary with events, seconds & events_per_sec
+        """
+        for nr, _ in enumerate(self.events(start, end, resume), start=1):
+            if max_events is not None and nr >= max_events:
+                break
+        return self.stats
+
+    def report(self) -> str:
+        s = self.stats
+        return "Replayed %d events of %d symbols in %.3f s: %.0f events/sec" % (
+            s["events"], len(self.symbols), s["seconds"], s["events_per_sec"])
+
+    def __create_procs(self) -> dict:
+        return {name: factory() for name, factory in self._factories.items()}
+
+    def __merge(self, start, end):
+        """
+        Merges the per-symbol streams with a heap that holds the next bar of each symbol.
+        Updates the stats, also when the consumer stops early.
+        :return: generator of tuples (timestamp, BarEvent, features)
+        """
+        first = None if start is None else pd.Timestamp(start).value
+        last = None if end is None else pd.Timestamp(end).value
+
+        heap = []
+        stops = []
+        for i, dates in enumerate(self._dates):
+            lo = 0 if first is None else int(np.searchsorted(dates, first, side="left"))
+            hi = len(dates) if last is None else int(np.searchsorted(dates, last, side="right"))
+            stops.append(hi)
+            if lo < hi:
+                heap.append((int(dates[lo]), i, lo))
+        heapq.heapify(heap)
+
+        nr_events = 0
+        wall = time.perf_counter()
+        try:
+            while heap:
+                ts, i, pos = heap[0]
+                if pos + 1 < stops[i]:
+                    heapq.heapreplace(heap, (int(self._dates[i][pos + 1]), i, pos + 1))
+                else:
+                    heapq.heappop(heap)
+
+                bar = BarEvent(self.symbols[i], np.datetime64(ts, "ns"), *self._values[i][pos].tolist())
+                features = {name: proc.update(bar) for name, proc in self._procs[i].items()}
+                nr_events += 1
+                yield ts, bar, features
+        finally:
+            seconds = time.perf_counter() - wall
+            self.stats = dict(events=nr_events, seconds=seconds,
+                              events_per_sec=nr_events / seconds if seconds > 0 else 0.0)
+            if self.DBG:
+                print(self.report())
+
+    def __pacer(self):
+        """ Returns a function that returns the seconds to wait before emitting the bar with the given timestamp """
+        if not self.speed:
+            return lambda ts: 0.0
+
+        state = dict(ts=None, due=0.0)
+
+        def pace(ts):
+            now = time.perf_counter()
+            if state["ts"] is None:
+                state["due"] = now
+            else:
+                gap = (ts - state["ts"]) / 1e9
+                if self.max_gap is not None:
+                    gap = min(gap, self.max_gap)
+                state["due"] += gap / self.speed
+            state["ts"] = ts
+            return state["due"] - now
+
+        return pace
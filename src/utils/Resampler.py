@@ -0,0 +1,239 @@
+"""
+Vectorized OHLCV resampling.
+
+Derives coarser bars from finer ones, i.e. 5, 15, 30, 60 minute bars from 1 minute bars and
+weekly & monthly bars from daily bars. Every bar gets an integer bucket key computed on int64 timestamps,
+and all buckets get aggregated at once with numpy reduceat over the sorted rows:
+open = first, high = max, low = min, close = last, volume = sum.
+
+Intraday buckets are session-aware: they are anchored at the session open of each day, so 60 minute bars
+of a 09:30 session cover 09:30 - 10:30 and never span two days. A last bucket that runs past the session close
+is labeled with the close, i.e. the last 60 minute bar of the day covers 15:30 - 16:00 and is labeled 16:00. Weekly and monthly buckets follow the calendar,
+i.e. Monday to Sunday and the calendar month, and are labeled with the last bar in the bucket, as AlphaVantage does.
+
+Both naming conventions, the raw AlphaVantage columns ("1. open", ...) and the renamed columns (Open, ...),
+are supported. Other columns are dropped.
+
+Usage:
+
+    from src.utils import Resampler as rs
+    df_5min = rs.resample_intraday(df_1min, INTERVAL.INTERVAL.FIVE_MIN)
+    df_week = rs.resample_timeframe(df_daily, TimeFrame.TimeFrame.WEEKLY)
+    rs.build_pyramid(df_1min, "cache/columnar/AAPL-intraday")
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.enum import INTERVAL
+from src.enum import TimeFrame
+from src.utils import ColumnarCache as cc
+
+
+DBG = False
+# Regular US equity session. Set to "00:00" and None for continuous markets, i.e. crypto
+session_open = "09:30"
+session_close = "16:00"
+
+aggregations = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum",
+                "1. open": "first", "2. high": "max", "3. low": "min", "4. close": "last", "5. volume": "sum"}
+
+__ns_per_minute = 60 * 10 ** 9
+__ns_per_day = 24 * 60 * __ns_per_minute
+
+
+def minutes(interval: INTERVAL) -> int:
+    """ Returns the length of the given interval in minutes, i.e. 5 for 5min """
+    return int(interval.value[:-len("min")])
+
+
+def find_date_col(df) -> str:
+    """ Returns the name of the date column of a loader frame, i.e. Date or date """
+    for name in ["Date", "date"]:
+        if name in df.columns:
+            return name
+    raise KeyError("No date column found in " + str(df.columns.values.tolist()))
+
+
+def aggregate(df, keys, date_col: str, label: str = "first", label_values=None):
+    """
+    Aggregates the OHLCV columns of all rows with the same bucket key. Rows must be sorted by time.
+
+    :param df: pandas data frame, sorted ascending by date
+    :param keys: int64 numpy array with one bucket key per row, non-decreasing
+    :param date_col: name of the date column
+    :param label: date of each output bar: "first" or "last" bar date in the bucket, or "key"
+                  to use label_values at the first row of each bucket
+    :param label_values: datetime64 numpy array with one label per row. Only used with label="key"
+    :return: pandas data frame with one row per bucket
+    """
+    if len(df) == 0:
+        return df[[date_col] + [c for c in df.columns if c in aggregations]].copy()
+
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    ends = np.concatenate((starts[1:], [len(keys)])) - 1
+
+    dates = df[date_col].to_numpy()
+    if label == "key":
+        out = {date_col: label_values[starts]}
+    else:
+        out = {date_col: dates[starts] if label == "first" else dates[ends]}
+
+    for name in df.columns:
+        how = aggregations.get(name)
+        if how is None:
+            continue
+        values = df[name].to_numpy()
+        if how == "first":
+            out[name] = values[starts]
+        elif how == "last":
+            out[name] = values[ends]
+        elif how == "max":
+            out[name] = np.maximum.reduceat(values, starts)
+        elif how == "min":
+            out[name] = np.minimum.reduceat(values, starts)
+        else:
+            out[name] = np.add.reduceat(values, starts)
+
+    return pd.DataFrame(out)
+
+
+def resample_intraday(df, interval: INTERVAL, date_col: str = None, session: str = None,
+                      closed: str = "right", close: str = None):
+    """
+    Resamples intraday bars to the given interval. Buckets are anchored at the session open of each day.
+
+    :param df: pandas data frame with intraday bars, i.e. 1min, in any order
+    :param interval: [ENUM] target interval, must be a multiple of the source interval
+    :param date_col: name of the date column. Detected by default
+    :param session: session open, i.e. "09:30". Module default session_open by default
+    :param closed: "right" if bars are labeled with their end time, as AlphaVantage does,
+                   "left" if labeled with their start time. The resampled bars are labeled the same way.
+    :param close: session close, i.e. "16:00". Right-labeled buckets ending after the close are labeled
+                  with the close. Module default session_close by default
+    :return: pandas data frame in the order of the input, i.e. newest first for AlphaVantage data
+    """
+    date_col = date_col or find_date_col(df)
+    width = minutes(interval) * __ns_per_minute
+    hours, mins = (session or session_open).split(":")
+    anchor = (int(hours) * 60 + int(mins)) * __ns_per_minute
+    close = close or session_close
+    end_of_session = None
+    if close is not None:
+        hours, mins = close.split(":")
+        end_of_session = (int(hours) * 60 + int(mins)) * __ns_per_minute
+
+    def bucket(ts):
+        if closed == "right":
+            ts = ts - 1
+        day = ts - ts % __ns_per_day
+        start = day + anchor + (ts - day - anchor) // width * width
+        if closed != "right":
+            return start
+        end = start + width
+        if end_of_session is not None:
+            # the last bucket of the session ends at the close, not at the next interval boundary
+            session_end = day + end_of_session
+            end = np.where((start < session_end) & (end > session_end), session_end, end)
+        return end
+
+    return __resample(df, date_col, bucket, label="key")
+
+
+def resample_daily(df, date_col: str = None):
+    """ Resamples intraday bars to daily bars labeled with the day """
+    date_col = date_col or find_date_col(df)
+    return __resample(df, date_col, lambda ts: ts - ts % __ns_per_day, label="key")
+
+
+def resample_timeframe(df, timeframe: TimeFrame, date_col: str = None):
+    """
+    Resamples daily bars to calendar weeks or months. Each bar is labeled with the date of the last bar
+    in the bucket, i.e. the last trading day of the week or month.
+
+    :param df: pandas data frame with daily bars in any order
+    :param timeframe: [ENUM] DAILY, WEEKLY, MONTHLY. DAILY returns the data unchanged
+    :param date_col: name of the date column. Detected by default
+    :return: pandas data frame in the order of the input
+    """
+    if timeframe is TimeFrame.TimeFrame.DAILY:
+        return df
+    date_col = date_col or find_date_col(df)
+
+    if timeframe is TimeFrame.TimeFrame.WEEKLY:
+        def bucket(ts):
+            days = ts // __ns_per_day
+            # 1970-01-01 was a Thursday; weeks start on Monday
+            return days - (days + 3) % 7
+    else:
+        def bucket(ts):
+            return ts.view("M8[ns]").astype("M8[M]").astype(np.int64)
+
+    return __resample(df, date_col, bucket, label="last")
+
+
+def build_pyramid(df, path: str, intervals=None, timeframes=None, date_col: str = None):
+    """
+    Materializes all resampled levels of the given bars as columnar cache datasets in path/<level>,
+    i.e. path/5min, path/WEEKLY. Each level is derived from the source bars.
+
+    :param df: pandas data frame with 1min or daily bars
+    :param path: parent folder of the datasets
+    :param intervals: list of [ENUM] intervals to derive. All coarser than 1min for intraday data
+    :param timeframes: list of [ENUM] timeframes to derive. WEEKLY & MONTHLY for daily data
+    :return: dictionary of level name and number of bars
+    """
+    date_col = date_col or find_date_col(df)
+    df = df.assign(**{date_col: pd.to_datetime(df[date_col])})
+    intraday = len(df) > 1 and df[date_col].dt.normalize().duplicated().any()
+
+    if intervals is None:
+        intervals = list(INTERVAL.INTERVAL)[1:] if intraday else []
+    if timeframes is None:
+        timeframes = [] if intraday else [TimeFrame.TimeFrame.WEEKLY, TimeFrame.TimeFrame.MONTHLY]
+
+    levels = {}
+    for interval in intervals:
+        levels[interval.value] = resample_intraday(df, interval, date_col)
+    for timeframe in timeframes:
+        levels[timeframe.name] = resample_timeframe(df, timeframe, date_col)
+
+    sizes = {}
+    for name, level in levels.items():
+        cc.write(os.path.join(path, name), level)
+        sizes[name] = len(level)
+        if DBG:
+            print("Materialized ", name, " with ", len(level), " bars")
+    return sizes
+
+
+def load_level(path: str, level):
+    """
+    Returns a materialized level of a pyramid, or None if it is missing.
+    :param path: parent folder of the datasets
+    :param level: [ENUM] INTERVAL or TimeFrame
+    """
+    name = level.value if isinstance(level, INTERVAL.INTERVAL) else level.name
+    level_path = os.path.join(path, name)
+    return cc.read(level_path, mmap=False) if cc.exists(level_path) else None
+
+
+def __resample(df, date_col: str, bucket, label: str):
+    """ Sorts by date, computes bucket keys, aggregates, and restores the order of the input """
+    dates = pd.to_datetime(df[date_col]).to_numpy(dtype="M8[ns]")
+    ts = dates.view(np.int64)
+
+    descending = len(ts) > 1 and ts[0] > ts[-1]
+    if not np.all(ts[1:] >= ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        df, dates, ts = df.iloc[order], dates[order], ts[order]
+
+    df = df.assign(**{date_col: dates})
+    keys = bucket(ts)
+    out = aggregate(df, keys, date_col, label, keys.view("M8[ns]") if label == "key" else None)
+
+    if descending:
+        out = out.iloc[::-1].reset_index(drop=True)
+    return out
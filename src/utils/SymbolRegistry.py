@@ -0,0 +1,280 @@
+"""
+Symbol registry that interns symbol names to dense integer ids.
+
+All symbols are stored in one numpy structured array, one fixed-size row per symbol, so the
+registry of thousands of symbols takes a few hundred KB and loads memory-mapped from a single .npy file.
+Row i holds the symbol with id i; id 0 is reserved as invalid. All members of the Ticker enum are preloaded
+with their enum value as id, so Ticker members and Symbols with the same name share the same id.
+Ticker members added after a registry was saved get merged in on load with the next free id, so use id_of
+rather than the enum value as the id of a Ticker member.
+
+Usage:
+
+    from src.utils.SymbolRegistry import SymbolRegistry
+    sr = SymbolRegistry.load("symbols.npy")
+    stock = sr.intern("MSFT", exchange="NASDAQ", asset_class=ASSET_CLASS.EQUITY, listed="1986-03-13")
+    df_all = n.load_data(stock, TimeFrame.TimeFrame.DAILY, full=True)
+    ids = sr.filter(exchange="NASDAQ", asset_class=ASSET_CLASS.EQUITY, active_on="2020-01-02")
+    sr.save("symbols.npy")
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.dataclasses.Symbol import Symbol
+from src.enum import Ticker
+from src.enum.ASSET_CLASS import ASSET_CLASS
+
+
+DBG = False
+registry_file = "symbols.npy"
+name_length = 16
+
+dtype = np.dtype([("id", "<i4"),
+                  ("name", "S%d" % name_length),
+                  ("exchange", "S8"),
+                  ("asset_class", "i1"),
+                  ("listed", "<M8[D]"),
+                  ("delisted", "<M8[D]")])
+
+# exchange, asset class, listing date, delisting date of the Ticker members
+ticker_meta = {"SPX": ("INDEX", ASSET_CLASS.INDEX, None, None),
+               "VIX": ("CBOE", ASSET_CLASS.INDEX, None, None),
+               "AAPL": ("NASDAQ", ASSET_CLASS.EQUITY, "1980-12-12", None),
+               "AMZN": ("NASDAQ", ASSET_CLASS.EQUITY, "1997-05-15", None),
+               "GOOGL": ("NASDAQ", ASSET_CLASS.EQUITY, "2004-08-19", None),
+               "FB": ("NASDAQ", ASSET_CLASS.EQUITY, "2012-05-18", None),
+               "NFLX": ("NASDAQ", ASSET_CLASS.EQUITY, "2002-05-23", None),
+               "BABA": ("NYSE", ASSET_CLASS.EQUITY, "2014-09-19", None),
+               "BIDU": ("NASDAQ", ASSET_CLASS.EQUITY, "2005-08-05", None),
+               "NVDA": ("NASDAQ", ASSET_CLASS.EQUITY, "1999-01-22", None),
+               "TWTR": ("NYSE", ASSET_CLASS.EQUITY, "2013-11-07", "2022-11-08"),
+               }
+
+
+def _day(value):
+    return np.datetime64("NaT", "D") if value is None else np.datetime64(value, "D")
+
+
+class SymbolRegistry:
+
+    def __init__(self, table=None):
+        """
+        Creates a registry with all Ticker members, or from the given table, see load.
+        :param table: numpy structured array of the registry dtype. Optional
+        """
+        if table is None:
+            self._table = np.zeros(64, dtype=dtype)
+            self._size = 1
+            self._ids = {}
+            self._preload_tickers()
+        else:
+            self._table = table
+            self._size = len(table)
+            self._ids = {name.decode(): i for i, name in enumerate(table["name"][1:], start=1)}
+            # Ticker members added after the registry was saved
+            for ticker in Ticker.Ticker:
+                if ticker.name not in self._ids:
+                    exchange, asset_class, listed, delisted = ticker_meta.get(ticker.name, ("", ASSET_CLASS.UNKNOWN,
+                                                                                            None, None))
+                    self.intern(ticker.name, exchange, asset_class, listed, delisted)
+
+    def _preload_tickers(self):
+        for ticker in Ticker.Ticker:
+            exchange, asset_class, listed, delisted = ticker_meta.get(ticker.name, ("", ASSET_CLASS.UNKNOWN,
+                                                                                    None, None))
+            symbol = self.intern(ticker.name, exchange, asset_class, listed, delisted)
+            # Ticker values are dense from 1 in declaration order
+            assert symbol.value == ticker.value
+
+    def __len__(self):
+        return self._size - 1
+
+    def __contains__(self, key):
+        return getattr(key, "name", key) in self._ids
+
+    def __iter__(self):
+        for i in range(1, self._size):
+            yield self._symbol(i)
+
+    @property
+    def table(self):
+        """ Read-only view of all registered symbols as numpy structured array """
+        view = self._table[1:self._size]
+        view.flags.writeable = False
+        return view
+
+    def intern(self, name: str, exchange: str = "", asset_class: ASSET_CLASS = ASSET_CLASS.UNKNOWN,
+               listed=None, delisted=None) -> Symbol:
+        """
+        Returns the symbol with the given name and registers it first if it is new.
+        Meta data of an already registered symbol remain unchanged.
+
+        :param name: symbol name, i.e. AAPL
+        :param exchange: exchange, i.e. NASDAQ
+        :param asset_class: [ENUM] asset class
+        :param listed: listing date. Optional
+        :param delisted: delisting date. Optional
+        :return: Symbol
+        """
+        i = self._ids.get(name)
+        if i is not None:
+            return self._symbol(i)
+
+        if len(name.encode()) > name_length:
+            raise ValueError("Symbol name longer than %d bytes: %s" % (name_length, name))
+
+        if self._size == len(self._table) or not self._table.flags.writeable:
+            # grows by doubling; also copies a memory-mapped table into memory
+            table = np.zeros(max(2 * len(self._table), 64), dtype=dtype)
+            table[:self._size] = self._table[:self._size]
+            self._table = table
+
+        i = self._size
+        self._table[i] = (i, name.encode(), exchange.encode(), asset_class.value, _day(listed), _day(delisted))
+        self._ids[name] = i
+        self._size += 1
+        if DBG:
+            print("Registered symbol ", name, " with id ", i)
+        return self._symbol(i)
+
+    def intern_many(self, names, exchange: str = "", asset_class: ASSET_CLASS = ASSET_CLASS.UNKNOWN):
+        """
+        Registers all given names with the same exchange & asset class.
+        :return: numpy array of ids in the order of the given names
+        """
+        return np.array([self.intern(name, exchange, asset_class).value for name in names], dtype=np.int32)
+
+    def get(self, key) -> Symbol:
+        """
+        Returns the symbol of the given key.
+        :param key: name, id, Ticker member, or Symbol
+        :return: Symbol
+        :raises KeyError: if the symbol is not registered
+        """
+        if isinstance(key, (int, np.integer)):
+            if not 0 < key < self._size:
+                raise KeyError(key)
+            return self._symbol(int(key))
+        return self._symbol(self._ids[getattr(key, "name", key)])
+
+    def resolve(self, key, intern: bool = False):
+        """
+        Returns the Ticker member of the given name, if there is one, and the registered symbol otherwise.
+        Keeps code that compares against Ticker members working.
+        :param key: name, id, Ticker member, or Symbol
+        :param intern: registers unknown names if True. False by default, so that typos don't become symbols
+        :return: Ticker or Symbol
+        :raises KeyError: if the symbol is not registered and intern is False
+        """
+        if isinstance(key, (Ticker.Ticker, Symbol)):
+            return key
+        if isinstance(key, str):
+            if key in Ticker.Ticker.__members__:
+                return Ticker.Ticker[key]
+            return self.intern(key) if intern else self.get(key)
+        symbol = self.get(key)
+        return Ticker.Ticker[symbol.name] if symbol.name in Ticker.Ticker.__members__ else symbol
+
+    def id_of(self, key) -> int:
+        """ Returns the id of the given name, Ticker member, or Symbol """
+        return self._ids[getattr(key, "name", key)]
+
+    def ids_of(self, keys):
+        """ Returns the ids of the given names, Ticker members, or Symbols as numpy array """
+        ids = self._ids
+        return np.fromiter((ids[getattr(k, "name", k)] for k in keys), dtype=np.int32, count=len(keys))
+
+    def names_of(self, ids):
+        """ Returns the names of the given ids as list """
+        return [name.decode() for name in self._table["name"][np.asarray(ids)]]
+
+    def symbols(self, ids):
+        """ Returns the symbols of the given ids as list """
+        return [self._symbol(int(i)) for i in ids]
+
+    def filter(self, exchange: str = None, asset_class: ASSET_CLASS = None, active_on=None,
+               listed_before=None, prefix: str = None):
+        """
+        Returns the ids of all symbols matching all given filters. Filters are vectorized over the whole table.
+
+        :param exchange: exchange or list of exchanges
+        :param asset_class: [ENUM] asset class or list of asset classes
+        :param active_on: symbols listed on the given day. Unknown listing dates count as listed.
+        :param listed_before: symbols with known listing date before the given day
+        :param prefix: symbols whose name starts with the given prefix
+        :return: numpy array of ids
+        """
+        table = self._table[1:self._size]
+        mask = np.ones(len(table), dtype=bool)
+
+        if exchange is not None:
+            exchanges = [exchange] if isinstance(exchange, str) else exchange
+            mask &= np.isin(table["exchange"], [e.encode() for e in exchanges])
+
+        if asset_class is not None:
+            classes = [asset_class] if isinstance(asset_class, ASSET_CLASS) else asset_class
+            mask &= np.isin(table["asset_class"], [c.value for c in classes])
+
+        if active_on is not None:
+            day = _day(active_on)
+            listed, delisted = table["listed"], table["delisted"]
+            mask &= np.isnat(listed) | (listed <= day)
+            mask &= np.isnat(delisted) | (day < delisted)
+
+        if listed_before is not None:
+            mask &= table["listed"] < _day(listed_before)
+
+        if prefix is not None:
+            mask &= np.char.startswith(table["name"], prefix.encode())
+
+        return table["id"][mask].copy()
+
+    def to_frame(self):
+        """ Returns all symbols as pandas data frame indexed by id """
+        table = self.table
+        return pd.DataFrame({"name": np.char.decode(table["name"]),
+                             "exchange": np.char.decode(table["exchange"]),
+                             "asset_class": [ASSET_CLASS(c).name for c in table["asset_class"]],
+                             "listed": table["listed"],
+                             "delisted": table["delisted"]},
+                            index=pd.Index(table["id"], name="id"))
+
+    def save(self, path: str = registry_file):
+        """
+        Stores the registry as single .npy file, including the reserved row 0.
+        Writes a temporary file first, so that saving to the file the table is memory-mapped from is safe.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, self._table[:self._size], allow_pickle=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = registry_file, mmap: bool = True):
+        """
+        Loads the registry stored at the given path, or returns a new registry with all Ticker members
+        if there is none. Symbols interned after loading are kept in memory until saved.
+
+        :param path: .npy file
+        :param mmap: memory-maps the table. True by default
+        :return: SymbolRegistry
+        """
+        if not os.path.isfile(path):
+            if DBG:
+                print("No symbol registry found at ", path)
+            return cls()
+        return cls(np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False))
+
+    def _symbol(self, i: int) -> Symbol:
+        row = self._table[i]
+        return Symbol(name=row["name"].decode(),
+                      value=int(row["id"]),
+                      exchange=row["exchange"].decode(),
+                      asset_class=ASSET_CLASS(int(row["asset_class"])),
+                      listed=row["listed"],
+                      delisted=row["delisted"])
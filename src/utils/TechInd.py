@@ -3,22 +3,36 @@ import shutil
 from pathlib import Path
 
 import pandas as pd
-from alpha_vantage.techindicators import TechIndicators
 
 from src.enum import TECHIND
 from src.enum import Ticker
 from src.enum import TimeFrame
+from src.utils import DTypeManager as dm
 from src.utils import KeyManager as k
+from src.utils import LoaderMetrics as lm
 from src.utils.KeyManager import KEYS
 
 DBG = False
 cache_folder = "cache"
 out_form = 'pandas'
-if DBG:
-    print("Loading keys from files...")
-KEY = k.set_key(KEYS.ALPHA)
+# The key and the web client are created on first use, see get_client.
+# Importing this module, i.e. through Procs, thus neither requires a key file nor network access.
+ti = None
 
-ti = TechIndicators(key=KEY, output_format=out_form)
+
+def get_client():
+    """
+    Returns the AlphaVantage technical indicator client.
+    The client, and the key it requires, are loaded lazily on first use.
+    :return: TechIndicators
+    """
+    global ti
+    if ti is None:
+        from alpha_vantage.techindicators import TechIndicators
+        if DBG:
+            print("Loading keys from files...")
+        ti = TechIndicators(key=k.set_key(KEYS.ALPHA), output_format=out_form)
+    return ti
 
 
 def clear_cache():
@@ -63,6 +77,7 @@ def get_cached_tech_indicator(indicator: TECHIND,
 
     path = Path(f_name)
     exists: bool = os.path.isfile(path)
+    lm.record_cache("indicator", indicator.name, stock.name, hit=exists, path=path if exists else None)
 
     if exists:
         if DBG:
@@ -77,6 +92,8 @@ def get_cached_tech_indicator(indicator: TECHIND,
         if DBG:
             print("Store tech indicators in local cache")
         df.to_csv(path)
+        lm.inc("loader_cache_bytes_written_total", os.path.getsize(path),
+               loader="indicator", tier=indicator.name, ticker=stock.name)
         if DBG:
             print("Return tech indicators for stock: " + stock.name)
         # this fixes a ridiculous bug. Apparently, the web request returns some gibberish that causes
@@ -98,6 +115,16 @@ def get_tech_indicator(indicator: TECHIND.TECHIND,
     :param time_period: Nr of time units between two calculating points. Set to 20 by default.
     :return: pandas dataframe containing the technical indicator for all recorded trading days of the stock.
     """
+    ti = get_client()
+    with lm.timed(indicator.name.lower(), ticker=stock.name):
+        return __request_tech_indicator(ti, indicator, stock, interval, time_period)
+
+
+def __request_tech_indicator(ti, indicator: TECHIND.TECHIND, stock: Ticker, interval: TimeFrame, time_period: int):
+    """
+    private method that sends the web request for the given indicator.
+    :return: pandas dataframe containing the technical indicator
+    """
 
     if indicator is TECHIND.TECHIND.BBANDS:
         if DBG:
@@ -144,8 +171,9 @@ def get_tech_indicator(indicator: TECHIND.TECHIND,
 
 def __load_from_local_file(path):
     """
-    private method to load data from local files
+    private method to load data from local files.
+    All indicator values are cast to the feature dtype of the current dtype policy.
     :param path:
     :return: local data
     """
-    return pd.read_csv(path, infer_datetime_format=True)
+    return dm.cast_features(pd.read_csv(path, infer_datetime_format=True))